@@ -1,50 +1,84 @@
-from fastapi import APIRouter, HTTPException
-import yfinance as yf
+import asyncio
+import json
+from datetime import date
+from typing import Any, Dict, List, Optional
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.cache import get_cache
+from app.core.database import get_db
+from app.core.shared_cache import daily_result_ttl, get_shared_cache
+from app.data.fetcher import MarketDataFetcher
+from app.data.models import FundamentalData
+from app.data.async_fetcher import get_async_fetcher
+from app.data.repository import PriceRepository, get_price_repository
+from app.data.series import align_closes
 from app.financial_intelligence.valuation import ValuationEngine
 from app.financial_intelligence.risk import RiskEngine
-from app.ml_layer.regime import RegimeDetectionModel
+from app.financial_intelligence.allocation import DEFAULT_ASSET_CLASSES, AssetAllocationEngine, RegimeAllocator
+from app.financial_intelligence.optimizer import METHODS as OPTIMIZER_METHODS, regime_moments
+from app.financial_intelligence.portfolio import align_returns, get_covariance_cache, portfolio_risk, weights_from_holdings
+from app.financial_intelligence.simulation import METHODS, RiskSimulator
+from app.ml_layer.forecasting import get_forecasting_model
+from app.ml_layer.registry import get_regime_model
 
 router = APIRouter()
-regime_model = RegimeDetectionModel()
+
+# Analysis results shared by every worker and replica (keyed by ticker, session and model version)
+analysis_cache = get_shared_cache("analysis")
+
+# Optimized allocations per (profile, method, regime, universe, session); solves warm-start per worker
+allocator = RegimeAllocator(
+    get_shared_cache("allocation"),
+    get_cache("allocation:warm_start", ttl=settings.ALLOCATION_WARM_START_TTL)
+)
+
 
 @router.post("/analyze/stock")
-def analyze_stock(ticker: str):
+async def analyze_stock(ticker: str, db: Session = Depends(get_db)):
     """
     Full analysis of a stock with real data validation.
     """
-    # 1. Validate ticker exists
+    ticker = ticker.upper()
+    regime_model = get_regime_model()
+    session = PriceRepository.last_expected_session(date.today())
+    key = analysis_cache.key(ticker, session, regime_model.model_version or "rules")
+    return await analysis_cache.aget_or_compute(
+        key,
+        lambda: _analyze_stock(ticker, db, regime_model),
+        ttl=lambda result: daily_result_ttl(result.get("as_of"), session)
+    )
+
+
+async def _analyze_stock(ticker: str, db: Session, regime_model) -> dict:
+    # 1. Load history (local store first, upstream only for missing bars)
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="3mo")
-        
-        if hist.empty:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Ticker '{ticker}' not found or has no data"
-            )
-        
-        info = stock.info
-        if not info or info.get("regularMarketPrice") is None:
-            # Double check with history
-            if len(hist) < 5:
-                raise HTTPException(
-                    status_code=404, 
-                    detail=f"Ticker '{ticker}' is invalid or has insufficient data"
-                )
-    except HTTPException:
-        raise
+        repository = get_price_repository(db, get_async_fetcher(), asynchronous=True)
+        prices, data_source = await repository.get_history(ticker, period="3mo")
     except Exception as e:
         raise HTTPException(
             status_code=404, 
             detail=f"Failed to fetch data for '{ticker}': {str(e)}"
         )
     
-    # 2. Extract price data
-    prices = hist["Close"].tolist()
-    current_price = prices[-1] if prices else 0
+    # 2. Validate ticker exists
+    if not len(prices):
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Ticker '{ticker}' not found or has no data"
+        )
+    if len(prices) < 5:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Ticker '{ticker}' is invalid or has insufficient data"
+        )
+    current_price = float(prices.close[-1])
     
     # 3. Calculate returns for risk analysis
-    returns = [(prices[i] - prices[i-1]) / prices[i-1] for i in range(1, len(prices))]
+    returns = prices.returns()
     
     # 4. Run regime detection
     regime_result = regime_model.detect_regime(prices)
@@ -53,7 +87,476 @@ def analyze_stock(ticker: str):
     max_drawdown = RiskEngine.calculate_max_drawdown(prices)
     var_95 = RiskEngine.calculate_var(returns, confidence_level=0.95)
     
-    # 6. Risk check
+    # 6. Volatility forecast from the cached GARCH state (fitted by /volatility/forecast or the refit job)
+    volatility_forecast = (await asyncio.to_thread(_volatility_forecasts, [prices])).get(prices.ticker)
+
+    # 7. Risk check and recommendation
+    result = _build_result(ticker, current_price, regime_result, max_drawdown, var_95, data_source, volatility_forecast)
+    result["as_of"] = str(prices.dates[-1])
+    return result
+
+
+class BatchAnalysisRequest(BaseModel):
+    tickers: List[str]
+    period: str = "3mo"
+
+
+@router.post("/analyze/batch")
+def analyze_batch(request: BatchAnalysisRequest):
+    """
+    Analyze a ticker universe in vectorized chunks, streaming NDJSON lines as each chunk completes.
+    Per-ticker failures are reported as {"ticker", "error"} lines and never abort the batch.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in request.tickers if t.strip()))
+    if len(tickers) > settings.BATCH_ANALYSIS_MAX_TICKERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_ANALYSIS_MAX_TICKERS} tickers per batch"
+        )
+
+    def stream():
+        chunk_size = settings.BATCH_ANALYSIS_CHUNK_SIZE
+        for start in range(0, len(tickers), chunk_size):
+            for line in _analyze_chunk(tickers[start:start + chunk_size], request.period):
+                yield json.dumps(line) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _analyze_chunk(tickers: List[str], period: str) -> List[dict]:
+    """
+    Bulk-fetch one chunk and analyze it over a (tickers x time) close matrix.
+    """
+    try:
+        series_by_ticker, errors = MarketDataFetcher.fetch_ohlcv_many(tickers, period=period, batched=True)
+    except Exception as e:
+        return [{"ticker": t, "error": f"Failed to fetch data: {e}"} for t in tickers]
+
+    lines = []
+    usable = []
+    for ticker in tickers:
+        series = series_by_ticker.get(ticker)
+        if series is None:
+            lines.append({"ticker": ticker, "error": f"Ticker '{ticker}' not found or has no data ({errors.get(ticker, 'no data')})"})
+        elif len(series) < 5:
+            lines.append({"ticker": ticker, "error": f"Ticker '{ticker}' is invalid or has insufficient data"})
+        else:
+            usable.append(series)
+    if not usable:
+        return lines
+
+    regime_model = get_regime_model()
+    try:
+        closes = align_closes(usable)
+        regimes = regime_model.detect_regimes(closes)
+        drawdowns = RiskEngine.max_drawdown(closes)
+        vars_95 = RiskEngine.value_at_risk(np.diff(closes, axis=1) / closes[:, :-1], confidence_level=0.95)
+        volatility_forecasts = _volatility_forecasts(usable)
+        for i, series in enumerate(usable):
+            lines.append(_build_result(
+                series.ticker, float(series.close[-1]), regimes[i],
+                float(drawdowns[i]), float(vars_95[i]), "miss", volatility_forecasts.get(series.ticker)
+            ))
+    except Exception as e:
+        # Fall back to per-ticker analysis so one bad series cannot sink the chunk
+        print(f"Vectorized batch analysis failed: {e}. Analyzing tickers individually.")
+        for series in usable:
+            try:
+                returns = series.returns()
+                lines.append(_build_result(
+                    series.ticker, float(series.close[-1]), regime_model.detect_regime(series),
+                    RiskEngine.calculate_max_drawdown(series),
+                    RiskEngine.calculate_var(returns, confidence_level=0.95), "miss"
+                ))
+            except Exception as ticker_error:
+                lines.append({"ticker": series.ticker, "error": str(ticker_error)})
+    return lines
+
+
+def _volatility_forecasts(series_list: List) -> Dict[str, Optional[dict]]:
+    """
+    GARCH forecasts for analysis results from cached states only: the analysis
+    window is too short to fit on and fitting is kept off the request path.
+    A failure only drops the forecasts, not the analysis.
+    """
+    try:
+        return get_forecasting_model().volatility_forecasts(
+            series_list, settings.GARCH_FORECAST_HORIZON, fit_missing=False
+        )
+    except Exception as e:
+        print(f"Volatility forecasts failed: {e}")
+        return {}
+
+
+class VolatilityForecastRequest(BaseModel):
+    tickers: List[str]
+    horizon: int = 10
+
+
+@router.post("/volatility/forecast")
+def forecast_volatility(request: VolatilityForecastRequest, db: Session = Depends(get_db)):
+    """
+    GARCH / GJR-GARCH volatility forecasts over a horizon for several tickers. Fitted
+    parameters are cached per ticker and refitted every GARCH_REFIT_DAYS; between
+    refits new bars only advance the variance recursion.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in request.tickers if t.strip()))
+    if not 1 <= len(tickers) <= settings.GARCH_MAX_TICKERS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {settings.GARCH_MAX_TICKERS} tickers are needed")
+    if not 1 <= request.horizon <= settings.GARCH_MAX_HORIZON:
+        raise HTTPException(status_code=400, detail=f"horizon must be between 1 and {settings.GARCH_MAX_HORIZON}")
+
+    repository = get_price_repository(db)
+    results, series_list = {}, []
+    for ticker in tickers:
+        try:
+            prices, _ = repository.get_history(ticker, period=settings.GARCH_HISTORY_PERIOD)
+            series_list.append(prices)
+        except Exception as e:
+            results[ticker] = {"error": str(e)}
+
+    forecasts = get_forecasting_model().volatility_forecasts(series_list, request.horizon)
+    for series in series_list:
+        forecast = forecasts.get(series.ticker)
+        if forecast is None:
+            forecast = {"error": f"Ticker '{series.ticker}' needs more than {settings.GARCH_MIN_OBSERVATIONS} bars"}
+        results[series.ticker] = forecast
+    return {ticker: results[ticker] for ticker in tickers if ticker in results}
+
+
+class ReturnForecastRequest(BaseModel):
+    tickers: List[str]
+    as_of: Optional[date] = None
+
+
+@router.post("/forecast/returns")
+def forecast_returns(request: ReturnForecastRequest):
+    """
+    Forward return forecasts for a universe from its latest materialized feature
+    rows (on or before as_of), scored by the trained return model in one batch.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in request.tickers if t.strip()))
+    if not 1 <= len(tickers) <= settings.RETURN_FORECAST_MAX_TICKERS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {settings.RETURN_FORECAST_MAX_TICKERS} tickers are needed")
+    result = get_forecasting_model().forecast_returns_batch(tickers, as_of=request.as_of)
+    if result is None:
+        raise HTTPException(status_code=503, detail="No return model has been trained")
+    return result
+
+
+class ValuationScenarioRequest(BaseModel):
+    # Each rate is a number, a list of values (grid) or {"mean", "std", "low", "high"} (sampled)
+    discount_rate: Any = 0.09
+    terminal_growth_rate: Any = 0.02
+    growth: Any = 0.0
+    ticker: Optional[str] = None
+    cash_flows: Optional[List[float]] = None
+    base_cash_flow: Optional[float] = None
+    years: int = 5
+    n_scenarios: int = 10_000
+    seed: Optional[int] = None
+    net_debt: Optional[float] = None
+    shares_outstanding: Optional[float] = None
+    percentiles: List[float] = [5, 25, 50, 75, 95]
+
+
+@router.post("/valuation/scenarios")
+def valuation_scenarios(request: ValuationScenarioRequest, db: Session = Depends(get_db)):
+    """
+    DCF value distribution, percentiles and sensitivity tables over grids or samples of
+    WACC, terminal growth and cash-flow growth. With a ticker, missing inputs (base free
+    cash flow, net debt) come from its latest stored fundamentals and the result is
+    compared with its market cap.
+    """
+    base_cash_flow, net_debt, market_value = request.base_cash_flow, request.net_debt, None
+    if request.ticker:
+        ticker = request.ticker.upper()
+        fundamentals = (
+            db.query(FundamentalData)
+            .filter(FundamentalData.ticker == ticker)
+            .order_by(FundamentalData.report_date.desc())
+            .first()
+        )
+        if fundamentals is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No fundamentals stored for '{ticker}'; ingest the ticker first"
+            )
+        if base_cash_flow is None and request.cash_flows is None:
+            base_cash_flow = fundamentals.free_cash_flow
+            if base_cash_flow is None:
+                raise HTTPException(status_code=404, detail=f"No free cash flow reported for '{ticker}'")
+        if net_debt is None:
+            net_debt = (fundamentals.total_debt or 0.0) - (fundamentals.total_cash or 0.0)
+        market_value = fundamentals.market_cap
+
+    try:
+        result = ValuationEngine.dcf_scenarios(
+            request.discount_rate,
+            request.terminal_growth_rate,
+            cash_flows=request.cash_flows,
+            base_cash_flow=base_cash_flow,
+            growth=request.growth,
+            years=request.years,
+            n_scenarios=request.n_scenarios,
+            seed=request.seed,
+            net_debt=net_debt or 0.0,
+            shares_outstanding=request.shares_outstanding,
+            market_value=market_value,
+            percentiles=request.percentiles,
+            max_scenarios=settings.VALUATION_MAX_SCENARIOS
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.ticker:
+        result["ticker"] = request.ticker.upper()
+    return result
+
+
+class RiskSimulationRequest(BaseModel):
+    tickers: List[str]
+    method: str = "bootstrap"
+    period: str = "2y"
+    horizons: List[int] = [1, 10]
+    confidence_levels: List[float] = [0.95, 0.99]
+    n_paths: int = 100_000
+    seed: Optional[int] = None
+    block_size: int = 10
+    ewma_lambda: float = 0.94
+
+
+@router.post("/risk/simulate")
+def simulate_risk(request: RiskSimulationRequest, db: Session = Depends(get_db)):
+    """
+    Simulated VaR and CVaR per ticker at each horizon and confidence level
+    (block bootstrap, parametric or filtered historical simulation).
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in request.tickers if t.strip()))
+    if not tickers or len(tickers) > settings.RISK_SIMULATION_MAX_TICKERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Provide between 1 and {settings.RISK_SIMULATION_MAX_TICKERS} tickers"
+        )
+    if request.method not in METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(METHODS)}")
+    if not 0 < request.n_paths <= settings.RISK_SIMULATION_MAX_PATHS:
+        raise HTTPException(status_code=400, detail=f"n_paths must be between 1 and {settings.RISK_SIMULATION_MAX_PATHS}")
+    if request.horizons and max(request.horizons) > settings.RISK_SIMULATION_MAX_HORIZON:
+        raise HTTPException(status_code=400, detail=f"Horizons are limited to {settings.RISK_SIMULATION_MAX_HORIZON} days")
+
+    try:
+        simulator = RiskSimulator(
+            n_paths=request.n_paths,
+            horizons=request.horizons,
+            confidence_levels=request.confidence_levels,
+            seed=request.seed,
+            chunk_size=settings.RISK_SIMULATION_CHUNK_SIZE,
+            block_size=request.block_size,
+            ewma_lambda=request.ewma_lambda
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    repository = get_price_repository(db)
+    results = {}
+    for ticker in tickers:
+        try:
+            prices, data_source = repository.get_history(ticker, period=request.period)
+            if len(prices) < 30:
+                results[ticker] = {"error": f"Ticker '{ticker}' has insufficient data"}
+                continue
+            result = simulator.run_prices(prices, request.method)
+            result.update(as_of=str(prices.dates[-1]), data_source=data_source)
+            results[ticker] = result
+        except Exception as e:
+            results[ticker] = {"error": str(e)}
+    return results
+
+
+class PortfolioRiskRequest(BaseModel):
+    # ticker -> market value (or weight)
+    holdings: Dict[str, float]
+    confidence_levels: List[float] = [0.95, 0.99]
+    horizon: int = 1
+
+
+@router.post("/portfolio/risk")
+def analyze_portfolio_risk(request: PortfolioRiskRequest, db: Session = Depends(get_db)):
+    """
+    Portfolio volatility, parametric and historical VaR/CVaR and per-holding risk
+    contributions from a Ledoit-Wolf covariance of stored prices. The covariance is
+    cached per universe and only advanced when new bars arrive.
+    """
+    try:
+        tickers, weights, total = weights_from_holdings(request.holdings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(tickers) > settings.PORTFOLIO_MAX_HOLDINGS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.PORTFOLIO_MAX_HOLDINGS} holdings")
+    if not 1 <= request.horizon <= settings.RISK_SIMULATION_MAX_HORIZON:
+        raise HTTPException(status_code=400, detail=f"horizon must be between 1 and {settings.RISK_SIMULATION_MAX_HORIZON}")
+    if not all(0 < c < 1 for c in request.confidence_levels):
+        raise HTTPException(status_code=400, detail="confidence levels must be between 0 and 1")
+
+    # Two years covers the covariance window with room for gaps; served from the local store once ingested
+    repository = get_price_repository(db)
+    series_list, missing = [], []
+    for ticker in tickers:
+        prices, _ = repository.get_history(ticker, period="2y")
+        if len(prices) > 1:
+            series_list.append(prices)
+        else:
+            missing.append(ticker)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"No price data for {', '.join(missing)}")
+
+    try:
+        state = get_covariance_cache().get(tickers, series_list)
+        return portfolio_risk(state, weights, request.confidence_levels, request.horizon, portfolio_value=total)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+class AllocationRequest(BaseModel):
+    risk_profile: str = "moderate"
+    tickers: List[str]
+    # Defaults to the profile's method
+    method: Optional[str] = None
+    benchmark: Optional[str] = None
+
+
+@router.post("/allocation/optimize")
+def optimize_allocation(request: AllocationRequest, db: Session = Depends(get_db)):
+    """
+    Optimized weights over a ticker universe for a risk profile, estimated from the
+    days in the benchmark's current regime (blended with the full history when the
+    regime is rare). Results are cached per profile, method, regime, universe and
+    session, so repeat requests skip loading prices and solving.
+    """
+    tickers = sorted({t.strip().upper() for t in request.tickers if t.strip()})
+    if not 2 <= len(tickers) <= settings.ALLOCATION_MAX_ASSETS:
+        raise HTTPException(status_code=400, detail=f"Between 2 and {settings.ALLOCATION_MAX_ASSETS} tickers are needed")
+    if request.method is not None and request.method not in OPTIMIZER_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(OPTIMIZER_METHODS)}")
+
+    benchmark = (request.benchmark or settings.ALLOCATION_BENCHMARK).upper()
+    period = settings.ALLOCATION_HISTORY_PERIOD
+    regime_model = get_regime_model()
+    session = PriceRepository.last_expected_session(date.today())
+
+    # The regime is fixed by (benchmark, session, model version), so the cache is keyed on
+    # those and a hit returns before any prices are loaded or the benchmark is decoded
+    def estimate():
+        repository = get_price_repository(db)
+        bench, _ = repository.get_history(benchmark, period=period)
+        if len(bench) < 60:
+            raise HTTPException(status_code=404, detail=f"Benchmark '{benchmark}' has insufficient data")
+        timeline = regime_model.regime_history([bench])[0]
+        if not timeline["regimes"]:
+            raise HTTPException(status_code=422, detail=f"No regime could be decoded for '{benchmark}'")
+        regime = timeline["regimes"][-1]
+
+        series_list, missing = [], []
+        for ticker in tickers:
+            prices, _ = repository.get_history(ticker, period=period)
+            if len(prices) > 1:
+                series_list.append(prices)
+            else:
+                missing.append(ticker)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"No price data for {', '.join(missing)}")
+        dates, returns = align_returns([bench, *series_list])
+        if len(returns) < 30:
+            raise HTTPException(status_code=422, detail="Too few common trading days for the universe")
+        weights = RegimeAllocator.day_weights(timeline, regime, dates)
+        mu, cov, credibility = regime_moments(returns[:, 1:], weights, settings.ALLOCATION_PRIOR_STRENGTH)
+        return mu, cov, {
+            "regime": regime,
+            "as_of": str(dates[-1]),
+            "observations": len(returns),
+            "regime_days": round(float(weights.sum()), 2),
+            "regime_credibility": credibility,
+        }
+
+    try:
+        return allocator.allocate(
+            request.risk_profile, tickers, None, estimate,
+            method=request.method,
+            scope=(benchmark, session, regime_model.model_version or "rules"),
+            ttl=lambda result: daily_result_ttl(result.get("as_of"), session)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+class BatchRebalanceRequest(BaseModel):
+    account_ids: List[str]
+    # One model portfolio name per account
+    profiles: List[str]
+    # accounts x asset_classes market values
+    holdings: List[List[float]]
+    asset_classes: List[str] = list(DEFAULT_ASSET_CLASSES)
+    tolerance: float = 0.05
+    min_trade: float = 0.0
+    cash_buffer: float = 0.0
+
+
+@router.post("/rebalance/batch")
+def rebalance_batch(request: BatchRebalanceRequest):
+    """
+    Check many accounts against their model portfolios in vectorized chunks and stream
+    NDJSON trade lists for the accounts that breach their tolerance band and have
+    trades of at least min_trade to place. Trades settle against cash, which keeps at
+    least cash_buffer of each account.
+    """
+    n = len(request.account_ids)
+    if len(request.profiles) != n or len(request.holdings) != n:
+        raise HTTPException(status_code=400, detail="account_ids, profiles and holdings must have the same length")
+    if n > settings.REBALANCE_MAX_ACCOUNTS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.REBALANCE_MAX_ACCOUNTS} accounts per batch")
+    if not 0 <= request.cash_buffer < 1 or request.tolerance < 0 or request.min_trade < 0:
+        raise HTTPException(status_code=400, detail="cash_buffer must be in [0, 1); tolerance and min_trade non-negative")
+    if request.cash_buffer > 0 and "cash" not in request.asset_classes:
+        raise HTTPException(status_code=400, detail="cash_buffer needs a 'cash' asset class")
+    try:
+        holdings = np.array(request.holdings, dtype=np.float64).reshape(n, len(request.asset_classes))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Each holdings row needs one value per asset class")
+
+    def stream():
+        chunk_size = settings.REBALANCE_CHUNK_SIZE
+        for start in range(0, n, chunk_size):
+            stop = start + chunk_size
+            profiles = request.profiles[start:stop]
+            result = AssetAllocationEngine.rebalance_batch(
+                holdings[start:stop],
+                AssetAllocationEngine.target_matrix(profiles, request.asset_classes),
+                asset_classes=request.asset_classes,
+                tolerance=request.tolerance,
+                min_trade=request.min_trade,
+                cash_buffer=request.cash_buffer
+            )
+            for action in AssetAllocationEngine.iter_rebalance_actions(
+                request.account_ids[start:stop], profiles, result, request.asset_classes
+            ):
+                yield json.dumps(action) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _build_result(
+    ticker: str,
+    current_price: float,
+    regime_result: dict,
+    max_drawdown: float,
+    var_95: float,
+    data_source: str,
+    volatility_forecast: Optional[dict] = None
+) -> dict:
+    """
+    Apply risk limits and the recommendation policy to computed metrics.
+    """
+    # Risk check
     risk_violated = RiskEngine.check_risk_violation(
         current_drawdown=max_drawdown,
         max_allowed_drawdown=0.20,
@@ -67,7 +570,7 @@ def analyze_stock(ticker: str):
         if var_95 > 0.05:
             risk_violations.append(f"VaR {var_95*100:.1f}% exceeds 5% limit")
     
-    # 7. Generate recommendation based on regime and risk
+    # Generate recommendation based on regime and risk
     recommendation = _generate_recommendation(
         regime=regime_result["regime"],
         regime_confidence=regime_result["confidence"],
@@ -79,6 +582,7 @@ def analyze_stock(ticker: str):
     return {
         "ticker": ticker.upper(),
         "price": round(current_price, 2),
+        "data_source": data_source,
         "regime": regime_result["regime"],
         "regime_confidence": round(regime_result["confidence"] * 100, 1),
         "volatility": round(regime_result.get("volatility", 0) * 100, 2),
@@ -90,7 +594,8 @@ def analyze_stock(ticker: str):
         "metrics": {
             "max_drawdown": round(max_drawdown * 100, 2),
             "var_95": round(var_95 * 100, 2),
-        }
+        },
+        "volatility_forecast": volatility_forecast,
     }
 
 
@@ -0,0 +1,95 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.data import ingestion
+from app.data.models import IngestionJob
+
+router = APIRouter()
+
+
+class WatchlistRequest(BaseModel):
+    tickers: List[str]
+    # Queue an initial job for tickers that were not being watched
+    ingest: bool = True
+
+
+class IngestionJobRequest(BaseModel):
+    tickers: List[str]
+
+
+@router.get("/watchlist")
+def get_watchlist(db: Session = Depends(get_db)):
+    """
+    Tickers kept current by the background scheduler.
+    """
+    return [ingestion.watchlist_entry_to_dict(e) for e in ingestion.get_watchlist(db)]
+
+
+@router.post("/watchlist")
+def add_to_watchlist(request: WatchlistRequest, db: Session = Depends(get_db)):
+    """
+    Add tickers to the watchlist. Returns immediately; data arrives via background jobs.
+    """
+    entries, added = ingestion.add_to_watchlist(db, request.tickers)
+    jobs = []
+    if request.ingest:
+        for ticker in added:
+            job, created = ingestion.submit_job(db, ticker)
+            jobs.append(ingestion.job_to_dict(job, created))
+    return {
+        "watchlist": [ingestion.watchlist_entry_to_dict(e) for e in entries],
+        "added": added,
+        "jobs": jobs
+    }
+
+
+@router.delete("/watchlist/{ticker}")
+def remove_from_watchlist(ticker: str, db: Session = Depends(get_db)):
+    if not ingestion.remove_from_watchlist(db, ticker):
+        raise HTTPException(status_code=404, detail=f"{ticker.upper()} is not on the watchlist")
+    return {"ticker": ticker.upper(), "removed": True}
+
+
+@router.post("/jobs", status_code=202)
+def submit_jobs(request: IngestionJobRequest, db: Session = Depends(get_db)):
+    """
+    Queue incremental ingestion for tickers. Tickers with a job in flight get that job back.
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in request.tickers if t.strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail="No tickers provided")
+    results = []
+    for ticker in tickers:
+        job, created = ingestion.submit_job(db, ticker)
+        results.append(ingestion.job_to_dict(job, created))
+    return results
+
+
+@router.get("/jobs")
+def list_jobs(ticker: Optional[str] = None, status: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+    """
+    Most recent jobs first, optionally filtered by ticker and status.
+    """
+    valid = (IngestionJob.QUEUED, IngestionJob.RUNNING, IngestionJob.SUCCEEDED, IngestionJob.FAILED)
+    if status is not None and status not in valid:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(valid)}")
+    jobs = ingestion.get_jobs(db, ticker=ticker, status=status, limit=max(1, min(limit, 500)))
+    return [ingestion.job_to_dict(job) for job in jobs]
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(IngestionJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return ingestion.job_to_dict(job)
+
+
+@router.post("/schedule", status_code=202)
+def run_schedule(db: Session = Depends(get_db)):
+    """
+    Queue jobs for the whole watchlist now instead of waiting for the next beat.
+    """
+    return ingestion.schedule_watchlist(db)
@@ -1,81 +1,122 @@
+import asyncio
 from fastapi import APIRouter
-import yfinance as yf
+from app.core.cache import get_cache, cache_stats
+from app.core.config import settings
+from app.core.shared_cache import shared_cache_stats
+from app.data.async_fetcher import get_async_fetcher
 
 router = APIRouter()
 
+# Upstream results shared across requests (PriceSeries and info dicts are read-only here)
+market_cache = get_cache(
+    "market",
+    ttl=settings.MARKET_HISTORY_CACHE_TTL,
+    maxsize=settings.MARKET_CACHE_MAX_ENTRIES,
+    max_bytes=settings.MARKET_CACHE_MAX_BYTES
+)
+
+
+async def _cached_history(symbol: str, period: str):
+    fetcher = get_async_fetcher()
+    return await market_cache.aget_or_load(
+        ("history", symbol, period),
+        lambda: fetcher.fetch_ohlcv(symbol, period=period)
+    )
+
+
+async def _cached_info(symbol: str) -> dict:
+    fetcher = get_async_fetcher()
+    return await market_cache.aget_or_load(
+        ("info", symbol),
+        lambda: fetcher.fetch_info(symbol),
+        ttl=settings.STOCK_INFO_CACHE_TTL
+    )
+
+
+async def _load_indices(symbols: tuple) -> dict:
+    series_by_symbol, errors = await get_async_fetcher().fetch_ohlcv_many(list(symbols), period="5d")
+    for symbol, error in errors.items():
+        print(f"Error fetching {settings.MARKET_INDICES.get(symbol, symbol)}: {error}")
+    return series_by_symbol
+
+
 @router.get("/indices")
-def get_market_indices():
+async def get_market_indices():
     """
     Get real-time market indices data.
     """
-    indices = [
-        {"symbol": "^GSPC", "name": "S&P 500"},
-        {"symbol": "^DJI", "name": "DOW"},
-        {"symbol": "^IXIC", "name": "NASDAQ"},
-        {"symbol": "^NSEI", "name": "NIFTY"},
-        {"symbol": "^BSESN", "name": "SENSEX"},
-    ]
+    indices = settings.MARKET_INDICES
+    symbols = tuple(indices)
+
+    # One concurrent fan-out per TTL window, shared by all concurrent callers
+    series_by_symbol = await market_cache.aget_or_load(
+        ("indices", symbols),
+        lambda: _load_indices(symbols)
+    )
     
     result = []
-    for idx in indices:
-        try:
-            ticker = yf.Ticker(idx["symbol"])
-            hist = ticker.history(period="2d")
-            
-            if hist.empty or len(hist) < 2:
-                continue
-                
-            current = float(hist["Close"].iloc[-1])
-            previous = float(hist["Close"].iloc[-2])
-            change = current - previous
-            change_pct = (change / previous) * 100
-            
-            result.append({
-                "name": idx["name"],
-                "symbol": idx["symbol"],
-                "value": round(current, 2),
-                "change": round(change, 2),
-                "change_percent": round(change_pct, 2),
-                "is_positive": change >= 0
-            })
-        except Exception as e:
-            print(f"Error fetching {idx['name']}: {e}")
+    for symbol, name in indices.items():
+        series = series_by_symbol.get(symbol)
+        if series is None or len(series) < 2:
             continue
+            
+        current = float(series.close[-1])
+        previous = float(series.close[-2])
+        change = current - previous
+        change_pct = (change / previous) * 100
+        
+        result.append({
+            "name": name,
+            "symbol": symbol,
+            "value": round(current, 2),
+            "change": round(change, 2),
+            "change_percent": round(change_pct, 2),
+            "is_positive": change >= 0
+        })
     
     return {"indices": result}
 
 
 @router.get("/stock/{ticker}")
-def get_stock_data(ticker_symbol: str):
+async def get_stock_data(ticker_symbol: str):
     """
     Get real-time stock data for a ticker.
     """
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        hist = ticker.history(period="5d")
+        # Price history and the (slower) info lookup run concurrently
+        hist, info = await asyncio.gather(
+            _cached_history(ticker_symbol, "5d"),
+            _cached_info(ticker_symbol)
+        )
         
-        if hist.empty or len(hist) < 2:
+        if len(hist) < 2:
             return {"error": f"No data found for {ticker_symbol}"}
         
-        current = float(hist["Close"].iloc[-1])
-        previous = float(hist["Close"].iloc[-2])
+        current = float(hist.close[-1])
+        previous = float(hist.close[-2])
         change = current - previous
         change_pct = (change / previous) * 100
         
-        info = ticker.info
-        
         return {
             "ticker": ticker_symbol,
             "price": round(current, 2),
             "change": round(change, 2),
             "change_percent": round(change_pct, 2),
             "is_positive": change >= 0,
-            "high": round(float(hist["High"].iloc[-1]), 2),
-            "low": round(float(hist["Low"].iloc[-1]), 2),
-            "volume": int(hist["Volume"].iloc[-1]),
+            "high": round(float(hist.high[-1]), 2),
+            "low": round(float(hist.low[-1]), 2),
+            "volume": int(hist.volume[-1]),
             "market_cap": info.get("marketCap"),
             "pe_ratio": info.get("trailingPE"),
         }
     except Exception as e:
         return {"error": str(e)}
 
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Hit, miss and eviction counters for the in-process and shared caches.
+    """
+    from app.financial_intelligence.portfolio import get_covariance_cache
+    return {"caches": cache_stats(), "shared": shared_cache_stats(), "covariance": get_covariance_cache().stats()}
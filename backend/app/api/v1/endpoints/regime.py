@@ -1,54 +1,107 @@
+from datetime import date
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.data.fetcher import MarketDataFetcher
-from app.ml_layer.regime import RegimeDetectionModel
+from app.core.shared_cache import daily_result_ttl, get_shared_cache
+from app.data.async_fetcher import get_async_fetcher
+from app.data.repository import PriceRepository, get_price_repository
+from app.ml_layer.registry import get_model_registry, get_regime_model
 
 router = APIRouter()
-regime_model = RegimeDetectionModel()
+
+# Current-regime results shared by every worker and replica (keyed by ticker, session and model version)
+regime_cache = get_shared_cache("regime")
+
+@router.get("/models")
+def get_model_info():
+    """
+    Loaded model versions and reload counters for this worker.
+    """
+    return get_model_registry().info()
+
 
 @router.get("/{ticker}")
-def get_market_regime(ticker: str):
+async def get_market_regime(ticker: str, db: Session = Depends(get_db)):
     """
     Get the current market regime for a given ticker.
     """
-    # Fetch recent price data
-    fetcher = MarketDataFetcher()
-    data = fetcher.fetch_ohlcv(ticker, period="3mo")
+    regime_model = get_regime_model()
+    session = PriceRepository.last_expected_session(date.today())
+    key = regime_cache.key(ticker.upper(), session, regime_model.model_version or "rules")
+    return await regime_cache.aget_or_compute(
+        key,
+        lambda: _market_regime(ticker, db, regime_model),
+        ttl=lambda result: daily_result_ttl(result.get("as_of"), session)
+    )
+
+
+async def _market_regime(ticker: str, db: Session, regime_model) -> dict:
+    # Load recent price data (local store first, upstream only for missing bars)
+    repository = get_price_repository(db, get_async_fetcher(), asynchronous=True)
+    data, data_source = await repository.get_history(ticker, period="3mo")
     
     if not data:
         raise HTTPException(status_code=404, detail=f"No data found for {ticker}")
     
-    # Extract closing prices
-    prices = [d["close"] for d in data]
-    
     # Detect regime
-    result = regime_model.detect_regime(prices)
+    result = regime_model.detect_regime(data)
     result["ticker"] = ticker
+    result["data_source"] = data_source
+    result["as_of"] = str(data.dates[-1])
     
     return result
 
 
-@router.post("/ingest/{ticker}")
-def ingest_ticker_data(ticker: str, db: Session = Depends(get_db)):
+class RegimeHistoryRequest(BaseModel):
+    tickers: List[str]
+    period: str = "1y"
+
+
+@router.get("/{ticker}/history")
+def get_regime_history(ticker: str, period: str = "1y", db: Session = Depends(get_db)):
     """
-    Manually trigger data ingestion for a ticker.
+    Per-day regime labels and posterior probabilities over the period.
     """
-    from app.data.fetcher import MarketDataFetcher, MarketDataStore
-    
-    fetcher = MarketDataFetcher()
-    store = MarketDataStore()
+    repository = get_price_repository(db)
+    data, data_source = repository.get_history(ticker, period=period)
     
-    # Fetch and store OHLCV
-    ohlcv_data = fetcher.fetch_ohlcv(ticker, period="1y")
-    count = store.store_ohlcv(db, ohlcv_data)
+    if not data:
+        raise HTTPException(status_code=404, detail=f"No data found for {ticker}")
     
-    # Fetch and store fundamentals
-    fundamentals = fetcher.fetch_fundamentals(ticker)
-    store.store_fundamentals(db, fundamentals)
+    result = get_regime_model().regime_history([data])[0]
+    result["data_source"] = data_source
+    return result
+
+
+@router.post("/history")
+def get_regime_history_batch(request: RegimeHistoryRequest, db: Session = Depends(get_db)):
+    """
+    Regime timelines for several tickers, decoded in a single model pass.
+    """
+    repository = get_price_repository(db)
+    series_list, missing = [], []
+    for ticker in dict.fromkeys(t.upper() for t in request.tickers):
+        data, _ = repository.get_history(ticker, period=request.period)
+        if data:
+            series_list.append(data)
+        else:
+            missing.append(ticker)
     
     return {
-        "ticker": ticker,
-        "ohlcv_records": count,
-        "fundamentals_stored": fundamentals is not None
+        "timelines": get_regime_model().regime_history(series_list),
+        "missing": missing
     }
+
+
+@router.post("/ingest/{ticker}", status_code=202)
+def ingest_ticker_data(ticker: str, db: Session = Depends(get_db)):
+    """
+    Queue background ingestion for a ticker (new bars only) and return the job.
+    Poll /ingestion/jobs/{id} for progress.
+    """
+    from app.data.ingestion import job_to_dict, submit_job
+
+    job, created = submit_job(db, ticker)
+    return job_to_dict(job, created)
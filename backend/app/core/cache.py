@@ -0,0 +1,263 @@
+"""
+In-process TTL/LRU cache with single-flight loading.
+Bounded by entry count and approximate memory; counters are exposed for TTL tuning.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Flight:
+    """
+    One in-progress load shared by every caller asking for the same key.
+    """
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a TTL.
+
+    Concurrent get_or_load calls for a missing key run the loader once;
+    the other callers wait for that result instead of hitting the upstream.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = 60.0,
+        maxsize: int = 1024,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or estimate_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._async_inflight: Dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "load_errors": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    def get(self, key: Hashable, default=None):
+        """
+        Return a live cached value (refreshing its LRU position) or default.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return default
+            self._counters["hits"] += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None):
+        """
+        Return the cached value, or run loader once per key across concurrent callers.
+        Loader exceptions propagate to every waiting caller and are not cached.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._counters["hits"] += 1
+                return entry[0]
+            self._counters["misses"] += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._counters["load_errors"] += 1
+            raise
+        else:
+            with self._lock:
+                self._counters["loads"] += 1
+                self._store(key, flight.value, ttl)
+            return flight.value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None):
+        """
+        Async get_or_load: concurrent coroutines for a missing key await one loader call.
+        Must be used from a single event loop; cached values are shared with sync callers.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._counters["hits"] += 1
+                return entry[0]
+            self._counters["misses"] += 1
+            flight = self._async_inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            # Shielded so a cancelled waiter cannot cancel the shared load
+            return await asyncio.shield(flight)
+
+        try:
+            value = await loader()
+        except BaseException as e:
+            with self._lock:
+                self._counters["load_errors"] += 1
+                self._async_inflight.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                flight.cancel()
+            elif not flight.done():
+                flight.set_exception(e)
+                flight.exception()  # Marks it retrieved so an unawaited failure is not logged
+            raise
+        with self._lock:
+            self._counters["loads"] += 1
+            self._store(key, value, ttl)
+            self._async_inflight.pop(key, None)
+        flight.set_result(value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "ttl": self.ttl,
+                "maxsize": self.maxsize,
+                "max_bytes": self.max_bytes,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Internal helpers (caller holds the lock)
+
+    def _lookup(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= self._clock():
+            self._remove(key)
+            self._counters["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: Hashable, value, ttl: Optional[float]):
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never cache a value that alone exceeds the memory cap
+            self._remove(key)
+            return
+        self._remove(key)
+        self._entries[key] = (value, self._clock() + (self.ttl if ttl is None else ttl), size)
+        self._bytes += size
+        while len(self._entries) > self.maxsize or \
+                (self.max_bytes is not None and self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._counters["evictions"] += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+def estimate_size(value, _depth: int = 0) -> int:
+    """
+    Approximate memory footprint in bytes of a cached value.
+    """
+    if hasattr(value, "memory_usage"):
+        # pandas DataFrame / Series
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if hasattr(value, "nbytes"):
+        # numpy arrays
+        return int(value.nbytes)
+    size = sys.getsizeof(value, 64)
+    if _depth < 3:
+        if isinstance(value, dict):
+            size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            size += sum(estimate_size(v, _depth + 1) for v in value)
+        elif hasattr(value, "__slots__"):
+            size += sum(estimate_size(getattr(value, s, None), _depth + 1) for s in value.__slots__)
+    return size
+
+
+_caches: Dict[str, TTLCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, **kwargs) -> TTLCache:
+    """
+    Process-wide named cache, created with kwargs on first use.
+    """
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = TTLCache(name, **kwargs)
+        return cache
+
+
+def cache_stats() -> Dict[str, dict]:
+    """
+    Counters for every named cache.
+    """
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,239 @@
+"""
+Shared cache tier.
+Results computed by one worker or replica are stored in Redis for all of them,
+with the in-process TTLCache in front. When Redis is not configured or stops
+answering, the local tier keeps serving on its own and Redis is retried later.
+
+Values are zlib-compressed JSON. Keys carry a schema version plus whatever
+identifies the input (ticker, last bar date, model version), so a new model
+or a new result format simply stops matching old entries, which then expire.
+"""
+import asyncio
+import json
+import threading
+import time
+import zlib
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+import numpy as np
+from app.core.cache import TTLCache, get_cache
+from app.core.config import settings
+
+# Bump when the shape of cached results changes
+SCHEMA_VERSION = "v1"
+
+_MISSING = object()
+
+TTLSpec = Union[None, float, Callable[[Any], float]]
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def encode(value) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":"), default=_json_default).encode(), 6)
+
+
+def decode(data: bytes):
+    return json.loads(zlib.decompress(data))
+
+
+class SharedCache:
+    """
+    Two-tier cache: in-process TTLCache in front of an optional Redis client.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client=None,
+        ttl: float = 3600.0,
+        local: Optional[TTLCache] = None,
+        namespace: str = "fg",
+        retry_interval: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.client = client
+        self.ttl = ttl
+        self.local = local if local is not None else TTLCache(f"shared:{name}", ttl=ttl)
+        self.namespace = namespace
+        self.retry_interval = retry_interval
+        self._clock = clock
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"remote_hits": 0, "remote_misses": 0, "remote_errors": 0, "remote_writes": 0}
+
+    def key(self, *parts) -> str:
+        return ":".join([self.namespace, SCHEMA_VERSION, self.name, *(str(p) for p in parts)])
+
+    @property
+    def remote_available(self) -> bool:
+        return self.client is not None and self._clock() >= self._down_until
+
+    def get(self, key: str, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value, ttl = self._remote_get(key)
+        if value is _MISSING:
+            return default
+        self.local.set(key, value, ttl)
+        return value
+
+    def set(self, key: str, value, ttl: TTLSpec = None):
+        ttl = self._resolve_ttl(ttl, value)
+        self.local.set(key, value, ttl)
+        self._remote_set(key, value, ttl)
+
+    def invalidate(self, key: str):
+        self.local.invalidate(key)
+        if self.remote_available:
+            try:
+                self.client.delete(key)
+            except Exception as e:
+                self._mark_down(e)
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]], ttl: TTLSpec = None):
+        """
+        Return the cached value from either tier, or compute it once per key in this
+        process and publish it to Redis. ttl may be a callable of the computed value.
+        Exceptions from compute are not cached.
+        """
+        resolved = {}
+
+        async def load():
+            value, remote_ttl = await asyncio.to_thread(self._remote_get, key)
+            if value is not _MISSING:
+                resolved["ttl"] = remote_ttl
+                return value
+            value = await compute()
+            resolved["ttl"] = self._resolve_ttl(ttl, value)
+            await asyncio.to_thread(self._remote_set, key, value, resolved["ttl"])
+            return value
+
+        value = await self.local.aget_or_load(key, load)
+        if resolved.get("ttl") not in (None, self.local.ttl):
+            # Keep the local copy from outliving the shared one
+            self.local.set(key, value, resolved["ttl"])
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "remote_configured": self.client is not None,
+            "remote_available": self.remote_available,
+            "ttl": self.ttl,
+            "local": self.local.stats(),
+        }
+
+    # Remote tier (failures degrade to local-only until retry_interval passes)
+
+    def _resolve_ttl(self, ttl: TTLSpec, value) -> float:
+        if ttl is None:
+            return self.ttl
+        return float(ttl(value)) if callable(ttl) else float(ttl)
+
+    def _remote_get(self, key: str):
+        if not self.remote_available:
+            return _MISSING, None
+        try:
+            data = self.client.get(key)
+            if data is None:
+                self._count("remote_misses")
+                return _MISSING, None
+            remaining = self.client.pttl(key)
+            self._count("remote_hits")
+            return decode(data), (remaining / 1000.0 if remaining and remaining > 0 else None)
+        except Exception as e:
+            self._mark_down(e)
+            return _MISSING, None
+
+    def _remote_set(self, key: str, value, ttl: float):
+        if not self.remote_available:
+            return
+        try:
+            self.client.set(key, encode(value), px=max(int(ttl * 1000), 1))
+            self._count("remote_writes")
+        except Exception as e:
+            self._mark_down(e)
+
+    def _mark_down(self, error: Exception):
+        self._count("remote_errors")
+        if self._clock() >= self._down_until:
+            print(f"Shared cache '{self.name}' unavailable ({error}); using in-process cache for {self.retry_interval:.0f}s")
+        self._down_until = self._clock() + self.retry_interval
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+
+def daily_result_ttl(as_of: Optional[str], session: date) -> float:
+    """
+    TTL for a result derived from daily bars: the full shared TTL once its last
+    bar is the expected session's, otherwise the short market-data TTL so a late
+    bar is picked up soon. A bar past the session is a still-forming intraday one
+    and gets the short TTL too.
+    """
+    if as_of and date.fromisoformat(as_of) == session:
+        return settings.SHARED_CACHE_TTL
+    return settings.MARKET_HISTORY_CACHE_TTL
+
+
+_redis_client = _MISSING
+_shared: Dict[str, SharedCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_redis_client():
+    """
+    Process-wide Redis client for settings.REDIS_URL (None if unset or redis is not installed).
+    """
+    global _redis_client
+    if _redis_client is _MISSING:
+        _redis_client = None
+        if settings.REDIS_URL:
+            try:
+                import redis
+                _redis_client = redis.Redis.from_url(
+                    settings.REDIS_URL,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT
+                )
+            except ImportError:
+                print("redis package not installed; shared cache runs in-process only")
+    return _redis_client
+
+
+def get_shared_cache(name: str, ttl: Optional[float] = None) -> SharedCache:
+    """
+    Process-wide named shared cache, created on first use.
+    """
+    with _shared_lock:
+        cache = _shared.get(name)
+        if cache is None:
+            ttl = ttl or settings.SHARED_CACHE_TTL
+            cache = _shared[name] = SharedCache(
+                name,
+                client=get_redis_client(),
+                ttl=ttl,
+                local=get_cache(f"shared:{name}", ttl=ttl, maxsize=settings.MARKET_CACHE_MAX_ENTRIES),
+                namespace=settings.SHARED_CACHE_NAMESPACE
+            )
+        return cache
+
+
+def shared_cache_stats() -> Dict[str, dict]:
+    with _shared_lock:
+        caches = list(_shared.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,182 @@
+"""
+Async market data access for the request path.
+
+OHLCV comes from the Yahoo Finance chart API over one pooled httpx.AsyncClient
+per event loop. Every upstream provider has its own concurrency limit
+(settings.UPSTREAM_CONCURRENCY), so a burst of slow fetches waits on a
+semaphore instead of occupying the server's threadpool. Calls that only
+yfinance can make (the crumb-protected quote summary behind Ticker.info) run
+on a small dedicated executor under the same kind of limit.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timezone
+from typing import Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from app.core.config import settings
+from app.data.series import PriceSeries
+
+CHART_PROVIDER = "yahoo_chart"
+INFO_PROVIDER = "yahoo_info"
+
+YAHOO_CHART_URL = "https://query2.finance.yahoo.com/v8/finance/chart/{ticker}"
+USER_AGENT = "Mozilla/5.0 (compatible; finance-guardian/1.0)"
+
+
+class UpstreamError(Exception):
+    """
+    An upstream provider returned an error or an unusable payload.
+    """
+
+
+class AsyncMarketDataFetcher:
+    """
+    Non-blocking counterpart of MarketDataFetcher for API handlers.
+    """
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, concurrency: Optional[Dict[str, int]] = None):
+        self.client = client or httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT},
+            timeout=settings.UPSTREAM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.UPSTREAM_MAX_CONNECTIONS
+            )
+        )
+        limits = dict(settings.UPSTREAM_CONCURRENCY, **(concurrency or {}))
+        self._limits = {provider: asyncio.Semaphore(limit) for provider, limit in limits.items()}
+        self._executor = ThreadPoolExecutor(
+            max_workers=limits.get(INFO_PROVIDER, 4), thread_name_prefix="upstream-info"
+        )
+
+    def limit(self, provider: str) -> asyncio.Semaphore:
+        return self._limits[provider]
+
+    async def fetch_ohlcv(self, ticker: str, period: str = "1y", start: Optional[date] = None) -> PriceSeries:
+        """
+        Fetch daily OHLCV (see MarketDataFetcher.fetch_ohlcv). Errors return an empty series.
+        """
+        try:
+            return await self._download(ticker, period, start)
+        except Exception as e:
+            print(f"Error fetching data for {ticker}: {e}")
+            return PriceSeries.empty(ticker)
+
+    async def fetch_ohlcv_many(
+        self,
+        tickers: List[str],
+        period: str = "1y"
+    ) -> Tuple[Dict[str, PriceSeries], Dict[str, str]]:
+        """
+        Fetch several symbols concurrently (bounded by the chart provider limit).
+
+        Returns:
+            (series by symbol, error message by symbol), like MarketDataFetcher.fetch_ohlcv_many.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        outcomes = await asyncio.gather(
+            *[self._download(t, period) for t in tickers], return_exceptions=True
+        )
+        results, errors = {}, {}
+        for ticker, outcome in zip(tickers, outcomes):
+            if isinstance(outcome, BaseException):
+                errors[ticker] = str(outcome)
+            elif len(outcome):
+                results[ticker] = outcome
+            else:
+                errors[ticker] = "no data returned"
+        return results, errors
+
+    async def fetch_info(self, ticker: str) -> dict:
+        """
+        yfinance Ticker.info on the dedicated executor. Errors return {}.
+        """
+        import yfinance as yf
+
+        async with self._limits[INFO_PROVIDER]:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._executor, lambda: yf.Ticker(ticker).info) or {}
+            except Exception as e:
+                print(f"Error fetching info for {ticker}: {e}")
+                return {}
+
+    async def aclose(self):
+        await self.client.aclose()
+        self._executor.shutdown(wait=False)
+
+    async def _download(self, ticker: str, period: str = "1y", start: Optional[date] = None) -> PriceSeries:
+        params = {"interval": "1d", "includePrePost": "false", "events": "div,splits"}
+        if start is not None:
+            params["period1"] = int(datetime.combine(start, time.min, tzinfo=timezone.utc).timestamp())
+            params["period2"] = int(datetime.now(timezone.utc).timestamp())
+        else:
+            params["range"] = period
+
+        async with self._limits[CHART_PROVIDER]:
+            response = await self.client.get(YAHOO_CHART_URL.format(ticker=ticker), params=params)
+        try:
+            payload = response.json()
+        except ValueError:
+            response.raise_for_status()
+            raise UpstreamError(f"Invalid chart response for {ticker}")
+        return parse_chart(ticker, payload)
+
+
+def parse_chart(ticker: str, payload: dict) -> PriceSeries:
+    """
+    Convert a Yahoo chart API payload to a PriceSeries (rows without a close are dropped).
+
+    Bars are split- and dividend-adjusted like yfinance's auto_adjust=True, which
+    every other fetch path uses: close is the adjusted close and open, high and
+    low are scaled by adjclose / close. Volume is left as reported.
+    """
+    chart = payload.get("chart") or {}
+    if chart.get("error"):
+        error = chart["error"]
+        raise UpstreamError(f"{error.get('code')}: {error.get('description')}")
+    result = (chart.get("result") or [None])[0]
+    if not result or not result.get("timestamp"):
+        return PriceSeries.empty(ticker)
+
+    indicators = result["indicators"]
+    quote = indicators["quote"][0]
+    # Bar timestamps are session opens; shift to exchange-local time before taking the date
+    offset = int(result.get("meta", {}).get("gmtoffset") or 0)
+    seconds = np.asarray(result["timestamp"], dtype=np.int64) + offset
+    columns = [np.array(quote.get(c) or [], dtype=np.float64) for c in PriceSeries.COLUMNS]
+    adjclose = np.array(((indicators.get("adjclose") or [{}])[0]).get("adjclose") or [], dtype=np.float64)
+    if any(len(col) != len(seconds) for col in columns + [adjclose]):
+        raise UpstreamError(f"Misaligned or unadjusted chart columns for {ticker}")
+
+    open_, high, low, close, volume = columns
+    keep = ~(np.isnan(close) | np.isnan(adjclose)) & (close != 0)
+    ratio = adjclose[keep] / close[keep]
+    return PriceSeries(
+        ticker,
+        (seconds[keep] // 86400).astype("datetime64[D]"),
+        open_[keep] * ratio, high[keep] * ratio, low[keep] * ratio, adjclose[keep], volume[keep]
+    )
+
+
+_fetchers: Dict[int, Tuple[asyncio.AbstractEventLoop, AsyncMarketDataFetcher]] = {}
+
+
+def get_async_fetcher() -> AsyncMarketDataFetcher:
+    """
+    Shared fetcher (pooled client and provider limits) for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    for key in [key for key, (other, _) in _fetchers.items() if other.is_closed()]:
+        del _fetchers[key]
+    entry = _fetchers.get(id(loop))
+    if entry is None or entry[0] is not loop:
+        entry = _fetchers[id(loop)] = (loop, AsyncMarketDataFetcher())
+    return entry[1]
+
+
+async def close_async_fetcher():
+    entry = _fetchers.pop(id(asyncio.get_running_loop()), None)
+    if entry is not None:
+        await entry[1].aclose()
@@ -0,0 +1,276 @@
+"""
+Columnar price store.
+Per-ticker append-only column files, memory-mapped for zero-copy range reads.
+
+Layout under the store root:
+
+    <TICKER>/CURRENT                 name of the live generation directory
+    <TICKER>/<generation>/date.bin   datetime64[D] (int64 days), ascending
+    <TICKER>/<generation>/open.bin   float64, aligned with date.bin
+    ...                              high, low, close, volume
+
+New bars after the last stored date are appended in place: value columns are
+written first and date.bin last, so the bar count (taken from date.bin) only
+grows once a bar is complete. Revisions of existing dates rewrite the ticker
+into a fresh generation that is switched in atomically via CURRENT.
+
+Writers of a ticker (API workers, ingestion workers) are serialized by an
+exclusive flock on <TICKER>/LOCK, so several processes may write; readers
+take no lock. A replaced generation is kept until the next one is written,
+so readers that resolved CURRENT just before the switch can still map it.
+"""
+import argparse
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Iterable, Iterator, List, Optional, Sequence
+from urllib.parse import quote, unquote
+import numpy as np
+from app.data.series import PriceSeries
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within the process
+    fcntl = None
+
+CURRENT = "CURRENT"
+LOCK = "LOCK"
+COLUMN_FILES = ("date",) + PriceSeries.COLUMNS
+_DTYPES = {name: np.dtype(np.float64) for name in PriceSeries.COLUMNS}
+_DTYPES["date"] = np.dtype("datetime64[D]")
+
+
+class ColumnarPriceStore:
+    """
+    Price history backed by memory-mapped column files (same interface as SQLPriceStore).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def load(self, ticker: str, start: Optional[date] = None, end: Optional[date] = None) -> PriceSeries:
+        """
+        Bars for a ticker within [start, end]; arrays are read-only views of the mapped files.
+        """
+        columns = self._open(ticker)
+        if not columns:
+            return PriceSeries.empty(ticker)
+
+        dates = columns["date"]
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D")))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+        return PriceSeries(ticker, dates[lo:hi], *[columns[name][lo:hi] for name in PriceSeries.COLUMNS])
+
+    def last_date(self, ticker: str) -> Optional[date]:
+        generation = self._generation(ticker)
+        if generation is None:
+            return None
+        path = os.path.join(generation, "date.bin")
+        n = os.path.getsize(path) // 8
+        if not n:
+            return None
+        with open(path, "rb") as f:
+            f.seek((n - 1) * 8)
+            return np.frombuffer(f.read(8), dtype=_DTYPES["date"])[0].astype(object)
+
+    def tickers(self) -> List[str]:
+        return sorted(
+            unquote(name) for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, CURRENT))
+        )
+
+    def iter_series(
+        self,
+        tickers: Optional[Sequence[str]] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        chunk_size: Optional[int] = None
+    ) -> Iterator[PriceSeries]:
+        """
+        One PriceSeries per ticker (all stored tickers by default), in ticker order.
+        chunk_size is accepted for interface compatibility; reads are mapped, not buffered.
+        """
+        names = self.tickers() if tickers is None else sorted({t.upper() for t in tickers})
+        for ticker in names:
+            series = self.load(ticker, start, end)
+            if len(series):
+                yield series
+
+    def save(self, series: PriceSeries) -> dict:
+        """
+        Upsert bars. Appends when every bar is newer than the stored history,
+        otherwise merges (incoming bars win) into a new generation.
+
+        Returns:
+            {"inserted": n, "updated": m}
+        """
+        series = _dedupe(series)
+        if not len(series):
+            return {"inserted": 0, "updated": 0}
+
+        with writer_lock(self._ticker_dir(series.ticker), self._lock):
+            existing = self.load(series.ticker)
+            if not len(existing):
+                self._write_generation(series)
+                return {"inserted": len(series), "updated": 0}
+
+            if series.dates[0] > existing.dates[-1]:
+                self._append(series, len(existing))
+                return {"inserted": len(series), "updated": 0}
+
+            updated = int(np.isin(series.dates, existing.dates).sum())
+            self._write_generation(_merge(existing, series))
+            return {"inserted": len(series) - updated, "updated": updated}
+
+    def delete(self, ticker: str):
+        ticker_dir = self._ticker_dir(ticker)
+        if not os.path.isdir(ticker_dir):
+            return
+        with writer_lock(ticker_dir, self._lock):
+            shutil.rmtree(ticker_dir, ignore_errors=True)
+
+    # Internal helpers
+
+    def _ticker_dir(self, ticker: str) -> str:
+        return os.path.join(self.root, quote(ticker, safe="^.-_=@"))
+
+    def _generation(self, ticker: str) -> Optional[str]:
+        ticker_dir = self._ticker_dir(ticker)
+        try:
+            with open(os.path.join(ticker_dir, CURRENT)) as f:
+                return os.path.join(ticker_dir, f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def _open(self, ticker: str) -> Optional[dict]:
+        generation = self._generation(ticker)
+        if generation is None:
+            return None
+        n = os.path.getsize(os.path.join(generation, "date.bin")) // 8
+        if not n:
+            return None
+        return {
+            name: np.memmap(os.path.join(generation, f"{name}.bin"), dtype=_DTYPES[name], mode="r", shape=(n,))
+            for name in COLUMN_FILES
+        }
+
+    def _append(self, series: PriceSeries, n_existing: int):
+        generation = self._generation(series.ticker)
+        # Value columns first (dropping any partial write past the committed count), dates last
+        for name in PriceSeries.COLUMNS + ("date",):
+            with open(os.path.join(generation, f"{name}.bin"), "r+b") as f:
+                f.truncate(n_existing * 8)
+                f.seek(0, os.SEEK_END)
+                f.write(_column(series, name).tobytes())
+
+    def _write_generation(self, series: PriceSeries):
+        ticker_dir = self._ticker_dir(series.ticker)
+        previous = self._generation(series.ticker)
+        name = f"g{time.time_ns()}"
+        os.makedirs(os.path.join(ticker_dir, name))
+        for column in COLUMN_FILES:
+            _column(series, column).tofile(os.path.join(ticker_dir, name, f"{column}.bin"))
+
+        tmp = os.path.join(ticker_dir, f"{CURRENT}.tmp")
+        with open(tmp, "w") as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(ticker_dir, CURRENT))
+        prune_generations(ticker_dir, keep=(name, previous and os.path.basename(previous)))
+
+
+@contextmanager
+def writer_lock(ticker_dir: str, thread_lock: threading.Lock):
+    """
+    Exclusive write access to a ticker directory: the in-process lock, then an
+    flock on its LOCK file that other processes writing the ticker wait on.
+    """
+    with thread_lock:
+        os.makedirs(ticker_dir, exist_ok=True)
+        with open(os.path.join(ticker_dir, LOCK), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def prune_generations(ticker_dir: str, keep: Iterable[Optional[str]]):
+    """
+    Remove generation directories other than those in keep (the live one and its predecessor).
+    """
+    keep = {name for name in keep if name}
+    for name in os.listdir(ticker_dir):
+        if name.startswith("g") and name not in keep and os.path.isdir(os.path.join(ticker_dir, name)):
+            shutil.rmtree(os.path.join(ticker_dir, name), ignore_errors=True)
+
+
+def _column(series: PriceSeries, name: str) -> np.ndarray:
+    values = series.dates if name == "date" else getattr(series, name)
+    return np.ascontiguousarray(values, dtype=_DTYPES[name])
+
+
+def _dedupe(series: PriceSeries) -> PriceSeries:
+    """
+    Sort by date and keep the last bar of any duplicated date.
+    """
+    if len(series) < 2 or np.all(series.dates[1:] > series.dates[:-1]):
+        return series
+    order = np.argsort(series.dates, kind="stable")
+    dates = series.dates[order]
+    keep = order[np.append(dates[1:] != dates[:-1], True)]
+    return PriceSeries(series.ticker, series.dates[keep], *[getattr(series, c)[keep] for c in PriceSeries.COLUMNS])
+
+
+def _merge(existing: PriceSeries, incoming: PriceSeries) -> PriceSeries:
+    combined = PriceSeries(
+        incoming.ticker,
+        np.concatenate([existing.dates, incoming.dates]),
+        *[np.concatenate([getattr(existing, c), getattr(incoming, c)]) for c in PriceSeries.COLUMNS]
+    )
+    return _dedupe(combined)
+
+
+def copy_prices(source, target, tickers: Optional[Sequence[str]] = None,
+                start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """
+    Copy history between price stores (e.g. SQLPriceStore <-> ColumnarPriceStore).
+    Any object with iter_series/save works on either side.
+    """
+    totals = {"tickers": 0, "inserted": 0, "updated": 0}
+    for series in source.iter_series(tickers=tickers, start=start, end=end):
+        counts = target.save(series)
+        totals["tickers"] += 1
+        totals["inserted"] += counts["inserted"]
+        totals["updated"] += counts["updated"]
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy price history between the SQL and columnar stores.")
+    parser.add_argument("direction", choices=["export", "import"],
+                        help="export: ohlcv_data -> columnar files; import: columnar files -> ohlcv_data")
+    parser.add_argument("--root", help="Columnar store directory (default: settings.COLUMNAR_STORE_PATH)")
+    parser.add_argument("--tickers", nargs="+")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.core.database import SessionLocal
+    from app.data.repository import SQLPriceStore
+
+    db = SessionLocal()
+    try:
+        sql_store = SQLPriceStore(db)
+        columnar_store = ColumnarPriceStore(args.root or settings.COLUMNAR_STORE_PATH)
+        if args.direction == "export":
+            print(copy_prices(sql_store, columnar_store, tickers=args.tickers))
+        else:
+            print(copy_prices(columnar_store, sql_store, tickers=args.tickers))
+    finally:
+        db.close()
@@ -1,8 +1,12 @@
 import yfinance as yf
-from datetime import datetime, timedelta
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.data.models import OHLCVData, FundamentalData
+from app.data.series import PriceSeries
+from app.data.upsert import bulk_upsert, DEFAULT_CHUNK_SIZE
 
 
 class MarketDataFetcher:
@@ -11,36 +15,106 @@ class MarketDataFetcher:
     """
     
     @staticmethod
-    def fetch_ohlcv(ticker: str, period: str = "1y") -> List[dict]:
+    def fetch_ohlcv(ticker: str, period: str = "1y", start: Optional[date] = None) -> PriceSeries:
         """
         Fetch OHLCV data using yfinance.
         
         Args:
             ticker: Stock symbol (e.g., 'AAPL')
             period: Data period ('1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', 'max')
+            start: Fetch bars from this date onwards instead of a period.
             
         Returns:
-            List of OHLCV dictionaries.
+            PriceSeries with columnar OHLCV arrays (empty on failure).
         """
         try:
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period=period)
-            
-            data = []
-            for date, row in hist.iterrows():
-                data.append({
-                    "ticker": ticker,
-                    "date": date.date(),
-                    "open": row["Open"],
-                    "high": row["High"],
-                    "low": row["Low"],
-                    "close": row["Close"],
-                    "volume": row["Volume"]
-                })
-            return data
+            return MarketDataFetcher._download(ticker, period, start)
         except Exception as e:
             print(f"Error fetching data for {ticker}: {e}")
-            return []
+            return PriceSeries.empty(ticker)
+
+    @staticmethod
+    def fetch_ohlcv_many(
+        tickers: List[str],
+        period: str = "1y",
+        max_workers: Optional[int] = None,
+        batched: Optional[bool] = None
+    ) -> Tuple[Dict[str, PriceSeries], Dict[str, str]]:
+        """
+        Fetch OHLCV data for several symbols at once.
+
+        Args:
+            tickers: Stock or index symbols.
+            period: Data period (see fetch_ohlcv).
+            max_workers: Upper bound on concurrent upstream requests
+                         (default settings.UPSTREAM_MAX_WORKERS).
+            batched: Use one multi-ticker yf.download call instead of per-symbol
+                     requests (default settings.UPSTREAM_BATCH_DOWNLOAD).
+
+        Returns:
+            (series by symbol, error message by symbol). A symbol appears in exactly one of the two.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}, {}
+        if batched is None:
+            batched = settings.UPSTREAM_BATCH_DOWNLOAD
+
+        if batched and len(tickers) > 1:
+            try:
+                return MarketDataFetcher._download_batched(tickers, period)
+            except Exception as e:
+                print(f"Batched download failed ({e}); falling back to per-symbol fetches")
+
+        workers = max(1, min(max_workers or settings.UPSTREAM_MAX_WORKERS, len(tickers)))
+        results, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(MarketDataFetcher._download, t, period): t for t in tickers}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    series = future.result()
+                except Exception as e:
+                    errors[ticker] = str(e)
+                    continue
+                if len(series):
+                    results[ticker] = series
+                else:
+                    errors[ticker] = "no data"
+        return results, errors
+
+    @staticmethod
+    def _download(ticker: str, period: str = "1y", start: Optional[date] = None) -> PriceSeries:
+        """
+        Single-symbol history download; raises on upstream errors.
+        """
+        stock = yf.Ticker(ticker)
+        if start is not None:
+            hist = stock.history(start=start)
+        else:
+            hist = stock.history(period=period)
+        return PriceSeries.from_dataframe(ticker, hist)
+
+    @staticmethod
+    def _download_batched(tickers: List[str], period: str) -> Tuple[Dict[str, PriceSeries], Dict[str, str]]:
+        """
+        One multi-ticker yf.download call, split back into per-symbol series.
+        """
+        frame = yf.download(
+            tickers, period=period, group_by="ticker", auto_adjust=True,
+            threads=True, progress=False
+        )
+        results, errors = {}, {}
+        for ticker in tickers:
+            if frame is None or ticker not in frame.columns.get_level_values(0):
+                errors[ticker] = "no data"
+                continue
+            series = PriceSeries.from_dataframe(ticker, frame[ticker].dropna(how="all"))
+            if len(series):
+                results[ticker] = series
+            else:
+                errors[ticker] = "no data"
+        return results, errors
 
     @staticmethod
     def fetch_fundamentals(ticker: str) -> Optional[dict]:
@@ -74,28 +148,39 @@ class MarketDataStore:
     Service for storing market data to database.
     """
     
+    # Unique index columns used for conflict detection
+    OHLCV_KEY = ("ticker", "date")
+    FUNDAMENTALS_KEY = ("ticker", "report_date")
+
     @staticmethod
-    def store_ohlcv(db: Session, data: List[dict]) -> int:
+    def store_ohlcv(db: Session, data: Union[PriceSeries, List[dict]]) -> int:
         """
         Store OHLCV data, updating existing records.
         Returns count of records stored.
         """
-        count = 0
-        for record in data:
-            existing = db.query(OHLCVData).filter(
-                OHLCVData.ticker == record["ticker"],
-                OHLCVData.date == record["date"]
-            ).first()
-            
-            if existing:
-                for key, value in record.items():
-                    setattr(existing, key, value)
-            else:
-                db.add(OHLCVData(**record))
-                count += 1
-        
+        return MarketDataStore.upsert_ohlcv(db, data)["inserted"]
+
+    @staticmethod
+    def upsert_ohlcv(
+        db: Session,
+        data: Union[PriceSeries, List[dict]],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        use_copy: Optional[bool] = None
+    ) -> Dict[str, int]:
+        """
+        Bulk upsert OHLCV rows against ix_ohlcv_ticker_date.
+
+        Returns:
+            dict with 'inserted' and 'updated' counts.
+        """
+        if isinstance(data, PriceSeries):
+            data = data.to_records()
+        counts = bulk_upsert(
+            db, OHLCVData, data, MarketDataStore.OHLCV_KEY,
+            chunk_size=chunk_size, use_copy=use_copy
+        )
         db.commit()
-        return count
+        return counts
 
     @staticmethod
     def store_fundamentals(db: Session, data: dict) -> bool:
@@ -104,17 +189,18 @@ class MarketDataStore:
         """
         if not data:
             return False
-            
-        existing = db.query(FundamentalData).filter(
-            FundamentalData.ticker == data["ticker"],
-            FundamentalData.report_date == data["report_date"]
-        ).first()
-        
-        if existing:
-            for key, value in data.items():
-                setattr(existing, key, value)
-        else:
-            db.add(FundamentalData(**data))
-        
-        db.commit()
+
+        MarketDataStore.upsert_fundamentals(db, [data])
         return True
+
+    @staticmethod
+    def upsert_fundamentals(db: Session, data: List[dict]) -> Dict[str, int]:
+        """
+        Bulk upsert fundamental snapshots against ix_fundamental_ticker_date.
+
+        Returns:
+            dict with 'inserted' and 'updated' counts.
+        """
+        counts = bulk_upsert(db, FundamentalData, [d for d in data if d], MarketDataStore.FUNDAMENTALS_KEY)
+        db.commit()
+        return counts
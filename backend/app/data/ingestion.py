@@ -0,0 +1,365 @@
+"""
+Background ingestion.
+Keeps the tickers on a persisted watchlist current with incremental jobs that
+fetch only the bars after the last stored date.
+
+Every job is a row in ingestion_jobs, which is where the API reads its status
+from; Celery (app.worker) only carries the job id. A ticker always maps to the
+same shard queue. With INGESTION_ENABLED the API's price repository is
+read-only (see get_price_repository) and queues jobs through request_refresh,
+so a worker consuming that queue is the only writer for its tickers. At most
+one queued or running job exists per ticker: submitting again returns the job
+already in flight. With FEATURE_STORE_ENABLED, a job also
+appends the ticker's new rows to the feature store. refit_volatility refits
+the watchlist's GARCH states every GARCH_REFIT_DAYS (analysis requests only
+advance cached states).
+"""
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.data.models import FundamentalData, IngestionJob, WatchlistEntry
+from app.data.repository import PERIOD_DAYS, PriceRepository, completed_sessions, get_price_store
+
+Dispatch = Callable[[IngestionJob], None]
+
+
+def shard_for(ticker: str, shards: Optional[int] = None) -> int:
+    """
+    Stable shard for a ticker (crc32, so every process agrees).
+    """
+    return zlib.crc32(ticker.upper().encode()) % (shards or settings.INGESTION_SHARDS)
+
+
+def shard_queue(shard: int) -> str:
+    return f"{settings.INGESTION_QUEUE_PREFIX}.{shard}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands timestamps back naive (they are stored as UTC)
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# Watchlist
+
+def get_watchlist(db: Session, active_only: bool = False) -> List[WatchlistEntry]:
+    query = db.query(WatchlistEntry)
+    if active_only:
+        query = query.filter(WatchlistEntry.active.is_(True))
+    return query.order_by(WatchlistEntry.ticker).all()
+
+
+def add_to_watchlist(db: Session, tickers: Sequence[str]) -> Tuple[List[WatchlistEntry], List[str]]:
+    """
+    Add (or reactivate) tickers.
+
+    Returns:
+        (entries for the requested tickers, tickers that were not actively watched before)
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    existing = {
+        e.ticker: e for e in db.query(WatchlistEntry).filter(WatchlistEntry.ticker.in_(tickers)).all()
+    } if tickers else {}
+    added = []
+    for ticker in tickers:
+        entry = existing.get(ticker)
+        if entry is None:
+            entry = existing[ticker] = WatchlistEntry(ticker=ticker, active=True)
+            db.add(entry)
+            added.append(ticker)
+        elif not entry.active:
+            entry.active = True
+            added.append(ticker)
+    db.commit()
+    return [existing[t] for t in tickers], added
+
+
+def remove_from_watchlist(db: Session, ticker: str) -> bool:
+    deleted = db.query(WatchlistEntry).filter(WatchlistEntry.ticker == ticker.upper()).delete()
+    db.commit()
+    return bool(deleted)
+
+
+# Jobs
+
+def get_jobs(
+    db: Session,
+    ticker: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50
+) -> List[IngestionJob]:
+    query = db.query(IngestionJob)
+    if ticker:
+        query = query.filter(IngestionJob.ticker == ticker.upper())
+    if status:
+        query = query.filter(IngestionJob.status == status)
+    return query.order_by(IngestionJob.id.desc()).limit(limit).all()
+
+
+def active_job(db: Session, ticker: str) -> Optional[IngestionJob]:
+    return (
+        db.query(IngestionJob)
+        .filter(IngestionJob.ticker == ticker, IngestionJob.status.in_(IngestionJob.ACTIVE))
+        .first()
+    )
+
+
+def submit_job(db: Session, ticker: str, dispatch: Optional[Dispatch] = None) -> Tuple[IngestionJob, bool]:
+    """
+    Queue an incremental ingestion job for a ticker unless one is already in flight.
+
+    Args:
+        db: Session used to record the job.
+        ticker: Stock symbol.
+        dispatch: Sends the committed job to a worker (defaults to the Celery task on its shard queue).
+
+    Returns:
+        (job, created) - created is False when an in-flight job was returned instead.
+    """
+    ticker = ticker.upper()
+    current = active_job(db, ticker)
+    if current is not None and not _expire_if_stale(db, current):
+        return current, False
+
+    job = IngestionJob(ticker=ticker, status=IngestionJob.QUEUED, shard=shard_for(ticker), created_at=_now())
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process queued the ticker between the check and the insert
+        db.rollback()
+        return active_job(db, ticker), False
+
+    try:
+        (dispatch or _dispatch)(job)
+    except Exception as e:
+        db.rollback()
+        _finish(job, IngestionJob.FAILED, error=f"Could not dispatch job: {e}")
+        db.commit()
+        return job, True
+    # Eager mode (or a fast worker) may already have updated the row
+    db.refresh(job)
+    return job, True
+
+
+def request_refresh(db: Session, ticker: str, dispatch: Optional[Dispatch] = None) -> Optional[IngestionJob]:
+    """
+    Queue a job for a ticker a read-only API repository found stale or missing.
+
+    Skipped (None) when a job for the ticker finished within
+    INGESTION_REFRESH_INTERVAL, so a ticker upstream has no new bar for does not
+    trigger a job on every request; in-flight jobs are returned by submit_job.
+    """
+    ticker = ticker.upper()
+    latest = (
+        db.query(IngestionJob)
+        .filter(IngestionJob.ticker == ticker, IngestionJob.finished_at.isnot(None))
+        .order_by(IngestionJob.finished_at.desc())
+        .first()
+    )
+    if latest is not None and (_now() - _aware(latest.finished_at)).total_seconds() < settings.INGESTION_REFRESH_INTERVAL:
+        return None
+    job, _ = submit_job(db, ticker, dispatch)
+    return job
+
+
+def schedule_watchlist(db: Session, dispatch: Optional[Dispatch] = None) -> Dict[str, int]:
+    """
+    Submit a job for every active watchlist ticker (in-flight tickers are skipped).
+    """
+    totals = {"tickers": 0, "submitted": 0, "in_flight": 0}
+    for entry in get_watchlist(db, active_only=True):
+        _, created = submit_job(db, entry.ticker, dispatch)
+        totals["tickers"] += 1
+        totals["submitted" if created else "in_flight"] += 1
+    return totals
+
+
+def refit_volatility(db: Session, store=None, model=None, today: Optional[date] = None) -> Dict[str, int]:
+    """
+    Refit the GARCH states of every active watchlist ticker on its stored
+    GARCH_HISTORY_PERIOD of bars (worker side).
+
+    Args:
+        model: ForecastingModel whose cache receives the states (default: the process-wide one).
+    """
+    today = today or date.today()
+    tickers = [entry.ticker for entry in get_watchlist(db, active_only=True)]
+    if not tickers:
+        return {"tickers": 0, "fitted": 0}
+    if model is None:
+        from app.ml_layer.forecasting import get_forecasting_model
+        model = get_forecasting_model()
+    days = PERIOD_DAYS.get(settings.GARCH_HISTORY_PERIOD)
+    start = None if days is None else today - timedelta(days=days)
+    series_list = list((store or get_price_store(db)).iter_series(tickers=tickers, start=start))
+    return {"tickers": len(tickers), "fitted": len(model.refit(series_list, today=today))}
+
+
+def run_job(
+    db: Session,
+    job_id: int,
+    store=None,
+    fetcher=None,
+    today: Optional[date] = None,
+    features=None
+) -> Optional[IngestionJob]:
+    """
+    Execute a queued job (worker side). Jobs that already finished are left
+    untouched, so a redelivered task is harmless.
+
+    Args:
+        features: FeatureStore to materialize the ticker's new rows into
+                  (default: the configured one when FEATURE_STORE_ENABLED).
+    """
+    job = db.get(IngestionJob, job_id)
+    if job is None or job.status not in IngestionJob.ACTIVE:
+        return job
+
+    job.status = IngestionJob.RUNNING
+    job.started_at = _now()
+    db.commit()
+
+    try:
+        from app.data.fetcher import MarketDataFetcher
+        fetcher = fetcher or MarketDataFetcher()
+        store = store or get_price_store(db)
+        counts, last_bar = ingest_incremental(store, fetcher, job.ticker, today)
+        if settings.INGESTION_FUNDAMENTALS:
+            _ingest_fundamentals(db, fetcher, job.ticker, today or date.today())
+        if features is None and settings.FEATURE_STORE_ENABLED:
+            from app.ml_layer.feature_store import get_feature_store
+            features = get_feature_store()
+        if features is not None:
+            _update_features(db, store, features, job.ticker)
+    except Exception as e:
+        db.rollback()
+        _finish(job, IngestionJob.FAILED, error=str(e))
+    else:
+        _finish(job, IngestionJob.SUCCEEDED, inserted=counts["inserted"], updated=counts["updated"], last_bar_date=last_bar)
+        entry = db.query(WatchlistEntry).filter(WatchlistEntry.ticker == job.ticker).first()
+        if entry is not None:
+            entry.last_bar_date = last_bar
+            entry.last_ingested_at = job.finished_at
+    db.commit()
+    return job
+
+
+def ingest_incremental(store, fetcher, ticker: str, today: Optional[date] = None) -> Tuple[Dict[str, int], Optional[date]]:
+    """
+    Fetch and store the completed bars after the last stored date (the initial
+    history period when nothing is stored). No upstream call is made when the
+    store already holds the last expected session.
+
+    Returns:
+        (insert/update counts, last stored bar date)
+    """
+    today = today or date.today()
+    last = store.last_date(ticker)
+    if last is not None and last >= PriceRepository.last_expected_session(today):
+        return {"inserted": 0, "updated": 0}, last
+
+    if last is None:
+        series = fetcher.fetch_ohlcv(ticker, period=settings.INGESTION_INITIAL_PERIOD)
+        if not len(series):
+            raise ValueError(f"No price data returned for {ticker}")
+    else:
+        series = fetcher.fetch_ohlcv(ticker, start=last + timedelta(days=1))
+
+    # Today's bar is still forming; only completed sessions are stored
+    series = completed_sessions(series, today)
+    if not len(series):
+        return {"inserted": 0, "updated": 0}, last
+    counts = store.save(series)
+    return counts, max(last, series.last_date) if last else series.last_date
+
+
+def job_to_dict(job: IngestionJob, created: Optional[bool] = None) -> dict:
+    result = {
+        "id": job.id,
+        "ticker": job.ticker,
+        "status": job.status,
+        "shard": job.shard,
+        "inserted": job.inserted,
+        "updated": job.updated,
+        "last_bar_date": job.last_bar_date.isoformat() if job.last_bar_date else None,
+        "error": job.error,
+        "created_at": _isoformat(job.created_at),
+        "started_at": _isoformat(job.started_at),
+        "finished_at": _isoformat(job.finished_at),
+    }
+    if created is not None:
+        result["deduplicated"] = not created
+    return result
+
+
+def watchlist_entry_to_dict(entry: WatchlistEntry) -> dict:
+    return {
+        "ticker": entry.ticker,
+        "active": entry.active,
+        "shard": shard_for(entry.ticker),
+        "last_bar_date": entry.last_bar_date.isoformat() if entry.last_bar_date else None,
+        "last_ingested_at": _isoformat(entry.last_ingested_at),
+    }
+
+
+# Internal helpers
+
+def _dispatch(job: IngestionJob):
+    # Deferred: the worker module imports this one
+    from app.worker import ingest_ticker
+    ingest_ticker.apply_async(args=(job.id,), queue=shard_queue(job.shard))
+
+
+def _expire_if_stale(db: Session, job: IngestionJob) -> bool:
+    """
+    Fail a job stuck queued/running past INGESTION_JOB_TIMEOUT (lost worker or message)
+    so the ticker can be queued again.
+    """
+    age = _now() - _aware(job.started_at or job.created_at or _now())
+    if age.total_seconds() < settings.INGESTION_JOB_TIMEOUT:
+        return False
+    _finish(job, IngestionJob.FAILED, error="Timed out")
+    db.commit()
+    return True
+
+
+def _finish(job: IngestionJob, status: str, error: Optional[str] = None, **fields):
+    job.status = status
+    job.error = error[:1000] if error else None
+    job.finished_at = _now()
+    for name, value in fields.items():
+        setattr(job, name, value)
+
+
+def _ingest_fundamentals(db: Session, fetcher, ticker: str, today: date):
+    # One snapshot per day is enough; later jobs the same day skip the info call
+    exists = db.query(FundamentalData.id).filter(
+        FundamentalData.ticker == ticker, FundamentalData.report_date == today
+    ).first()
+    if exists is not None:
+        return
+    from app.data.fetcher import MarketDataStore
+    MarketDataStore.store_fundamentals(db, fetcher.fetch_fundamentals(ticker))
+
+
+def _update_features(db: Session, store, features, ticker: str):
+    # Appends every bar after the last feature row, so a failure here is caught up by the next job
+    from app.ml_layer.feature_store import load_fundamentals
+    try:
+        features.update(store.load(ticker), load_fundamentals(db, [ticker]).get(ticker))
+    except Exception as e:
+        print(f"Feature update failed for {ticker}: {e}")
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    value = _aware(value)
+    return value.isoformat() if value else None
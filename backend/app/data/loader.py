@@ -0,0 +1,102 @@
+"""
+Streaming price loaders.
+Iterate a ticker universe one PriceSeries at a time, holding at most one chunk
+of rows plus the ticker being assembled in memory.
+"""
+from datetime import date
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+import numpy as np
+from app.data.series import PriceSeries
+
+# Column order of every chunk fed to group_price_chunks
+LOADER_COLUMNS = ("ticker", "date") + PriceSeries.COLUMNS
+
+
+def group_price_chunks(chunks: Iterable[Dict[str, np.ndarray]]) -> Iterator[PriceSeries]:
+    """
+    Turn row chunks sorted by (ticker, date) into one PriceSeries per ticker.
+
+    Args:
+        chunks: Dicts mapping LOADER_COLUMNS to equal-length arrays. A ticker
+                may span chunk boundaries but its rows must be contiguous.
+    """
+    pending_ticker, pending_parts = None, []
+    seen = set()
+    for chunk in chunks:
+        tickers = np.asarray(chunk["ticker"], dtype=object)
+        if not len(tickers):
+            continue
+        columns = {
+            "date": np.asarray(chunk["date"], dtype="datetime64[D]"),
+            **{name: np.asarray(chunk[name], dtype=np.float64) for name in PriceSeries.COLUMNS}
+        }
+        change = np.flatnonzero(tickers[1:] != tickers[:-1]) + 1
+        bounds = zip(np.concatenate([[0], change]), np.concatenate([change, [len(tickers)]]))
+        for start, stop in bounds:
+            ticker = tickers[start]
+            part = {name: values[start:stop] for name, values in columns.items()}
+            if ticker == pending_ticker:
+                pending_parts.append(part)
+                continue
+            if pending_ticker is not None:
+                yield _build_series(pending_ticker, pending_parts)
+            if ticker in seen:
+                raise ValueError(f"Rows for {ticker} are not contiguous; sort input by ticker, date")
+            seen.add(ticker)
+            pending_ticker, pending_parts = ticker, [part]
+
+    if pending_ticker is not None:
+        yield _build_series(pending_ticker, pending_parts)
+
+
+def _build_series(ticker: str, parts: list) -> PriceSeries:
+    if len(parts) == 1:
+        columns = parts[0]
+    else:
+        columns = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+    return PriceSeries(ticker, columns["date"], *[columns[name] for name in PriceSeries.COLUMNS])
+
+
+def iter_file_series(
+    path: str,
+    tickers: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    chunk_size: int = 50_000
+) -> Iterator[PriceSeries]:
+    """
+    Stream PriceSeries from a local Parquet or CSV file with LOADER_COLUMNS,
+    sorted by ticker then date. Parquet is read in record batches (needs pyarrow).
+    """
+    lowered = path.lower()
+    if lowered.endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet price files requires pyarrow")
+        batches = (
+            batch.to_pandas()
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=list(LOADER_COLUMNS))
+        )
+    elif lowered.endswith((".csv", ".csv.gz")):
+        import pandas as pd
+        batches = pd.read_csv(path, usecols=list(LOADER_COLUMNS), chunksize=chunk_size)
+    else:
+        raise ValueError(f"Unsupported price file type: {path}")
+
+    wanted = None if tickers is None else np.array([t.upper() for t in tickers], dtype=object)
+
+    def chunks():
+        for frame in batches:
+            columns = {name: frame[name].to_numpy() for name in LOADER_COLUMNS}
+            columns["date"] = np.asarray(columns["date"], dtype="datetime64[D]")
+            mask = np.ones(len(frame), dtype=bool)
+            if wanted is not None:
+                mask &= np.isin(columns["ticker"].astype(object), wanted)
+            if start is not None:
+                mask &= columns["date"] >= np.datetime64(start, "D")
+            if end is not None:
+                mask &= columns["date"] <= np.datetime64(end, "D")
+            yield {name: values[mask] for name, values in columns.items()}
+
+    return group_price_chunks(chunks())
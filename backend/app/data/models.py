@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Index, Boolean, Text, text
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -49,3 +49,51 @@ class FundamentalData(Base):
     __table_args__ = (
         Index('ix_fundamental_ticker_date', 'ticker', 'report_date', unique=True),
     )
+
+
+class WatchlistEntry(Base):
+    """
+    Ticker kept up to date by the background ingestion scheduler.
+    """
+    __tablename__ = "watchlist"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, unique=True, index=True, nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+    last_bar_date = Column(Date)
+    last_ingested_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class IngestionJob(Base):
+    """
+    One incremental ingestion run for a ticker.
+    At most one queued/running job per ticker is enforced by a partial unique index.
+    """
+    __tablename__ = "ingestion_jobs"
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    ACTIVE = (QUEUED, RUNNING)
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default=QUEUED)
+    shard = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer)
+    updated = Column(Integer)
+    last_bar_date = Column(Date)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index(
+            'ix_ingestion_job_active_ticker', 'ticker', unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')")
+        ),
+    )
@@ -0,0 +1,379 @@
+"""
+Read-through price repository.
+Serves history from the local ohlcv_data table and only fetches bars newer than the last stored date.
+"""
+import asyncio
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Callable, Iterator, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.data.fetcher import MarketDataFetcher, MarketDataStore
+from app.data.loader import LOADER_COLUMNS, group_price_chunks
+from app.data.models import OHLCVData
+from app.data.series import PriceSeries
+
+
+class CacheStatus:
+    """
+    Where the returned history came from.
+    """
+    HIT = "hit"          # Served entirely from the local store
+    PARTIAL = "partial"  # Local history plus an upstream tail fetch
+    MISS = "miss"        # Full upstream fetch
+    STALE = "stale"      # Local history behind the last session; a refresh was queued (read-only mode)
+
+
+# Calendar days covered by yfinance period strings
+PERIOD_DAYS = {
+    "1mo": 31,
+    "3mo": 92,
+    "6mo": 183,
+    "1y": 366,
+    "2y": 731,
+    "5y": 1827,
+    "10y": 3653,
+}
+
+# Allowed gap between the requested start and the first stored bar (weekends, holidays)
+START_GRACE_DAYS = 5
+
+
+def _observed(day: date) -> date:
+    # Saturday holidays close the Friday before, Sunday holidays the Monday after
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    # n-th (1-based, or -1 for last) given weekday of the month
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    # Anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+@lru_cache(maxsize=64)
+def exchange_holidays(year: int) -> Tuple[date, ...]:
+    """
+    Full-day US equity market (NYSE) holidays for a year, by the standing rules.
+    """
+    holidays = [
+        _nth_weekday(year, 1, 0, 3),           # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),           # Washington's Birthday
+        _easter(year) - timedelta(days=2),     # Good Friday
+        _nth_weekday(year, 5, 0, -1),          # Memorial Day
+        _observed(date(year, 7, 4)),           # Independence Day
+        _nth_weekday(year, 9, 0, 1),           # Labor Day
+        _nth_weekday(year, 11, 3, 4),          # Thanksgiving
+        _observed(date(year, 12, 25)),         # Christmas
+    ]
+    # A Saturday New Year's Day is not made up on the preceding Friday
+    if date(year, 1, 1).weekday() != 5:
+        holidays.append(_observed(date(year, 1, 1)))
+    if year >= 2022:
+        holidays.append(_observed(date(year, 6, 19)))  # Juneteenth
+    return tuple(sorted(holidays))
+
+
+class SQLPriceStore:
+    """
+    Price history backed by the ohlcv_data table.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load(self, ticker: str, start: Optional[date] = None, end: Optional[date] = None) -> PriceSeries:
+        """
+        Load bars for a ticker as a PriceSeries (column select, no ORM objects).
+        """
+        query = select(
+            OHLCVData.date, OHLCVData.open, OHLCVData.high,
+            OHLCVData.low, OHLCVData.close, OHLCVData.volume
+        ).where(OHLCVData.ticker == ticker)
+        if start is not None:
+            query = query.where(OHLCVData.date >= start)
+        if end is not None:
+            query = query.where(OHLCVData.date <= end)
+
+        rows = self.db.execute(query.order_by(OHLCVData.date)).all()
+        if not rows:
+            return PriceSeries.empty(ticker)
+
+        dates, *columns = zip(*rows)
+        return PriceSeries(
+            ticker,
+            np.array(dates, dtype="datetime64[D]"),
+            *[np.array(col, dtype=np.float64) for col in columns]
+        )
+
+    def iter_series(
+        self,
+        tickers: Optional[Sequence[str]] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        chunk_size: int = 50_000
+    ) -> Iterator[PriceSeries]:
+        """
+        Stream one PriceSeries per ticker (all tickers by default) in ticker order.
+
+        Rows come through a server-side cursor in chunks of chunk_size, so memory
+        stays bounded by one chunk plus the ticker being assembled.
+        """
+        query = select(
+            OHLCVData.ticker, OHLCVData.date, OHLCVData.open, OHLCVData.high,
+            OHLCVData.low, OHLCVData.close, OHLCVData.volume
+        )
+        if tickers is not None:
+            query = query.where(OHLCVData.ticker.in_([t.upper() for t in tickers]))
+        if start is not None:
+            query = query.where(OHLCVData.date >= start)
+        if end is not None:
+            query = query.where(OHLCVData.date <= end)
+        query = query.order_by(OHLCVData.ticker, OHLCVData.date).execution_options(
+            stream_results=True, yield_per=chunk_size
+        )
+
+        result = self.db.execute(query)
+        chunks = (
+            {name: np.array(values) for name, values in zip(LOADER_COLUMNS, zip(*rows))}
+            for rows in result.partitions()
+        )
+        return group_price_chunks(chunks)
+
+    def last_date(self, ticker: str) -> Optional[date]:
+        return self.db.execute(
+            select(func.max(OHLCVData.date)).where(OHLCVData.ticker == ticker)
+        ).scalar()
+
+    def save(self, series: PriceSeries) -> dict:
+        return MarketDataStore.upsert_ohlcv(self.db, series)
+
+
+_columnar_store = None
+
+
+def get_price_store(db: Session):
+    """
+    Price store for the configured backend (PRICE_STORE_BACKEND).
+    The columnar store is shared process-wide; the SQL store wraps the request session.
+    """
+    global _columnar_store
+    if settings.PRICE_STORE_BACKEND == "columnar":
+        if _columnar_store is None:
+            from app.data.columnar import ColumnarPriceStore
+            _columnar_store = ColumnarPriceStore(settings.COLUMNAR_STORE_PATH)
+        return _columnar_store
+    return SQLPriceStore(db)
+
+
+def plan_history(stored: PriceSeries, start: date, today: date) -> Tuple[str, Optional[date]]:
+    """
+    Decide how to serve a history request from what the local store holds.
+
+    Returns:
+        (CacheStatus.HIT, None)        stored history is complete and current
+        (CacheStatus.PARTIAL, since)   fetch bars from `since` and append them
+        (CacheStatus.MISS, None)       fetch the whole period upstream
+    """
+    # Nothing stored, or stored history starts too late to cover the period
+    if not len(stored) or (stored.dates[0].astype(object) - start).days > START_GRACE_DAYS:
+        return CacheStatus.MISS, None
+    if stored.last_date >= PriceRepository.last_expected_session(today):
+        return CacheStatus.HIT, None
+    return CacheStatus.PARTIAL, stored.last_date + timedelta(days=1)
+
+
+def merge_history(status: str, stored: PriceSeries, fetched: Optional[PriceSeries]) -> PriceSeries:
+    """
+    History to return for a plan_history status once the upstream fetch (if any) is done.
+    """
+    if status == CacheStatus.HIT:
+        return stored
+    if status == CacheStatus.PARTIAL:
+        return PriceSeries.concat(stored, fetched)
+    return fetched
+
+
+def completed_sessions(series: PriceSeries, today: date) -> PriceSeries:
+    """
+    Bars dated before today: today's bar is still forming while the session runs.
+    """
+    return series.slice(stop=int(np.searchsorted(series.dates, np.datetime64(today, "D"))))
+
+
+def get_price_repository(db: Session, fetcher=None, asynchronous: bool = False) -> "PriceRepository":
+    """
+    Repository for API requests on the configured store.
+
+    With INGESTION_ENABLED the ingestion workers are the only price writers: the
+    repository never saves, serves stale history as is and queues an ingestion
+    job for tickers that are stale or not stored yet.
+    """
+    refresh = None
+    if settings.INGESTION_ENABLED:
+        from app.data.ingestion import request_refresh
+        refresh = lambda ticker: request_refresh(db, ticker)
+    repository_class = AsyncPriceRepository if asynchronous else PriceRepository
+    return repository_class(get_price_store(db), fetcher, refresh=refresh)
+
+
+class PriceRepository:
+    """
+    Read-through cache over a local price store with incremental tail fetches.
+    The cache decisions live in plan_history/merge_history, shared with AsyncPriceRepository.
+
+    Given a refresh callback the repository is read-only: instead of fetching
+    and saving missing bars it calls refresh(ticker) and serves what is stored
+    (CacheStatus.STALE). Only a ticker with no usable history is fetched
+    upstream, and that fetch is not stored.
+    """
+
+    def __init__(self, store, fetcher=None, refresh: Optional[Callable[[str], None]] = None):
+        self.store = store
+        self.fetcher = fetcher or MarketDataFetcher()
+        self.refresh = refresh
+
+    def get_history(self, ticker: str, period: str = "3mo", today: Optional[date] = None) -> Tuple[PriceSeries, str]:
+        """
+        Return price history for the period and the cache status.
+
+        Args:
+            ticker: Stock symbol.
+            period: yfinance-style period string.
+            today: Reference date (defaults to the current date).
+
+        Returns:
+            (PriceSeries, CacheStatus value). Only completed sessions are returned,
+            so every status yields the same bars for the same day.
+        """
+        today = today or date.today()
+        series, status = self._history(ticker, period, today)
+        return completed_sessions(series, today), status
+
+    def _history(self, ticker: str, period: str, today: date) -> Tuple[PriceSeries, str]:
+        ticker, today, start = self._request(ticker, period, today)
+        if start is None:
+            # Open-ended periods ('max', 'ytd') cannot be checked for coverage
+            return self.fetcher.fetch_ohlcv(ticker, period=period), CacheStatus.MISS
+
+        try:
+            stored = self.store.load(ticker, start=start)
+        except Exception as e:
+            print(f"Price store unavailable for {ticker}: {e}. Fetching upstream.")
+            self._rollback()
+            return self.fetcher.fetch_ohlcv(ticker, period=period), CacheStatus.MISS
+
+        status, since = plan_history(stored, start, today)
+        if self.refresh is not None and status != CacheStatus.HIT:
+            self._request_refresh(ticker)
+            if status == CacheStatus.PARTIAL:
+                return stored, CacheStatus.STALE
+            return self.fetcher.fetch_ohlcv(ticker, period=period), CacheStatus.MISS
+
+        fetched = None
+        if status == CacheStatus.MISS:
+            fetched = self.fetcher.fetch_ohlcv(ticker, period=period)
+        elif status == CacheStatus.PARTIAL:
+            fetched = self.fetcher.fetch_ohlcv(ticker, start=since)
+        if fetched is not None:
+            self._save(fetched, today)
+        return merge_history(status, stored, fetched), status
+
+    @staticmethod
+    def last_expected_session(today: date) -> date:
+        """
+        Most recent completed exchange session before today (weekends and market holidays skipped).
+        """
+        holidays = exchange_holidays(today.year - 1) + exchange_holidays(today.year)
+        return np.busday_offset(np.datetime64(today, "D"), -1, roll="forward", holidays=holidays).astype(object)
+
+    @staticmethod
+    def _request(ticker: str, period: str, today: Optional[date]) -> Tuple[str, date, Optional[date]]:
+        # Normalized ticker, reference date and first date of the period (None for open-ended periods)
+        today = today or date.today()
+        days = PERIOD_DAYS.get(period)
+        return ticker.upper(), today, None if days is None else today - timedelta(days=days)
+
+    def _request_refresh(self, ticker: str):
+        try:
+            self.refresh(ticker)
+        except Exception as e:
+            print(f"Could not queue a refresh for {ticker}: {e}")
+            self._rollback()
+
+    def _save(self, series: PriceSeries, today: date):
+        # Today's bar is still forming; only persist completed sessions
+        series = completed_sessions(series, today)
+        if not len(series):
+            return
+        try:
+            self.store.save(series)
+        except Exception as e:
+            print(f"Could not store prices for {series.ticker}: {e}")
+            self._rollback()
+
+    def _rollback(self):
+        db = getattr(self.store, "db", None)
+        if db is not None:
+            db.rollback()
+
+
+class AsyncPriceRepository(PriceRepository):
+    """
+    PriceRepository for async handlers: upstream fetches are awaited on an
+    AsyncMarketDataFetcher and blocking store calls run in worker threads.
+    """
+
+    async def get_history(self, ticker: str, period: str = "3mo", today: Optional[date] = None) -> Tuple[PriceSeries, str]:
+        today = today or date.today()
+        series, status = await self._history(ticker, period, today)
+        return completed_sessions(series, today), status
+
+    async def _history(self, ticker: str, period: str, today: date) -> Tuple[PriceSeries, str]:
+        ticker, today, start = self._request(ticker, period, today)
+        if start is None:
+            return await self.fetcher.fetch_ohlcv(ticker, period=period), CacheStatus.MISS
+
+        try:
+            stored = await asyncio.to_thread(self.store.load, ticker, start)
+        except Exception as e:
+            print(f"Price store unavailable for {ticker}: {e}. Fetching upstream.")
+            await asyncio.to_thread(self._rollback)
+            return await self.fetcher.fetch_ohlcv(ticker, period=period), CacheStatus.MISS
+
+        status, since = plan_history(stored, start, today)
+        if self.refresh is not None and status != CacheStatus.HIT:
+            await asyncio.to_thread(self._request_refresh, ticker)
+            if status == CacheStatus.PARTIAL:
+                return stored, CacheStatus.STALE
+            return await self.fetcher.fetch_ohlcv(ticker, period=period), CacheStatus.MISS
+
+        fetched = None
+        if status == CacheStatus.MISS:
+            fetched = await self.fetcher.fetch_ohlcv(ticker, period=period)
+        elif status == CacheStatus.PARTIAL:
+            fetched = await self.fetcher.fetch_ohlcv(ticker, start=since)
+        if fetched is not None:
+            await asyncio.to_thread(self._save, fetched, today)
+        return merge_history(status, stored, fetched), status
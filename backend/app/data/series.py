@@ -0,0 +1,175 @@
+"""
+Columnar price history container.
+Holds OHLCV as contiguous float64 arrays shared by fetch, storage, regime and risk code.
+"""
+from datetime import date
+from typing import List, Optional, Sequence, Union
+import numpy as np
+
+
+class PriceSeries:
+    """
+    Daily OHLCV bars for one ticker in columnar form.
+
+    Attributes:
+        ticker: Stock symbol.
+        dates: datetime64[D] bar dates, ascending.
+        open, high, low, close, volume: float64 arrays aligned with dates.
+    """
+
+    __slots__ = ("ticker", "dates", "open", "high", "low", "close", "volume", "_returns")
+
+    COLUMNS = ("open", "high", "low", "close", "volume")
+
+    def __init__(
+        self,
+        ticker: str,
+        dates: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray
+    ):
+        self.ticker = ticker
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.open = _as_float_array(open)
+        self.high = _as_float_array(high)
+        self.low = _as_float_array(low)
+        self.close = _as_float_array(close)
+        self.volume = _as_float_array(volume)
+        self._returns = None
+
+    @classmethod
+    def empty(cls, ticker: str) -> "PriceSeries":
+        empty = np.empty(0, dtype=np.float64)
+        return cls(ticker, np.empty(0, dtype="datetime64[D]"), empty, empty, empty, empty, empty)
+
+    @classmethod
+    def from_dataframe(cls, ticker: str, df) -> "PriceSeries":
+        """
+        Build from a yfinance history DataFrame.
+        Float64 columns are wrapped without copying.
+        """
+        if df is None or df.empty:
+            return cls.empty(ticker)
+
+        index = df.index
+        if getattr(index, "tz", None) is not None:
+            # Keep the exchange-local calendar date
+            index = index.tz_localize(None)
+
+        return cls(
+            ticker,
+            index.values.astype("datetime64[D]"),
+            df["Open"].to_numpy(dtype=np.float64, copy=False),
+            df["High"].to_numpy(dtype=np.float64, copy=False),
+            df["Low"].to_numpy(dtype=np.float64, copy=False),
+            df["Close"].to_numpy(dtype=np.float64, copy=False),
+            df["Volume"].to_numpy(dtype=np.float64, copy=False)
+        )
+
+    @classmethod
+    def from_records(cls, ticker: str, records: List[dict]) -> "PriceSeries":
+        """
+        Build from OHLCV dictionaries (the legacy list-of-dicts format).
+        """
+        if not records:
+            return cls.empty(ticker)
+        return cls(
+            ticker,
+            np.array([r["date"] for r in records], dtype="datetime64[D]"),
+            *[np.array([r[c] for r in records], dtype=np.float64) for c in cls.COLUMNS]
+        )
+
+    @classmethod
+    def concat(cls, head: "PriceSeries", tail: "PriceSeries") -> "PriceSeries":
+        """
+        Append tail bars after the last date of head (overlapping tail bars are dropped).
+        """
+        if not len(tail):
+            return head
+        if len(head):
+            tail = tail.slice(int(np.searchsorted(tail.dates, head.dates[-1], side="right")))
+        return cls(
+            head.ticker,
+            np.concatenate([head.dates, tail.dates]),
+            *[np.concatenate([getattr(head, c), getattr(tail, c)]) for c in cls.COLUMNS]
+        )
+
+    def __len__(self) -> int:
+        return len(self.close)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return f"PriceSeries({self.ticker!r}, empty)"
+        return f"PriceSeries({self.ticker!r}, {len(self)} bars, {self.dates[0]}..{self.dates[-1]})"
+
+    @property
+    def last_date(self) -> Optional[date]:
+        if not len(self):
+            return None
+        return self.dates[-1].astype(object)
+
+    def returns(self) -> np.ndarray:
+        """
+        Simple daily close-to-close returns (computed once, then shared).
+        """
+        if self._returns is None:
+            self._returns = np.diff(self.close) / self.close[:-1]
+        return self._returns
+
+    def slice(self, start: Optional[int] = None, stop: Optional[int] = None) -> "PriceSeries":
+        """
+        Positional slice; arrays are views of this series.
+        """
+        window = slice(start, stop)
+        return PriceSeries(
+            self.ticker, self.dates[window],
+            self.open[window], self.high[window], self.low[window],
+            self.close[window], self.volume[window]
+        )
+
+    def tail(self, n: int) -> "PriceSeries":
+        return self.slice(max(len(self) - n, 0))
+
+    def to_records(self) -> List[dict]:
+        """
+        Row dictionaries for database storage.
+        """
+        columns = [getattr(self, c).tolist() for c in self.COLUMNS]
+        return [
+            {
+                "ticker": self.ticker,
+                "date": bar_date,
+                "open": o, "high": h, "low": l, "close": c, "volume": v
+            }
+            for bar_date, o, h, l, c, v in zip(self.dates.astype(object), *columns)
+        ]
+
+
+def _as_float_array(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def as_close_array(prices: Union[PriceSeries, np.ndarray, Sequence[float]]) -> np.ndarray:
+    """
+    Closing prices as a float64 array; PriceSeries input is returned without copying.
+    """
+    if isinstance(prices, PriceSeries):
+        return prices.close
+    return np.asarray(prices, dtype=np.float64)
+
+
+def align_closes(series_list: Sequence[PriceSeries], length: Optional[int] = None) -> np.ndarray:
+    """
+    Stack closing prices into a (tickers x time) matrix, right-aligned on each ticker's
+    latest bar and left-padded with NaN. Rows are aligned by position, not calendar
+    date, which is what per-ticker window statistics need.
+    """
+    width = length or max((len(s) for s in series_list), default=0)
+    matrix = np.full((len(series_list), width), np.nan)
+    for row, series in enumerate(series_list):
+        closes = series.close[-width:] if width else series.close[:0]
+        matrix[row, width - len(closes):] = closes
+    return matrix
@@ -0,0 +1,212 @@
+"""
+Set-based bulk upsert helpers.
+Writes whole batches against a unique index instead of one SELECT per row.
+"""
+import csv
+import io
+import math
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import literal_column, select, tuple_, func
+from sqlalchemy.orm import Session
+
+# Rows per INSERT statement
+DEFAULT_CHUNK_SIZE = 1000
+
+# Above this many rows, Postgres loads go through COPY into a staging table
+COPY_THRESHOLD = 20000
+
+# SQLite caps bound parameters per statement
+SQLITE_MAX_PARAMS = 999
+
+
+def bulk_upsert(
+    db: Session,
+    model,
+    rows: List[dict],
+    conflict_columns: Sequence[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    use_copy: Optional[bool] = None
+) -> Dict[str, int]:
+    """
+    Insert or update a batch of rows keyed by a unique index.
+
+    Args:
+        db: Active session (committed by the caller).
+        model: ORM model class owning the target table.
+        rows: Row dictionaries with identical keys.
+        conflict_columns: Columns of the unique index used for conflict detection.
+        chunk_size: Rows per statement.
+        use_copy: Force (True) or disable (False) the Postgres COPY path.
+                  Defaults to COPY for loads above COPY_THRESHOLD.
+
+    Returns:
+        dict with 'inserted' and 'updated' counts.
+    """
+    rows = _dedupe(rows, conflict_columns)
+    if not rows:
+        return {"inserted": 0, "updated": 0}
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        if use_copy is None:
+            use_copy = len(rows) >= COPY_THRESHOLD
+        if use_copy:
+            return _copy_upsert(db, model, rows, conflict_columns)
+        return _insert_on_conflict(db, model, rows, conflict_columns, chunk_size, dialect)
+    if dialect == "sqlite":
+        max_rows = max(1, SQLITE_MAX_PARAMS // len(rows[0]))
+        return _insert_on_conflict(db, model, rows, conflict_columns, min(chunk_size, max_rows), dialect)
+    return _orm_upsert(db, model, rows, conflict_columns)
+
+
+def _dedupe(rows: List[dict], conflict_columns: Sequence[str]) -> List[dict]:
+    """
+    Keep the last row per key; ON CONFLICT cannot touch the same row twice in one statement.
+    """
+    unique = {}
+    for row in rows:
+        unique[tuple(row[c] for c in conflict_columns)] = row
+    return list(unique.values())
+
+
+def _chunks(rows: List[dict], size: int):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _insert_on_conflict(
+    db: Session,
+    model,
+    rows: List[dict],
+    conflict_columns: Sequence[str],
+    chunk_size: int,
+    dialect: str
+) -> Dict[str, int]:
+    """
+    Chunked INSERT ... ON CONFLICT DO UPDATE (Postgres and SQLite).
+    """
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = model.__table__
+    key_cols = [table.c[c] for c in conflict_columns]
+    update_columns = [c for c in rows[0] if c not in conflict_columns]
+
+    inserted = 0
+    total = 0
+    for chunk in _chunks(rows, chunk_size):
+        stmt = insert(table).values(chunk)
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_={c: stmt.excluded[c] for c in update_columns}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+
+        if dialect == "postgresql":
+            # xmax is 0 only for freshly inserted tuples
+            result = db.execute(stmt.returning(literal_column("(xmax = 0)")))
+            inserted += sum(1 for (is_new,) in result if is_new)
+        else:
+            # SQLite has no xmax; count keys already present before writing
+            keys = [tuple(row[c] for c in conflict_columns) for row in chunk]
+            existing = db.execute(
+                select(func.count()).select_from(table).where(tuple_(*key_cols).in_(keys))
+            ).scalar()
+            db.execute(stmt)
+            inserted += len(chunk) - existing
+        total += len(chunk)
+
+    return {"inserted": inserted, "updated": total - inserted}
+
+
+def _copy_upsert(db: Session, model, rows: List[dict], conflict_columns: Sequence[str]) -> Dict[str, int]:
+    """
+    COPY rows into a temporary staging table, then merge with one INSERT ... SELECT.
+    """
+    table = model.__table__.name
+    staging = f"_staging_{table}"
+    columns = list(rows[0].keys())
+    update_columns = [c for c in columns if c not in conflict_columns]
+    column_list = ", ".join(columns)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[c]) for c in columns])
+
+    conn = db.connection()
+    conn.exec_driver_sql(
+        f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+        f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+    )
+    copy_sql = f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+    if update_columns:
+        on_conflict = "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+    else:
+        on_conflict = "DO NOTHING"
+    result = conn.exec_driver_sql(
+        f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+        f"ON CONFLICT ({', '.join(conflict_columns)}) {on_conflict} "
+        f"RETURNING (xmax = 0)"
+    )
+    flags = [is_new for (is_new,) in result]
+    conn.exec_driver_sql(f"TRUNCATE {staging}")
+
+    inserted = sum(1 for is_new in flags if is_new)
+    return {"inserted": inserted, "updated": len(flags) - inserted}
+
+
+def _copy_value(value):
+    """
+    Render a value for CSV COPY (empty field is NULL).
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _orm_upsert(db: Session, model, rows: List[dict], conflict_columns: Sequence[str]) -> Dict[str, int]:
+    """
+    Portable fallback for dialects without ON CONFLICT support.
+    Loads existing keys in one query, then adds or updates in the session.
+    """
+    key_cols = [getattr(model, c) for c in conflict_columns]
+    keys = [tuple(row[c] for c in conflict_columns) for row in rows]
+
+    existing = {}
+    for chunk in _chunks(keys, DEFAULT_CHUNK_SIZE):
+        for obj in db.query(model).filter(tuple_(*key_cols).in_(chunk)):
+            existing[tuple(getattr(obj, c) for c in conflict_columns)] = obj
+
+    inserted = 0
+    for key, row in zip(keys, rows):
+        obj = existing.get(key)
+        if obj is not None:
+            for column, value in row.items():
+                setattr(obj, column, value)
+        else:
+            db.add(model(**row))
+            inserted += 1
+
+    return {"inserted": inserted, "updated": len(rows) - inserted}
@@ -1,4 +1,10 @@
-from typing import Dict
+import hashlib
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple, Union
+import numpy as np
+from app.financial_intelligence import optimizer
+
+DEFAULT_ASSET_CLASSES = ("equity", "bonds", "cash")
+
 
 class AssetAllocationEngine:
     """
@@ -13,6 +19,14 @@ class AssetAllocationEngine:
         "growth": {"equity": 0.9, "bonds": 0.05, "cash": 0.05}
     }
 
+    # Optimizer settings per risk profile (method, risk aversion, per-asset weight cap)
+    OPTIMIZER_PROFILES = {
+        "conservative": {"method": "min_variance", "max_weight": 0.5},
+        "moderate": {"method": "risk_parity"},
+        "aggressive": {"method": "mean_variance", "risk_aversion": 4.0, "max_weight": 0.6},
+        "growth": {"method": "mean_variance", "risk_aversion": 2.0, "max_weight": 0.8}
+    }
+
     @staticmethod
     def get_allocation_strategy(risk_profile: str) -> Dict[str, float]:
         """
@@ -38,3 +52,286 @@ class AssetAllocationEngine:
             rebalancing_actions[asset_class] = diff
             
         return rebalancing_actions
+
+    @staticmethod
+    def optimize_allocation(
+        tickers: Sequence[str],
+        mu: np.ndarray,
+        cov: np.ndarray,
+        risk_profile: str,
+        method: Optional[str] = None,
+        start: Optional[np.ndarray] = None
+    ) -> dict:
+        """
+        Optimized weights over an asset universe for a risk profile.
+
+        Args:
+            tickers: Asset names, in the order of mu and cov.
+            mu: Expected (annualized) returns.
+            cov: Covariance of (annualized) returns.
+            risk_profile: Key of OPTIMIZER_PROFILES (unknown profiles are conservative).
+            method: Overrides the profile's method (see optimizer.METHODS).
+            start: Previous weights to warm-start from.
+
+        Returns:
+            dict with 'method', 'weights', 'expected_return', 'volatility',
+            'risk_contributions' and solver 'iterations'.
+        """
+        config = AssetAllocationEngine.OPTIMIZER_PROFILES.get(
+            risk_profile.lower(), AssetAllocationEngine.OPTIMIZER_PROFILES["conservative"]
+        )
+        method = method or config["method"]
+        mu, cov = np.asarray(mu, dtype=np.float64), np.asarray(cov, dtype=np.float64)
+        # A cap below 1/N has no feasible portfolio
+        upper = max(config.get("max_weight", 1.0), 1.0 / len(mu))
+
+        if method == "mean_variance":
+            weights, iterations = optimizer.solve_mean_variance(
+                mu, cov, risk_aversion=config.get("risk_aversion", 3.0), upper=upper, start=start
+            )
+        elif method == "min_variance":
+            weights, iterations = optimizer.solve_min_variance(cov, upper=upper, start=start)
+        elif method == "risk_parity":
+            weights, iterations = optimizer.solve_risk_parity(cov, start=start)
+        else:
+            raise ValueError(f"method must be one of {', '.join(optimizer.METHODS)}")
+
+        contributions = optimizer.risk_contributions(weights, cov)
+        return {
+            "method": method,
+            "weights": {t: round(float(w), 6) for t, w in zip(tickers, weights)},
+            "expected_return": float(weights @ mu),
+            "volatility": float(np.sqrt(max(weights @ cov @ weights, 0.0))),
+            "risk_contributions": {t: round(float(c), 6) for t, c in zip(tickers, contributions)},
+            "iterations": iterations,
+        }
+
+    @staticmethod
+    def target_matrix(profiles: Sequence[str], asset_classes: Sequence[str] = DEFAULT_ASSET_CLASSES) -> np.ndarray:
+        """
+        (accounts x asset classes) target weights; unknown profiles fall back to
+        conservative like get_allocation_strategy, missing classes get 0.
+        """
+        names = list(AssetAllocationEngine.PORTFOLIOS)
+        table = np.array([
+            [AssetAllocationEngine.PORTFOLIOS[name].get(c, 0.0) for c in asset_classes] for name in names
+        ])
+        lookup = {name: i for i, name in enumerate(names)}
+        fallback = lookup["conservative"]
+        index = np.array([lookup.get(str(p).lower(), fallback) for p in profiles], dtype=np.intp)
+        return table[index]
+
+    @staticmethod
+    def rebalance_batch(
+        holdings: np.ndarray,
+        targets: np.ndarray,
+        asset_classes: Sequence[str] = DEFAULT_ASSET_CLASSES,
+        tolerance: Union[float, Sequence[float]] = 0.05,
+        min_trade: float = 0.0,
+        cash_buffer: Union[float, np.ndarray] = 0.0
+    ) -> Dict[str, np.ndarray]:
+        """
+        Rebalance many accounts in one vectorized pass.
+
+        Args:
+            holdings: (accounts x asset classes) current market values.
+            targets: Target weights, same shape (see target_matrix) or one row for all.
+            asset_classes: Column names; a "cash" column settles trades and holds the buffer.
+            tolerance: Absolute weight drift allowed before an account is rebalanced
+                       (scalar or one per asset class).
+            min_trade: Smallest non-cash trade worth placing; smaller ones are skipped.
+            cash_buffer: Minimum cash weight kept after rebalancing (scalar or per account);
+                         needs a "cash" column.
+
+        Returns:
+            Arrays: "total", "target_weights", "target_values", "drift", "breaches"
+            (bool per class), "trades" (buy > 0, sell < 0; with a cash column they net to 0)
+            and "actionable" (at least one trade to place).
+        """
+        holdings = np.atleast_2d(np.asarray(holdings, dtype=np.float64))
+        targets = np.broadcast_to(np.asarray(targets, dtype=np.float64), holdings.shape)
+        accounts, n_classes = holdings.shape
+        cash = list(asset_classes).index("cash") if "cash" in asset_classes else None
+        buffer = np.broadcast_to(np.asarray(cash_buffer, dtype=np.float64), (accounts,))
+        if cash is None and np.any(buffer > 0):
+            raise ValueError("cash_buffer needs a 'cash' asset class to hold the buffer")
+
+        total = holdings.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weights = np.where(total[:, None] > 0, holdings / total[:, None], 0.0)
+
+        # Raise the cash target to the buffer, scaling the other targets down to make room
+        target_weights = targets.copy()
+        if cash is not None and np.any(buffer > 0):
+            raised = np.maximum(target_weights[:, cash], buffer)
+            others = 1.0 - target_weights[:, cash]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scale = np.where(others > 0, (1.0 - raised) / others, 0.0)
+            target_weights *= scale[:, None]
+            target_weights[:, cash] = raised
+
+        target_values = total[:, None] * target_weights
+        drift = weights - target_weights
+        breaches = np.abs(drift) > np.asarray(tolerance, dtype=np.float64)
+        rebalance = breaches.any(axis=1) & (total > 0)
+
+        trades = np.where(rebalance[:, None], target_values - holdings, 0.0)
+        if cash is not None:
+            invest = np.ones(n_classes, dtype=bool)
+            invest[cash] = False
+            tradable = trades[:, invest]
+            tradable[np.abs(tradable) < min_trade] = 0.0
+
+            # Skipped sells leave less cash for buys: scale buys down to keep the buffer
+            cash_after = holdings[:, cash] - tradable.sum(axis=1)
+            shortfall = np.maximum(buffer * total - cash_after, 0.0)
+            buys = np.where(tradable > 0, tradable, 0.0).sum(axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                keep = np.where(buys > 0, np.clip(1.0 - shortfall / buys, 0.0, 1.0), 1.0)
+            tradable = np.where(tradable > 0, tradable * keep[:, None], tradable)
+            tradable[np.abs(tradable) < min_trade] = 0.0
+
+            # Still short (no buys left to cut): sell more of the largest position,
+            # unless even that position is below min_trade
+            remaining = buffer * total - (holdings[:, cash] - tradable.sum(axis=1))
+            short = np.flatnonzero(rebalance & (remaining > 1e-9))
+            if len(short):
+                positions = holdings[:, invest][short] + tradable[short]
+                largest = positions.argmax(axis=1)
+                amount = np.maximum(remaining[short], min_trade)
+                feasible = amount <= positions[np.arange(len(short)), largest]
+                tradable[short[feasible], largest[feasible]] -= amount[feasible]
+
+            trades[:, invest] = tradable
+            trades[:, cash] = -tradable.sum(axis=1)
+            actionable = np.any(tradable != 0.0, axis=1)
+        else:
+            trades[np.abs(trades) < min_trade] = 0.0
+            actionable = np.any(trades != 0.0, axis=1)
+
+        return {
+            "total": total,
+            "target_weights": target_weights,
+            "target_values": target_values,
+            "drift": drift,
+            "breaches": breaches,
+            "trades": trades,
+            "actionable": actionable,
+        }
+
+    @staticmethod
+    def iter_rebalance_actions(
+        account_ids: Sequence,
+        profiles: Sequence[str],
+        result: Dict[str, np.ndarray],
+        asset_classes: Sequence[str] = DEFAULT_ASSET_CLASSES
+    ) -> Iterator[dict]:
+        """
+        One record per account that needs trades, from a rebalance_batch result.
+        """
+        classes = list(asset_classes)
+        rows = np.flatnonzero(result["actionable"])
+        # Convert once per batch; per-element numpy scalars dominate otherwise
+        totals = np.round(result["total"][rows], 2).tolist()
+        drifts = np.round(np.abs(result["drift"][rows]).max(axis=1), 4).tolist()
+        breaches = result["breaches"][rows].tolist()
+        trades = np.round(result["trades"][rows], 2).tolist()
+        for j, i in enumerate(rows.tolist()):
+            yield {
+                "account_id": account_ids[i],
+                "profile": profiles[i],
+                "total_value": totals[j],
+                "max_drift": drifts[j],
+                "breaches": [c for c, hit in zip(classes, breaches[j]) if hit],
+                "trades": {c: v for c, v in zip(classes, trades[j]) if v != 0.0},
+            }
+
+
+# Returns (mu, cov, extra result fields) for a universe; only called on a cache miss
+Estimator = Callable[[], Tuple[np.ndarray, np.ndarray, dict]]
+
+
+class RegimeAllocator:
+    """
+    Optimizing allocator keyed by market regime.
+
+    Results are cached per (profile, method, regime, universe) so most requests
+    skip estimation and the solve; each solve warm-starts from the last weights
+    found for the same (profile, method, universe).
+    """
+
+    def __init__(self, results, warm_starts):
+        """
+        Args:
+            results: SharedCache for finished allocations.
+            warm_starts: In-process TTLCache of the latest weights per universe.
+        """
+        self.results = results
+        self.warm_starts = warm_starts
+
+    @staticmethod
+    def universe_key(tickers: Sequence[str]) -> str:
+        return hashlib.sha1(",".join(tickers).encode()).hexdigest()[:16]
+
+    def allocate(
+        self,
+        risk_profile: str,
+        tickers: Sequence[str],
+        regime: Optional[str],
+        estimate: Estimator,
+        method: Optional[str] = None,
+        scope: Sequence = (),
+        ttl=None
+    ) -> dict:
+        """
+        Cached optimized allocation for the universe under the current regime.
+
+        Args:
+            tickers: Asset universe (order does not matter).
+            regime: Current regime label, part of the cache key. None when finding it
+                    is itself costly: estimate() then reports it as extra["regime"]
+                    and scope must pin it down (e.g. benchmark, session, model version).
+            estimate: Regime-conditioned (mu, cov, extra) in sorted ticker order.
+            scope: Extra key parts (e.g. session date, model version).
+            ttl: Result TTL, or a callable of the result (see SharedCache.set).
+        """
+        tickers = sorted({t.upper() for t in tickers})
+        profile = risk_profile.lower()
+        config = AssetAllocationEngine.OPTIMIZER_PROFILES.get(profile, AssetAllocationEngine.OPTIMIZER_PROFILES["conservative"])
+        method = method or config["method"]
+        universe = self.universe_key(tickers)
+        key = self.results.key(profile, method, regime or "", universe, *scope)
+        result = self.results.get(key)
+        if result is not None:
+            return dict(result, cached=True)
+
+        mu, cov, extra = estimate()
+        warm_key = (profile, method, universe)
+        previous = self.warm_starts.get(warm_key)
+        result = AssetAllocationEngine.optimize_allocation(tickers, mu, cov, profile, method, start=previous)
+        self.warm_starts.set(warm_key, np.array([result["weights"][t] for t in tickers]))
+        result.update(extra, risk_profile=profile, warm_started=previous is not None)
+        if regime is not None:
+            result["regime"] = regime
+        self.results.set(key, result, ttl)
+        return dict(result, cached=False)
+
+    @staticmethod
+    def day_weights(timeline: dict, regime: str, dates: np.ndarray) -> np.ndarray:
+        """
+        Weight of each return date for regime-conditioned estimates: the posterior
+        probability of the regime when the HMM provides one, otherwise 1 on days
+        labelled with it. Dates outside the timeline get 0.
+        """
+        timeline_dates = np.array(timeline["dates"], dtype="datetime64[D]")
+        probabilities = (timeline.get("probabilities") or {}).get(regime)
+        if probabilities is not None:
+            values = np.asarray(probabilities, dtype=np.float64)
+        else:
+            values = (np.array(timeline["regimes"], dtype=object) == regime).astype(np.float64)
+
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if not len(timeline_dates):
+            return np.zeros(len(dates))
+        index = np.minimum(np.searchsorted(timeline_dates, dates), len(timeline_dates) - 1)
+        return np.where(timeline_dates[index] == dates, values[index], 0.0)
@@ -0,0 +1,153 @@
+"""
+Portfolio optimizers for the allocation engine.
+
+    mean_variance   max  w'mu - (risk_aversion / 2) w'Sigma w   s.t. sum(w) = 1, lower <= w <= upper
+    min_variance    the same with mu = 0
+    risk_parity     equal risk contributions (long-only, budgets b): cyclical coordinate
+                    descent on  1/2 y'Sigma y - sum(b log y),  w = y / sum(y)
+
+The constrained problems use accelerated projected gradient with an exact
+projection onto the capped simplex. Every solver accepts a starting point, so
+re-solving after a small change in the inputs (a new bar, the same regime)
+takes a handful of iterations instead of a cold start. Inputs are small dense
+N x N matrices (N = number of assets), so this stays in NumPy.
+"""
+from typing import Optional, Sequence, Tuple
+import numpy as np
+
+METHODS = ("mean_variance", "min_variance", "risk_parity")
+
+
+def project_capped_simplex(v: np.ndarray, lower: np.ndarray, upper: np.ndarray, iterations: int = 60) -> np.ndarray:
+    """
+    Euclidean projection onto {w : sum(w) = 1, lower <= w <= upper} by bisection on the shift.
+    """
+    lo = float(np.min(v - upper))
+    hi = float(np.max(v - lower))
+    for _ in range(iterations):
+        tau = (lo + hi) / 2
+        if np.clip(v - tau, lower, upper).sum() > 1.0:
+            lo = tau
+        else:
+            hi = tau
+    return np.clip(v - (lo + hi) / 2, lower, upper)
+
+
+def solve_mean_variance(
+    mu: np.ndarray,
+    cov: np.ndarray,
+    risk_aversion: float = 3.0,
+    lower: float = 0.0,
+    upper: float = 1.0,
+    start: Optional[np.ndarray] = None,
+    tol: float = 1e-10,
+    max_iter: int = 5000
+) -> Tuple[np.ndarray, int]:
+    """
+    Long-only (boxed) mean-variance weights via FISTA.
+
+    Returns:
+        (weights, iterations)
+    """
+    n = len(mu)
+    lower_b, upper_b = np.full(n, float(lower)), np.full(n, float(upper))
+    if lower_b.sum() > 1 + 1e-12 or upper_b.sum() < 1 - 1e-12:
+        raise ValueError("Weight bounds leave no feasible portfolio")
+
+    # Gradient of the objective is Lipschitz with the largest eigenvalue of risk_aversion * Sigma
+    step = 1.0 / max(risk_aversion * float(np.linalg.eigvalsh(cov)[-1]), 1e-12)
+    w = project_capped_simplex(np.full(n, 1.0 / n) if start is None else np.asarray(start, dtype=np.float64), lower_b, upper_b)
+    y, t = w.copy(), 1.0
+    for iteration in range(1, max_iter + 1):
+        gradient = mu - risk_aversion * (cov @ y)
+        w_next = project_capped_simplex(y + step * gradient, lower_b, upper_b)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = w_next + ((t - 1) / t_next) * (w_next - w)
+        converged = np.max(np.abs(w_next - w)) < tol
+        w, t = w_next, t_next
+        if converged:
+            return w, iteration
+    return w, max_iter
+
+
+def solve_min_variance(cov: np.ndarray, **kwargs) -> Tuple[np.ndarray, int]:
+    return solve_mean_variance(np.zeros(len(cov)), cov, risk_aversion=1.0, **kwargs)
+
+
+def solve_risk_parity(
+    cov: np.ndarray,
+    budgets: Optional[Sequence[float]] = None,
+    start: Optional[np.ndarray] = None,
+    tol: float = 1e-10,
+    max_iter: int = 1000
+) -> Tuple[np.ndarray, int]:
+    """
+    Risk-budgeting weights (equal budgets by default) by cyclical coordinate descent.
+
+    Returns:
+        (weights, sweeps)
+    """
+    n = len(cov)
+    b = np.full(n, 1.0 / n) if budgets is None else np.asarray(budgets, dtype=np.float64) / np.sum(budgets)
+    diag = np.diag(cov)
+    if np.any(diag <= 0):
+        raise ValueError("Risk parity needs a positive variance for every asset")
+
+    # The objective is scale-sensitive; rescale a warm start to the unconstrained optimum's scale
+    y = 1.0 / np.sqrt(diag) if start is None else np.maximum(np.asarray(start, dtype=np.float64), 1e-12)
+    y = y * np.sqrt(b.sum() / float(y @ cov @ y))
+    for sweep in range(1, max_iter + 1):
+        previous = y.copy()
+        for i in range(n):
+            c = cov[i] @ y - diag[i] * y[i]
+            y[i] = (-c + np.sqrt(c * c + 4 * diag[i] * b[i])) / (2 * diag[i])
+        if np.max(np.abs(y - previous)) < tol * max(1.0, np.max(y)):
+            break
+    return y / y.sum(), sweep
+
+
+def risk_contributions(weights: np.ndarray, cov: np.ndarray) -> np.ndarray:
+    """
+    Fraction of portfolio variance from each asset (sums to 1).
+    """
+    marginal = cov @ weights
+    variance = float(weights @ marginal)
+    return weights * marginal / variance if variance > 0 else np.zeros_like(weights)
+
+
+def regime_moments(
+    returns: np.ndarray,
+    regime_weights: np.ndarray,
+    prior_strength: float = 60.0,
+    periods_per_year: int = 252
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Annualized mean and covariance of daily returns conditioned on a regime.
+
+    Each day counts with its regime weight (e.g. the posterior probability of
+    the current regime), and the weighted moments are blended with the
+    unconditional ones in proportion n_eff / (n_eff + prior_strength), where
+    n_eff is the effective number of regime days. A regime seen on only a few
+    days therefore stays close to the full-sample estimate.
+
+    Returns:
+        (mu, cov, credibility of the regime estimate in [0, 1])
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    weights = np.clip(np.asarray(regime_weights, dtype=np.float64), 0.0, None)
+    full_mu = returns.mean(axis=0)
+    full_cov = np.cov(returns, rowvar=False, bias=True).reshape(returns.shape[1], returns.shape[1])
+
+    total = weights.sum()
+    if total <= 0:
+        return full_mu * periods_per_year, full_cov * periods_per_year, 0.0
+    p = weights / total
+    regime_mu = p @ returns
+    centered = returns - regime_mu
+    regime_cov = (centered * p[:, np.newaxis]).T @ centered
+
+    n_eff = total * total / float(weights @ weights)
+    credibility = n_eff / (n_eff + prior_strength)
+    mu = credibility * regime_mu + (1 - credibility) * full_mu
+    cov = credibility * regime_cov + (1 - credibility) * full_cov
+    return mu * periods_per_year, cov * periods_per_year, float(credibility)
@@ -0,0 +1,333 @@
+"""
+Portfolio risk.
+Shrinkage covariance over a rolling window of daily returns for a fixed
+universe of tickers, and the portfolio metrics derived from it.
+
+CovarianceState keeps the sufficient statistics of the Ledoit-Wolf estimator
+(count, sum of returns, cross-product matrix, sum of |x|^2 x and of |x|^4), so
+adding a new bar and dropping the oldest one costs O(N^2) instead of
+rebuilding the N x N matrix from the whole window. States are cached per
+universe by CovarianceCache; requests for the same universe share one state,
+which only advances when a bar newer than its as_of date shows up.
+"""
+import threading
+from collections import OrderedDict, deque
+from datetime import date
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.data.series import PriceSeries
+from app.financial_intelligence.risk import RiskEngine
+
+# Re-derive the running sums from the window this often to shed float drift
+RESYNC_INTERVAL = 1024
+
+
+def align_returns(series_list: Sequence[PriceSeries]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Daily simple returns on the dates every series has a bar for.
+
+    Returns:
+        (dates of the returns, (T x N) return matrix with columns in input order)
+    """
+    if not series_list:
+        return np.array([], dtype="datetime64[D]"), np.empty((0, 0))
+    common = series_list[0].dates
+    for series in series_list[1:]:
+        common = np.intersect1d(common, series.dates, assume_unique=True)
+    closes = np.column_stack([s.close[np.searchsorted(s.dates, common)] for s in series_list])
+    if len(common) < 2:
+        return common[:0], np.empty((0, len(series_list)))
+    return common[1:], np.diff(closes, axis=0) / closes[:-1]
+
+
+class CovarianceState:
+    """
+    Rolling-window Ledoit-Wolf covariance for one universe, updated bar by bar.
+    """
+
+    def __init__(self, tickers: Sequence[str], window: int = 252):
+        self.tickers = list(tickers)
+        self.window = window
+        self.as_of: Optional[date] = None
+        self.rows: deque = deque()
+        self.updates = 0
+        self._lock = threading.Lock()
+        self._estimate = None
+        self._reset_sums()
+
+    @property
+    def n_assets(self) -> int:
+        return len(self.tickers)
+
+    @property
+    def observations(self) -> int:
+        return len(self.rows)
+
+    def update(self, dates: np.ndarray, returns: np.ndarray) -> int:
+        """
+        Fold in the return rows dated after as_of, dropping rows that fall out of the window.
+
+        Args:
+            dates: Ascending dates of the rows.
+            returns: (T x N) returns with columns in ticker order.
+
+        Returns:
+            Number of rows added.
+        """
+        returns = np.asarray(returns, dtype=np.float64)
+        if returns.ndim != 2 or returns.shape[1] != self.n_assets:
+            raise ValueError(f"Expected a (T x {self.n_assets}) return matrix")
+        with self._lock:
+            if self.as_of is not None:
+                keep = np.asarray(dates) > np.datetime64(self.as_of, "D")
+                dates, returns = np.asarray(dates)[keep], returns[keep]
+            returns = returns[-self.window:]
+            dates = np.asarray(dates)[-len(returns):] if len(returns) else dates[:0]
+            if not len(returns):
+                return 0
+
+            self._accumulate(returns, 1.0)
+            # Copy so the window does not pin the caller's whole matrix
+            self.rows.extend(np.array(returns))
+            overflow = len(self.rows) - self.window
+            if overflow > 0:
+                expired = np.array([self.rows.popleft() for _ in range(overflow)])
+                self._accumulate(expired, -1.0)
+
+            self.as_of = dates[-1].astype(object)
+            self.updates += len(returns)
+            if self.updates // RESYNC_INTERVAL != (self.updates - len(returns)) // RESYNC_INTERVAL:
+                self._resync()
+            self._estimate = None
+            return len(returns)
+
+    def mean(self) -> np.ndarray:
+        return self.sum_x / self.n
+
+    def sample_covariance(self) -> np.ndarray:
+        """
+        Maximum-likelihood (divide by n) covariance of the window.
+        """
+        m = self.mean()
+        return self.sum_xx / self.n - np.outer(m, m)
+
+    def ledoit_wolf(self) -> Tuple[np.ndarray, float]:
+        """
+        Ledoit-Wolf shrinkage towards a scaled identity, from the running sums only.
+
+        Returns:
+            (shrunk covariance, shrinkage intensity); memoized until the next update.
+        """
+        with self._lock:
+            if self._estimate is None:
+                self._estimate = self._ledoit_wolf()
+            return self._estimate
+
+    def returns_matrix(self) -> np.ndarray:
+        with self._lock:
+            return np.array(self.rows) if self.rows else np.empty((0, self.n_assets))
+
+    def _ledoit_wolf(self) -> Tuple[np.ndarray, float]:
+        n, p = self.n, self.n_assets
+        if n < 2:
+            raise ValueError("At least 2 return observations are needed")
+        m = self.mean()
+        cov = self.sum_xx / n - np.outer(m, m)
+        mu = np.trace(cov) / p
+
+        # sum_t |x_t - m|^4 expanded in the accumulated moments
+        c = m @ m
+        sum_a = np.trace(self.sum_xx)
+        sum_b = m @ self.sum_x
+        sum_b2 = m @ self.sum_xx @ m
+        sum_ab = m @ self.sum_sq_x
+        centered_quartic = (
+            self.sum_quad + 4 * sum_b2 + n * c * c - 4 * sum_ab + 2 * c * sum_a - 4 * c * sum_b
+        )
+
+        cov_norm = np.sum(cov * cov)
+        beta = max(centered_quartic / n - cov_norm, 0.0) / (p * n)
+        delta = (cov_norm - 2 * mu * np.trace(cov) + p * mu * mu) / p
+        shrinkage = 0.0 if delta <= 0 else min(beta, delta) / delta
+        shrunk = (1 - shrinkage) * cov
+        shrunk[np.diag_indices(p)] += shrinkage * mu
+        return shrunk, float(shrinkage)
+
+    def _accumulate(self, returns: np.ndarray, sign: float):
+        squared = np.einsum("ij,ij->i", returns, returns)
+        self.n += int(sign) * len(returns)
+        self.sum_x += sign * returns.sum(axis=0)
+        self.sum_xx += sign * (returns.T @ returns)
+        self.sum_sq_x += sign * (squared @ returns)
+        self.sum_quad += sign * float(squared @ squared)
+
+    def _reset_sums(self):
+        p = self.n_assets
+        self.n = 0
+        self.sum_x = np.zeros(p)
+        self.sum_xx = np.zeros((p, p))
+        self.sum_sq_x = np.zeros(p)
+        self.sum_quad = 0.0
+
+    def _resync(self):
+        self._reset_sums()
+        if self.rows:
+            self._accumulate(np.array(self.rows), 1.0)
+
+
+def portfolio_risk(
+    state: CovarianceState,
+    weights: np.ndarray,
+    confidence_levels: Sequence[float] = (0.95, 0.99),
+    horizon: int = 1,
+    portfolio_value: Optional[float] = None
+) -> dict:
+    """
+    Volatility, parametric and historical VaR/CVaR and per-holding risk contributions.
+
+    Args:
+        state: Covariance state for the portfolio's universe.
+        weights: Portfolio weights in the state's ticker order.
+        horizon: Holding period in trading days (square-root-of-time scaling).
+        portfolio_value: Adds currency amounts next to the fractions.
+
+    Returns:
+        Fractions of portfolio value; contributions sum to the portfolio volatility.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    cov, shrinkage = state.ledoit_wolf()
+    mean = state.mean()
+    marginal = cov @ weights
+    variance = float(weights @ marginal)
+    volatility = np.sqrt(max(variance, 0.0))
+    scale = np.sqrt(horizon)
+
+    history = state.returns_matrix() @ weights
+    if horizon > 1:
+        # Overlapping horizon returns from the window's own history
+        compounded = np.cumprod(1 + history)
+        history = compounded[horizon - 1:] / np.concatenate([[1.0], compounded[:-horizon]]) - 1
+
+    var, historical_var, historical_cvar = {}, {}, {}
+    for c in confidence_levels:
+        z = NormalDist().inv_cdf(c)
+        var[str(c)] = max(z * volatility * scale - float(mean @ weights) * horizon, 0.0)
+        historical_var[str(c)] = float(RiskEngine.value_at_risk(history, c)) if len(history) else None
+        historical_cvar[str(c)] = float(RiskEngine.expected_shortfall(history, c)) if len(history) else None
+
+    component = weights * marginal / volatility if volatility > 0 else np.zeros_like(weights)
+    contributions = [
+        {
+            "ticker": ticker,
+            "weight": float(w),
+            "volatility": float(np.sqrt(cov[i, i])),
+            "marginal": float(marginal[i] / volatility) if volatility > 0 else 0.0,
+            "contribution": float(component[i]),
+            "percent": float(component[i] / volatility) if volatility > 0 else 0.0,
+        }
+        for i, (ticker, w) in enumerate(zip(state.tickers, weights))
+    ]
+    result = {
+        "as_of": str(state.as_of) if state.as_of else None,
+        "observations": state.observations,
+        "horizon": horizon,
+        "shrinkage": shrinkage,
+        "volatility": volatility,
+        "annualized_volatility": volatility * np.sqrt(252),
+        "parametric_var": var,
+        "historical_var": historical_var,
+        "historical_cvar": historical_cvar,
+        "contributions": contributions,
+    }
+    if portfolio_value is not None:
+        result["portfolio_value"] = portfolio_value
+        result["parametric_var_amount"] = {c: v * portfolio_value for c, v in var.items()}
+    return result
+
+
+class CovarianceCache:
+    """
+    LRU of CovarianceState per universe (sorted ticker tuple).
+    """
+
+    def __init__(self, maxsize: int = 256, window: int = 252):
+        self.maxsize = maxsize
+        self.window = window
+        self._states: "OrderedDict[Tuple[str, ...], CovarianceState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tickers: Sequence[str], series_list: Sequence[PriceSeries]) -> CovarianceState:
+        """
+        State for the universe, created from the series on first use and
+        advanced with any bars newer than its as_of date.
+
+        Args:
+            tickers: Universe (any order).
+            series_list: Price history for every ticker (any order).
+        """
+        key = tuple(sorted(t.upper() for t in tickers))
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                self.misses += 1
+                state = self._states[key] = CovarianceState(key, window=self.window)
+                while len(self._states) > self.maxsize:
+                    self._states.popitem(last=False)
+            else:
+                self.hits += 1
+                self._states.move_to_end(key)
+
+        by_ticker = {s.ticker.upper(): s for s in series_list if len(s)}
+        missing = [t for t in key if t not in by_ticker]
+        if missing:
+            raise ValueError(f"No price history for {', '.join(missing)}")
+        # No common bar can be newer than the earliest last bar
+        latest = min(by_ticker[t].last_date for t in key)
+        if state.as_of is None or latest > state.as_of:
+            dates, returns = align_returns([by_ticker[t] for t in key])
+            state.update(dates, returns)
+        return state
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"universes": len(self._states), "hits": self.hits, "misses": self.misses}
+
+
+_covariance_cache: Optional[CovarianceCache] = None
+_covariance_lock = threading.Lock()
+
+
+def get_covariance_cache() -> CovarianceCache:
+    """
+    Process-wide covariance cache sized by settings.
+    """
+    global _covariance_cache
+    with _covariance_lock:
+        if _covariance_cache is None:
+            from app.core.config import settings
+            _covariance_cache = CovarianceCache(
+                maxsize=settings.PORTFOLIO_COVARIANCE_CACHE_SIZE,
+                window=settings.PORTFOLIO_COVARIANCE_WINDOW
+            )
+        return _covariance_cache
+
+
+def weights_from_holdings(holdings: Dict[str, float]) -> Tuple[List[str], np.ndarray, float]:
+    """
+    Normalise holdings (ticker -> market value or weight) to weights.
+
+    Returns:
+        (tickers sorted, weights in that order, total value)
+    """
+    merged: Dict[str, float] = {}
+    for ticker, value in holdings.items():
+        merged[ticker.strip().upper()] = merged.get(ticker.strip().upper(), 0.0) + float(value)
+    tickers = sorted(t for t in merged if t)
+    values = np.array([merged[t] for t in tickers], dtype=np.float64)
+    total = float(values.sum())
+    if not len(values) or total <= 0:
+        raise ValueError("Holdings must have a positive total value")
+    return tickers, values / total, total
@@ -1,5 +1,6 @@
-from typing import List
+from typing import Dict, List, Optional, Sequence, Union
 import numpy as np
+from app.data.series import PriceSeries, as_close_array
 
 class RiskEngine:
     """
@@ -7,24 +8,11 @@ class RiskEngine:
     """
     
     @staticmethod
-    def calculate_max_drawdown(prices: List[float]) -> float:
+    def calculate_max_drawdown(prices: Union[PriceSeries, List[float]]) -> float:
         """
-        Calculate Maximum Drawdown from a list of prices.
+        Calculate Maximum Drawdown from a list of prices or a PriceSeries.
         """
-        if not prices:
-            return 0.0
-            
-        peak = prices[0]
-        max_drawdown = 0.0
-        
-        for price in prices:
-            if price > peak:
-                peak = price
-            drawdown = (peak - price) / peak
-            if drawdown > max_drawdown:
-                max_drawdown = drawdown
-                
-        return max_drawdown
+        return float(RiskEngine.max_drawdown(as_close_array(prices)))
 
     @staticmethod
     def calculate_var(
@@ -41,19 +29,103 @@ class RiskEngine:
         Returns:
             float: The VaR value (positive number representing loss percentage).
         """
-        if not returns:
-            return 0.0
-            
-        # Sort returns
-        sorted_returns = sorted(returns)
-        
-        # Calculate index for the quantile
-        index = int((1 - confidence_level) * len(sorted_returns))
-        
-        # Return the value at that index (loss is negative, so flip sign if needed or return raw)
-        # Usually VaR is expressed as a positive number representing potential loss
-        var_value = -sorted_returns[index]
-        return var_value if var_value > 0 else 0.0
+        return float(RiskEngine.value_at_risk(np.asarray(returns, dtype=np.float64), confidence_level))
+
+    @staticmethod
+    def max_drawdown(prices: np.ndarray) -> Union[float, np.ndarray]:
+        """
+        Maximum drawdown over the last axis using a running maximum.
+
+        Args:
+            prices: 1-D series or 2-D (assets x time) matrix. NaN marks missing bars
+                    (e.g. left padding for shorter histories) and is skipped.
+
+        Returns:
+            float for 1-D input, otherwise one drawdown per asset.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.shape[-1] == 0:
+            return np.zeros(prices.shape[:-1]) if prices.ndim > 1 else 0.0
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            peak = np.fmax.accumulate(prices, axis=-1)
+            drawdown = (peak - prices) / peak
+        # fmax.reduce ignores NaN; all-NaN rows come out as NaN and map to 0
+        result = np.nan_to_num(np.fmax.reduce(drawdown, axis=-1), nan=0.0)
+        result = np.maximum(result, 0.0)
+        return float(result) if result.ndim == 0 else result
+
+    @staticmethod
+    def value_at_risk(returns: np.ndarray, confidence_level: float = 0.95) -> Union[float, np.ndarray]:
+        """
+        Historical-simulation VaR over the last axis via partial selection.
+
+        Picks the same order statistic as a full sort (index int((1 - c) * n))
+        with np.partition, so cost is O(n) per asset.
+
+        Args:
+            returns: 1-D series or 2-D (assets x time) matrix; NaN entries are ignored.
+            confidence_level: The confidence level (default 0.95).
+
+        Returns:
+            float for 1-D input, otherwise one VaR per asset (positive loss, floored at 0).
+        """
+        returns = np.asarray(returns, dtype=np.float64)
+        squeeze = returns.ndim == 1
+        returns = np.atleast_2d(returns)
+
+        missing = np.isnan(returns)
+        counts = returns.shape[-1] - missing.sum(axis=-1)
+        index = np.minimum(((1 - confidence_level) * counts).astype(int), np.maximum(counts - 1, 0))
+
+        result = np.zeros(len(returns))
+        has_data = counts > 0
+        if has_data.any():
+            # Missing values sort after every real return
+            values = np.where(missing, np.inf, returns) if missing.any() else returns
+            kth = np.unique(index[has_data])
+            selected = np.partition(values[has_data], kth, axis=-1)
+            picked = np.take_along_axis(selected, index[has_data][:, np.newaxis], axis=-1)[:, 0]
+            result[has_data] = np.maximum(-picked, 0.0)
+
+        return float(result[0]) if squeeze else result
+
+    @staticmethod
+    def expected_shortfall(returns: np.ndarray, confidence_level: float = 0.95) -> Union[float, np.ndarray]:
+        """
+        Historical CVaR over the last axis: mean loss of the returns at or beyond
+        the VaR order statistic (the same int((1 - c) * n) index as value_at_risk).
+
+        Args:
+            returns: 1-D series or 2-D (assets x time) matrix; NaN entries are ignored.
+            confidence_level: The confidence level (default 0.95).
+
+        Returns:
+            float for 1-D input, otherwise one CVaR per asset (positive loss, floored at 0).
+        """
+        returns = np.asarray(returns, dtype=np.float64)
+        squeeze = returns.ndim == 1
+        returns = np.atleast_2d(returns)
+
+        missing = np.isnan(returns)
+        counts = returns.shape[-1] - missing.sum(axis=-1)
+        index = np.minimum(((1 - confidence_level) * counts).astype(int), np.maximum(counts - 1, 0))
+        values = np.where(missing, np.inf, returns) if missing.any() else returns
+
+        result = np.zeros(len(returns))
+        for k in np.unique(index[counts > 0]):
+            rows = np.flatnonzero((index == k) & (counts > 0))
+            tail = np.partition(values[rows], k, axis=-1)[:, :k + 1]
+            result[rows] = np.maximum(-tail.mean(axis=-1), 0.0)
+
+        return float(result[0]) if squeeze else result
+
+    @staticmethod
+    def calculate_cvar(returns: List[float], confidence_level: float = 0.95) -> float:
+        """
+        Expected shortfall (CVaR) by historical simulation, as a positive loss percentage.
+        """
+        return float(RiskEngine.expected_shortfall(np.asarray(returns, dtype=np.float64), confidence_level))
 
     @staticmethod
     def check_risk_violation(
@@ -70,3 +142,177 @@ class RiskEngine:
         if current_var > max_allowed_var:
             return True
         return False
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate with the P-square algorithm (Jain & Chlamtac).
+    Keeps five markers, so memory and per-update cost are O(1).
+    """
+
+    def __init__(self, p: float):
+        self.p = p
+        self.heights: List[float] = []          # Marker heights (first 5 observations until initialised)
+        self.positions = [0, 1, 2, 3, 4]        # Actual marker positions
+        self.desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+        self.count = 0
+
+    def update(self, x: float):
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                n[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> float:
+        """
+        Current quantile estimate (exact order statistic while fewer than 5 observations).
+        """
+        if not self.heights:
+            return 0.0
+        if self.count <= 5:
+            return self.heights[min(int(self.p * self.count), self.count - 1)]
+        return self.heights[2]
+
+    def to_dict(self) -> dict:
+        return {
+            "p": self.p,
+            "heights": list(self.heights),
+            "positions": list(self.positions),
+            "desired": list(self.desired),
+            "count": self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "P2Quantile":
+        sketch = cls(data["p"])
+        sketch.heights = list(data["heights"])
+        sketch.positions = list(data["positions"])
+        sketch.desired = list(data["desired"])
+        sketch.count = data["count"]
+        return sketch
+
+
+class RiskState:
+    """
+    Incremental risk metrics for one ticker, updated one bar at a time.
+
+    Tracks the running peak, current and maximum drawdown exactly, and
+    historical VaR through bounded-memory P-square quantile sketches.
+    State round-trips through to_dict/from_dict for per-ticker persistence.
+    """
+
+    def __init__(self, confidence_levels: Sequence[float] = (0.95, 0.99)):
+        self.count = 0
+        self.last_price: Optional[float] = None
+        self.peak: Optional[float] = None
+        self.current_drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.sketches: Dict[float, P2Quantile] = {c: P2Quantile(1 - c) for c in confidence_levels}
+
+    @classmethod
+    def from_prices(cls, prices: Union[PriceSeries, List[float]], confidence_levels: Sequence[float] = (0.95, 0.99)) -> "RiskState":
+        state = cls(confidence_levels)
+        state.update_many(as_close_array(prices))
+        return state
+
+    def update(self, price: float):
+        """
+        Fold one closing price into the state in O(1).
+        """
+        price = float(price)
+        if price != price:  # Skip missing bars
+            return
+        if self.last_price is not None:
+            ret = (price - self.last_price) / self.last_price
+            for sketch in self.sketches.values():
+                sketch.update(ret)
+        if self.peak is None or price > self.peak:
+            self.peak = price
+        self.current_drawdown = (self.peak - price) / self.peak
+        if self.current_drawdown > self.max_drawdown:
+            self.max_drawdown = self.current_drawdown
+        self.last_price = price
+        self.count += 1
+
+    def update_many(self, prices):
+        for price in np.asarray(prices, dtype=np.float64).tolist():
+            self.update(price)
+
+    def var(self, confidence_level: float = 0.95) -> float:
+        """
+        Streaming VaR estimate (positive loss, floored at 0).
+        """
+        sketch = self.sketches.get(confidence_level)
+        if sketch is None:
+            raise ValueError(f"Confidence level {confidence_level} is not tracked")
+        var_value = -sketch.value()
+        return var_value if var_value > 0 else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "observations": self.count,
+            "last_price": self.last_price,
+            "peak": self.peak,
+            "current_drawdown": self.current_drawdown,
+            "max_drawdown": self.max_drawdown,
+            "var": {str(c): self.var(c) for c in self.sketches},
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "last_price": self.last_price,
+            "peak": self.peak,
+            "current_drawdown": self.current_drawdown,
+            "max_drawdown": self.max_drawdown,
+            "sketches": {str(c): s.to_dict() for c, s in self.sketches.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RiskState":
+        state = cls(())
+        state.count = data["count"]
+        state.last_price = data["last_price"]
+        state.peak = data["peak"]
+        state.current_drawdown = data["current_drawdown"]
+        state.max_drawdown = data["max_drawdown"]
+        state.sketches = {float(c): P2Quantile.from_dict(s) for c, s in data["sketches"].items()}
+        return state
@@ -1,4 +1,11 @@
-from typing import List
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
+
+# z-scores of the 5th..95th percentiles, used as sensitivity axes for sampled inputs
+_AXIS_Z = (-1.6449, -0.6745, 0.0, 0.6745, 1.6449)
+
+ParameterSpec = Union[float, Sequence[float], dict]
+
 
 class ValuationEngine:
     """
@@ -21,25 +28,176 @@ class ValuationEngine:
             
         Returns:
             float: Total Enterprise Value (PV of cash flows + PV of Terminal Value).
+            Unlike dcf(), discount_rate < terminal_growth_rate keeps the plain Gordon
+            formula (a negative terminal value) and equal rates raise ZeroDivisionError.
         """
         if not cash_flows:
             return 0.0
-            
-        present_value = 0.0
-        
-        # 1. PV of Explicit Period Cash Flows
-        for i, cash_flow in enumerate(cash_flows):
-            t = i + 1
-            present_value += cash_flow / ((1 + discount_rate) ** t)
-            
-        # 2. Terminal Value (Gordon Growth Model) at end of year N
-        last_cash_flow = cash_flows[-1]
-        terminal_value = (last_cash_flow * (1 + terminal_growth_rate)) / (discount_rate - terminal_growth_rate)
-        
-        # 3. Discount Terminal Value to Present
-        pv_terminal_value = terminal_value / ((1 + discount_rate) ** len(cash_flows))
-        
-        return present_value + pv_terminal_value
+        if discount_rate > terminal_growth_rate:
+            return float(ValuationEngine.dcf(cash_flows, discount_rate, terminal_growth_rate))
+
+        # Outside the Gordon model's domain dcf() gives NaN; this wrapper keeps its original result
+        present_value = sum(cf / (1 + discount_rate) ** (i + 1) for i, cf in enumerate(cash_flows))
+        terminal_value = (cash_flows[-1] * (1 + terminal_growth_rate)) / (discount_rate - terminal_growth_rate)
+        return present_value + terminal_value / ((1 + discount_rate) ** len(cash_flows))
+
+    @staticmethod
+    def dcf(
+        cash_flows: np.ndarray,
+        discount_rate: Union[float, np.ndarray],
+        terminal_growth_rate: Union[float, np.ndarray] = 0.02
+    ) -> Union[float, np.ndarray]:
+        """
+        DCF enterprise value for whole arrays of scenarios at once.
+
+        Args:
+            cash_flows: (..., N) projected free cash flows; leading axes index scenarios.
+            discount_rate: WACC, broadcastable against the leading axes.
+            terminal_growth_rate: Gordon growth rate, broadcastable likewise.
+
+        Returns:
+            float for scalar inputs, otherwise values over the broadcast shape.
+            Scenarios with discount_rate <= terminal_growth_rate have no
+            terminal value and come out as NaN.
+        """
+        cash_flows = np.asarray(cash_flows, dtype=np.float64)
+        r = np.asarray(discount_rate, dtype=np.float64)
+        g = np.asarray(terminal_growth_rate, dtype=np.float64)
+        n = cash_flows.shape[-1]
+        if n == 0:
+            shape = np.broadcast_shapes(r.shape, g.shape)
+            return 0.0 if not shape else np.zeros(shape)
+
+        # Discount factors (1 + r)^-t for t = 1..N
+        discount = (1.0 + r[..., np.newaxis]) ** -np.arange(1, n + 1, dtype=np.float64)
+        explicit = np.sum(cash_flows * discount, axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            terminal = cash_flows[..., -1] * (1.0 + g) / (r - g)
+        value = np.where(r > g, explicit + terminal * discount[..., -1], np.nan)
+        return float(value) if value.ndim == 0 else value
+
+    @staticmethod
+    def dcf_scenarios(
+        discount_rate: ParameterSpec,
+        terminal_growth_rate: ParameterSpec = 0.02,
+        cash_flows: Optional[Sequence[float]] = None,
+        base_cash_flow: Optional[float] = None,
+        growth: ParameterSpec = 0.0,
+        years: int = 5,
+        n_scenarios: int = 10_000,
+        seed: Optional[int] = None,
+        net_debt: float = 0.0,
+        shares_outstanding: Optional[float] = None,
+        market_value: Optional[float] = None,
+        percentiles: Sequence[float] = (5, 25, 50, 75, 95),
+        max_scenarios: int = 1_000_000
+    ) -> dict:
+        """
+        Value distribution over a grid or a sample of DCF inputs, in one array pass.
+
+        Each input is a number, a list of values (grid) or a normal distribution
+        {"mean", "std", "low"?, "high"?}. With only numbers and lists, every
+        combination of the grids is valued. Once any input is a distribution,
+        n_scenarios draws are made instead (grid inputs are drawn uniformly from
+        their values), and a distribution for growth draws each year's growth
+        separately, giving a different cash-flow path per scenario.
+
+        Args:
+            discount_rate: WACC.
+            terminal_growth_rate: Gordon growth rate.
+            cash_flows: Explicit projection; otherwise base_cash_flow grown by growth for years.
+            net_debt: Subtracted to get equity value.
+            shares_outstanding: Adds a per-share distribution.
+            market_value: Adds the share of scenarios valuing equity above it.
+            seed: Seed for reproducible samples.
+
+        Returns:
+            Scenario count and mode, enterprise/equity (and per-share) summaries,
+            and sensitivity tables at the central cash-flow path.
+        """
+        wacc = ScenarioParameter.parse("discount_rate", discount_rate)
+        terminal = ScenarioParameter.parse("terminal_growth_rate", terminal_growth_rate)
+        if cash_flows is not None:
+            base_path = np.asarray(cash_flows, dtype=np.float64)
+            if base_path.ndim != 1 or not len(base_path):
+                raise ValueError("cash_flows must be a non-empty list")
+            growth = None
+        elif base_cash_flow is not None:
+            if years < 1:
+                raise ValueError("years must be at least 1")
+            growth = ScenarioParameter.parse("growth", growth)
+            base_path = _grow(float(base_cash_flow), growth.center, years)
+        else:
+            raise ValueError("Provide cash_flows or base_cash_flow")
+
+        params = [wacc, terminal] + ([growth] if growth is not None else [])
+        sampled = any(p.is_sampled for p in params)
+        if sampled:
+            if not 0 < n_scenarios <= max_scenarios:
+                raise ValueError(f"n_scenarios must be between 1 and {max_scenarios}")
+            rng = np.random.default_rng(seed)
+            r = wacc.sample(rng, n_scenarios)
+            g = terminal.sample(rng, n_scenarios)
+            if growth is None:
+                paths = base_path
+            elif growth.is_sampled:
+                # Independent growth draw per scenario and year
+                rates = growth.sample(rng, (n_scenarios, years))
+                paths = float(base_cash_flow) * np.cumprod(1.0 + rates, axis=1)
+            else:
+                paths = _grow(float(base_cash_flow), growth.sample(rng, n_scenarios)[:, np.newaxis], years)
+        else:
+            axes = [p.values for p in params]
+            count = int(np.prod([len(a) for a in axes]))
+            if count > max_scenarios:
+                raise ValueError(f"Grid has {count} combinations; at most {max_scenarios} allowed")
+            grids = [m.ravel() for m in np.meshgrid(*axes, indexing="ij")]
+            r, g = grids[0], grids[1]
+            paths = base_path if growth is None else _grow(float(base_cash_flow), grids[2][:, np.newaxis], years)
+
+        enterprise = ValuationEngine.dcf(paths, r, g)
+        enterprise = np.broadcast_to(enterprise, np.broadcast_shapes(np.shape(r), np.shape(g)))
+        equity = enterprise - net_debt
+        result = {
+            "mode": "sampled" if sampled else "grid",
+            "scenarios": int(enterprise.size),
+            "enterprise_value": _summarize(enterprise, percentiles),
+            "equity_value": _summarize(equity, percentiles),
+        }
+        if shares_outstanding:
+            result["per_share"] = _summarize(equity / shares_outstanding, percentiles)
+        if market_value is not None:
+            valid = equity[np.isfinite(equity)]
+            result["market_value"] = market_value
+            result["prob_above_market"] = float(np.mean(valid > market_value)) if len(valid) else None
+
+        result["sensitivity"] = {
+            "discount_rate_x_terminal_growth": ValuationEngine.sensitivity_table(
+                base_path, wacc.axis(), terminal.axis()
+            )
+        }
+        if growth is not None:
+            growth_axis = growth.axis()
+            paths = _grow(float(base_cash_flow), growth_axis[np.newaxis, :, np.newaxis], years)
+            values = ValuationEngine.dcf(paths, wacc.axis()[:, np.newaxis], terminal.center)
+            result["sensitivity"]["discount_rate_x_growth"] = {
+                "rows": wacc.axis().tolist(), "columns": growth_axis.tolist(), "values": _table(values)
+            }
+        return result
+
+    @staticmethod
+    def sensitivity_table(
+        cash_flows: Sequence[float],
+        discount_rates: Sequence[float],
+        terminal_growth_rates: Sequence[float]
+    ) -> dict:
+        """
+        Enterprise value for every (discount rate, terminal growth) pair, rows by discount rate.
+        """
+        rows = np.asarray(discount_rates, dtype=np.float64)
+        columns = np.asarray(terminal_growth_rates, dtype=np.float64)
+        values = ValuationEngine.dcf(np.asarray(cash_flows, dtype=np.float64), rows[:, np.newaxis], columns[np.newaxis, :])
+        return {"rows": rows.tolist(), "columns": columns.tolist(), "values": _table(values)}
 
     @staticmethod
     def calculate_intrinsic_value(
@@ -61,3 +219,100 @@ class ValuationEngine:
         Simple rule: Earnings are high quality if Operating Cash Flow > Net Income.
         """
         return operating_cash_flow > net_income
+
+
+class ScenarioParameter:
+    """
+    One DCF input for scenario runs: fixed values (a grid) or a normal distribution.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        values: Optional[Sequence[float]] = None,
+        mean: Optional[float] = None,
+        std: float = 0.0,
+        low: Optional[float] = None,
+        high: Optional[float] = None
+    ):
+        self.name = name
+        self.values = None if values is None else np.asarray(values, dtype=np.float64)
+        self.mean = mean
+        self.std = std
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def parse(cls, name: str, spec: ParameterSpec) -> "ScenarioParameter":
+        """
+        Build from a number, a list of numbers, or {"mean", "std", "low", "high"}.
+        """
+        if isinstance(spec, dict):
+            if "mean" not in spec:
+                raise ValueError(f"{name}: a distribution needs a mean")
+            std = float(spec.get("std", 0.0))
+            if std < 0:
+                raise ValueError(f"{name}: std must be non-negative")
+            if std == 0:
+                return cls(name, values=[float(spec["mean"])])
+            return cls(name, mean=float(spec["mean"]), std=std, low=spec.get("low"), high=spec.get("high"))
+        values = np.atleast_1d(np.asarray(spec, dtype=np.float64))
+        if values.ndim != 1 or not len(values) or not np.all(np.isfinite(values)):
+            raise ValueError(f"{name}: expected a number, a non-empty list or a distribution")
+        return cls(name, values=values)
+
+    @property
+    def is_sampled(self) -> bool:
+        return self.values is None
+
+    @property
+    def center(self) -> float:
+        return float(self.mean) if self.is_sampled else float(np.median(self.values))
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        if not self.is_sampled:
+            return self.values[rng.integers(0, len(self.values), size)] if len(self.values) > 1 \
+                else np.full(size, self.values[0])
+        return self._clip(rng.normal(self.mean, self.std, size))
+
+    def axis(self) -> np.ndarray:
+        """
+        Values for sensitivity tables: the grid itself, or the 5th-95th percentiles of the distribution.
+        """
+        if not self.is_sampled:
+            return np.unique(self.values)
+        return np.unique(self._clip(self.mean + self.std * np.array(_AXIS_Z)))
+
+    def _clip(self, values: np.ndarray) -> np.ndarray:
+        if self.low is not None or self.high is not None:
+            values = np.clip(values, self.low, self.high)
+        return values
+
+
+def _grow(base: float, rate, years: int) -> np.ndarray:
+    return base * (1.0 + np.asarray(rate, dtype=np.float64)) ** np.arange(1, years + 1)
+
+
+def _summarize(values: np.ndarray, percentiles: Sequence[float]) -> Dict[str, Optional[float]]:
+    """
+    Mean, spread and percentiles over the finite values (invalid scenarios are counted, not included).
+    """
+    values = np.ravel(values)
+    valid = values[np.isfinite(values)]
+    if not len(valid):
+        return {"valid": 0, "invalid": int(len(values))}
+    points = np.percentile(valid, percentiles)
+    return {
+        "valid": int(len(valid)),
+        "invalid": int(len(values) - len(valid)),
+        "mean": float(valid.mean()),
+        "std": float(valid.std()),
+        "min": float(valid.min()),
+        "max": float(valid.max()),
+        "percentiles": {f"p{p:g}": float(v) for p, v in zip(percentiles, points)},
+    }
+
+
+def _table(values: np.ndarray) -> List[List[Optional[float]]]:
+    # NaN (discount rate <= growth) is not valid JSON
+    return [[float(v) if np.isfinite(v) else None for v in row] for row in np.atleast_2d(values)]
@@ -16,6 +16,8 @@ async def lifespan(app: FastAPI):
         print(f"Warning: Could not create database tables: {e}")
     yield
     # Shutdown
+    from app.data.async_fetcher import close_async_fetcher
+    await close_async_fetcher()
     print("Shutting down...")
 
 app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
@@ -33,7 +35,7 @@ app.add_middleware(
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "status": "active", 
         "system": settings.PROJECT_NAME, 
@@ -42,5 +44,5 @@ def read_root():
     }
 
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "healthy"}
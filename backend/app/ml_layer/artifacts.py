@@ -0,0 +1,194 @@
+"""
+Model Artifacts.
+Model parameters (the regime HMM, the return model) stored as plain .npy
+arrays plus a JSON manifest.
+
+Workers memory-map the arrays instead of unpickling a model object, so
+loading is fast, needs no hmmlearn import and the pages are shared by every
+process on the host. Layout:
+
+    <path>/meta.json               manifest (version, regime map, array directory)
+    <path>/<version>-<stamp>/*.npy parameter arrays
+
+A new artifact is written to a fresh array directory first and the manifest
+is swapped in atomically last, so readers never see a half-written model.
+After the swap, array directories older than the one just replaced are
+removed; the replaced one stays for readers that are still loading it.
+"""
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from app.ml_layer.filtering import GaussianHMMFilter
+
+MANIFEST = "meta.json"
+# Array directories are named <version>-<millisecond stamp>
+ARRAYS_DIR_PATTERN = re.compile(r".+-\d{13,}$")
+ARRAYS = ("startprob", "transmat", "means", "covars")
+
+
+class HMMArtifact:
+    """
+    Parameters and metadata of a trained Gaussian HMM.
+    """
+    __slots__ = ("path", "startprob", "transmat", "means", "covars", "regime_map", "version", "trained_at", "metadata")
+
+    def __init__(
+        self,
+        startprob: np.ndarray,
+        transmat: np.ndarray,
+        means: np.ndarray,
+        covars: np.ndarray,
+        regime_map: Dict[int, str],
+        version: str,
+        trained_at: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        path: Optional[str] = None
+    ):
+        self.startprob = startprob
+        self.transmat = transmat
+        self.means = means
+        self.covars = covars
+        self.regime_map = regime_map
+        self.version = version
+        self.trained_at = trained_at
+        self.metadata = metadata or {}
+        self.path = path
+
+    def to_hmm(self) -> GaussianHMMFilter:
+        return GaussianHMMFilter(self.startprob, self.transmat, self.means, self.covars)
+
+
+def save_hmm_artifact(
+    path: str,
+    startprob: np.ndarray,
+    transmat: np.ndarray,
+    means: np.ndarray,
+    covars: np.ndarray,
+    regime_map: Dict[int, str],
+    version: str,
+    trained_at: Optional[str] = None,
+    **metadata
+) -> str:
+    """
+    Write HMM parameters as an artifact directory.
+
+    Returns:
+        Path of the written manifest.
+    """
+    return save_array_artifact(
+        path,
+        {"startprob": startprob, "transmat": transmat, "means": means, "covars": covars},
+        version,
+        "hmm-npy/1",
+        trained_at=trained_at,
+        extra={"regime_map": {str(state): regime for state, regime in regime_map.items()}},
+        **metadata
+    )
+
+
+def load_hmm_artifact(path: str, mmap: bool = True) -> HMMArtifact:
+    """
+    Load an artifact written by save_hmm_artifact (arrays memory-mapped read-only by default).
+    """
+    arrays, manifest = load_array_artifact(path, ARRAYS, mmap=mmap)
+    return HMMArtifact(
+        regime_map={int(state): regime for state, regime in manifest["regime_map"].items()},
+        version=manifest["version"],
+        trained_at=manifest.get("trained_at"),
+        metadata=manifest.get("metadata"),
+        path=path,
+        **arrays
+    )
+
+
+def save_array_artifact(
+    path: str,
+    arrays: Dict[str, np.ndarray],
+    version: str,
+    format: str,
+    trained_at: Optional[str] = None,
+    extra: Optional[dict] = None,
+    **metadata
+) -> str:
+    """
+    Write float64 arrays to a fresh directory, then swap in the manifest.
+
+    Args:
+        format: Manifest format tag (e.g. 'hmm-npy/1').
+        extra: Additional top-level manifest fields.
+
+    Returns:
+        Path of the written manifest.
+    """
+    arrays_dir = f"{re.sub(r'[^A-Za-z0-9._-]', '_', str(version))}-{int(time.time() * 1000)}"
+    os.makedirs(os.path.join(path, arrays_dir), exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(path, arrays_dir, f"{name}.npy"), np.ascontiguousarray(values, dtype=np.float64))
+
+    manifest = {
+        "format": format,
+        "version": str(version),
+        "trained_at": trained_at or datetime.now().isoformat(),
+        "arrays": arrays_dir,
+        **(extra or {}),
+        "metadata": metadata,
+    }
+    manifest_path = os.path.join(path, MANIFEST)
+    previous = _manifest_arrays_dir(manifest_path)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    _prune_generations(path, keep={arrays_dir, previous})
+    return manifest_path
+
+
+def _manifest_arrays_dir(manifest_path: str) -> Optional[str]:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f).get("arrays")
+    except (OSError, ValueError):
+        return None
+
+
+def _prune_generations(path: str, keep: set):
+    """
+    Remove array directories other than the current and the previous generation.
+    """
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if name in keep or not ARRAYS_DIR_PATTERN.match(name) or not os.path.isdir(full):
+            continue
+        shutil.rmtree(full, ignore_errors=True)
+
+
+def load_array_artifact(path: str, names: Sequence[str], mmap: bool = True) -> Tuple[Dict[str, np.ndarray], dict]:
+    """
+    Arrays and manifest of an artifact written by save_array_artifact.
+    """
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    arrays_dir = os.path.join(path, manifest["arrays"])
+    arrays = {
+        name: np.load(os.path.join(arrays_dir, f"{name}.npy"), mmap_mode="r" if mmap else None)
+        for name in names
+    }
+    return arrays, manifest
+
+
+def artifact_signature(path: str) -> Optional[tuple]:
+    """
+    Cheap change marker for an artifact (None if it does not exist).
+    The manifest is replaced atomically on every save, so its inode changes too.
+    """
+    try:
+        st = os.stat(os.path.join(path, MANIFEST))
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
@@ -0,0 +1,393 @@
+"""
+Feature Store.
+Per-ticker, per-date model features materialized as memory-mapped columns.
+
+Layout under the store root (the generation scheme of ColumnarPriceStore):
+
+    <TICKER>/CURRENT                      name of the live generation directory
+    <TICKER>/<generation>/date.bin        datetime64[D] (int64 days), ascending
+    <TICKER>/<generation>/<feature>.bin   float32, one file per FEATURE_NAMES entry
+
+A row only depends on the bars up to its date and on the fundamentals
+snapshots reported by then, so new bars are materialized by recomputing a
+trailing LOOKBACK window and appending the new rows (values first, dates
+last). A generation missing any current feature column is rebuilt in full.
+Writers take the ticker's cross-process lock and old generations are pruned
+as in the price store.
+Training sets and cross-sections for batch inference are read straight from
+the mapped columns.
+
+Usage: python -m app.ml_layer.feature_store --source db
+"""
+import argparse
+import os
+import shutil
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+import numpy as np
+from app.data.columnar import CURRENT, prune_generations, writer_lock
+from app.data.series import PriceSeries
+from app.ml_layer.features import TRADING_DAYS, rolling_std, simple_returns
+
+VOLATILITY_WINDOWS = (20, 60)
+MOMENTUM_WINDOWS = (5, 21, 63, 126, 252)
+
+PRICE_FEATURES = (
+    ("return_1d",)
+    + tuple(f"volatility_{w}" for w in VOLATILITY_WINDOWS)
+    + tuple(f"momentum_{w}" for w in MOMENTUM_WINDOWS)
+)
+FUNDAMENTAL_FEATURES = ("pe_ratio", "pb_ratio", "earnings_yield", "fcf_yield", "sales_yield", "net_debt_to_market_cap")
+FEATURE_NAMES = PRICE_FEATURES + FUNDAMENTAL_FEATURES
+
+# FundamentalData columns used by the fundamental features
+FUNDAMENTAL_FIELDS = ("market_cap", "pe_ratio", "pb_ratio", "revenue", "net_income", "free_cash_flow", "total_debt", "total_cash")
+
+# Bars needed before a row for every window to be defined
+LOOKBACK = max(MOMENTUM_WINDOWS + VOLATILITY_WINDOWS) + 1
+
+_FEATURE_DTYPE = np.dtype(np.float32)
+_DATE_DTYPE = np.dtype("datetime64[D]")
+
+
+def fundamentals_arrays(rows: Iterable) -> Dict[str, np.ndarray]:
+    """
+    Column arrays ('report_date' plus FUNDAMENTAL_FIELDS, NaN for missing values)
+    from FundamentalData rows or dicts, sorted by report date.
+    """
+    records = []
+    for row in rows:
+        get = row.get if isinstance(row, dict) else lambda name, row=row: getattr(row, name, None)
+        records.append((get("report_date"), [get(name) for name in FUNDAMENTAL_FIELDS]))
+    records.sort(key=lambda record: record[0])
+    values = np.array([[np.nan if v is None else v for v in r[1]] for r in records], dtype=np.float64)
+    values = values.reshape(len(records), len(FUNDAMENTAL_FIELDS))
+    arrays = {"report_date": np.array([r[0] for r in records], dtype=_DATE_DTYPE)}
+    arrays.update({name: values[:, i] for i, name in enumerate(FUNDAMENTAL_FIELDS)})
+    return arrays
+
+
+def compute_features(
+    series: PriceSeries,
+    fundamentals: Optional[Dict[str, np.ndarray]] = None,
+    start: int = 0
+) -> np.ndarray:
+    """
+    (bars x FEATURE_NAMES) float64 matrix for series[start:]; NaN until a window fills.
+
+    Price features only look at the LOOKBACK bars before start. Yields use the
+    market cap of the latest snapshot on or before each date, moved with the
+    close since that snapshot.
+    """
+    offset = max(start - LOOKBACK, 0)
+    close = series.close[offset:]
+    n = len(close)
+    out = np.full((n, len(FEATURE_NAMES)), np.nan)
+    returns = simple_returns(close)
+    out[:, 0] = returns
+
+    column = 1
+    for window in VOLATILITY_WINDOWS:
+        out[:, column] = rolling_std(returns, window) * np.sqrt(TRADING_DAYS)
+        column += 1
+    for window in MOMENTUM_WINDOWS:
+        if n > window:
+            out[window:, column] = close[window:] / close[:-window] - 1
+        column += 1
+    out = out[start - offset:]
+
+    if fundamentals is not None and len(fundamentals["report_date"]):
+        dates, closes = series.dates[start:], series.close[start:]
+        snapshot = np.searchsorted(fundamentals["report_date"], dates, side="right") - 1
+        rows = np.flatnonzero(snapshot >= 0)
+        pick = snapshot[rows]
+
+        # Close on the last bar at or before each report, to move market cap with the price
+        report_bar = np.searchsorted(series.dates, fundamentals["report_date"], side="right") - 1
+        report_close = np.where(report_bar >= 0, series.close[np.maximum(report_bar, 0)], np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            market_cap = fundamentals["market_cap"][pick] * closes[rows] / report_close[pick]
+            ratios = {
+                "pe_ratio": fundamentals["pe_ratio"][pick],
+                "pb_ratio": fundamentals["pb_ratio"][pick],
+                "earnings_yield": fundamentals["net_income"][pick] / market_cap,
+                "fcf_yield": fundamentals["free_cash_flow"][pick] / market_cap,
+                "sales_yield": fundamentals["revenue"][pick] / market_cap,
+                "net_debt_to_market_cap": (fundamentals["total_debt"][pick] - fundamentals["total_cash"][pick]) / market_cap,
+            }
+        for name, values in ratios.items():
+            out[rows, FEATURE_NAMES.index(name)] = np.where(np.isfinite(values), values, np.nan)
+    return out
+
+
+def forward_returns(daily_returns: np.ndarray, horizon: int) -> np.ndarray:
+    """
+    Compounded return over the next `horizon` bars for each row (NaN where the
+    window runs past the end or contains a missing return).
+    """
+    log_growth = np.log1p(np.asarray(daily_returns, dtype=np.float64))
+    out = np.full(len(log_growth), np.nan)
+    if len(log_growth) > horizon:
+        cumulative = np.concatenate([[0.0], np.cumsum(log_growth[1:])])
+        out[:-horizon] = np.expm1(cumulative[horizon:] - cumulative[:-horizon])
+    return out
+
+
+class FeatureStore:
+    """
+    Materialized features per ticker backed by memory-mapped column files.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def load(self, ticker: str, start: Optional[date] = None, end: Optional[date] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows for a ticker within [start, end].
+
+        Returns:
+            (dates, (rows x FEATURE_NAMES) float32 matrix)
+        """
+        columns = self._open(ticker)
+        if not columns:
+            return np.empty(0, dtype=_DATE_DTYPE), np.empty((0, len(FEATURE_NAMES)), dtype=_FEATURE_DTYPE)
+        dates = columns["date"]
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D")))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+        return np.array(dates[lo:hi]), np.column_stack([columns[name][lo:hi] for name in FEATURE_NAMES])
+
+    def last_date(self, ticker: str) -> Optional[date]:
+        columns = self._open(ticker)
+        return columns["date"][-1].astype(object) if columns else None
+
+    def tickers(self) -> List[str]:
+        return sorted(
+            unquote(name) for name in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, name, CURRENT))
+        )
+
+    def update(self, series: PriceSeries, fundamentals: Optional[Dict[str, np.ndarray]] = None) -> int:
+        """
+        Materialize the bars of series after the last stored row.
+
+        Only the trailing LOOKBACK bars before the first new one are recomputed.
+        Revisions of already stored dates are not picked up; use rebuild().
+
+        Returns:
+            Rows appended.
+        """
+        with writer_lock(self._ticker_dir(series.ticker), self._lock):
+            columns = self._open(series.ticker)
+            if not columns:
+                return self._write_generation(series, compute_features(series, fundamentals))
+
+            n_existing = len(columns["date"])
+            first_new = int(np.searchsorted(series.dates, columns["date"][-1], side="right"))
+            if first_new >= len(series):
+                return 0
+            features = compute_features(series, fundamentals, start=first_new)
+            self._append(series.ticker, series.dates[first_new:], features, n_existing)
+            return len(features)
+
+    def rebuild(self, series: PriceSeries, fundamentals: Optional[Dict[str, np.ndarray]] = None) -> int:
+        """
+        Recompute every row of a ticker into a new generation.
+        """
+        with writer_lock(self._ticker_dir(series.ticker), self._lock):
+            return self._write_generation(series, compute_features(series, fundamentals))
+
+    def cross_section(
+        self,
+        tickers: Sequence[str],
+        as_of: Optional[date] = None
+    ) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Latest row on or before as_of for each ticker that has one.
+
+        Returns:
+            (tickers found, their row dates, (tickers x FEATURE_NAMES) float32 matrix)
+        """
+        found, dates, rows = [], [], []
+        for ticker in tickers:
+            columns = self._open(ticker)
+            if not columns:
+                continue
+            index = len(columns["date"]) if as_of is None else int(
+                np.searchsorted(columns["date"], np.datetime64(as_of, "D"), side="right")
+            )
+            if index == 0:
+                continue
+            found.append(ticker)
+            dates.append(columns["date"][index - 1])
+            rows.append([columns[name][index - 1] for name in FEATURE_NAMES])
+        matrix = np.array(rows, dtype=_FEATURE_DTYPE).reshape(len(rows), len(FEATURE_NAMES))
+        return found, np.array(dates, dtype=_DATE_DTYPE), matrix
+
+    def training_set(
+        self,
+        tickers: Optional[Sequence[str]] = None,
+        horizon: int = 21,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Stacked rows with their forward `horizon`-bar return as the target.
+        Rows whose target is unknown (the last horizon bars) are dropped.
+
+        Returns:
+            (X float32 (rows x FEATURE_NAMES), y float64, row dates)
+        """
+        blocks, targets, row_dates = [], [], []
+        for ticker in (tickers if tickers is not None else self.tickers()):
+            dates, values = self.load(ticker, start, end)
+            y = forward_returns(values[:, 0], horizon)
+            keep = np.isfinite(y)
+            if keep.any():
+                blocks.append(values[keep])
+                targets.append(y[keep])
+                row_dates.append(dates[keep])
+        if not blocks:
+            return np.empty((0, len(FEATURE_NAMES)), dtype=_FEATURE_DTYPE), np.empty(0), np.empty(0, dtype=_DATE_DTYPE)
+        return np.concatenate(blocks), np.concatenate(targets), np.concatenate(row_dates)
+
+    def delete(self, ticker: str):
+        ticker_dir = self._ticker_dir(ticker)
+        if not os.path.isdir(ticker_dir):
+            return
+        with writer_lock(ticker_dir, self._lock):
+            shutil.rmtree(ticker_dir, ignore_errors=True)
+
+    # Internal helpers
+
+    def _ticker_dir(self, ticker: str) -> str:
+        return os.path.join(self.root, quote(ticker, safe="^.-_=@"))
+
+    def _generation(self, ticker: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self._ticker_dir(ticker), CURRENT)) as f:
+                return os.path.join(self._ticker_dir(ticker), f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def _open(self, ticker: str) -> Optional[dict]:
+        """
+        Mapped columns of the live generation; None when empty or missing a current feature.
+        """
+        generation = self._generation(ticker)
+        if generation is None:
+            return None
+        try:
+            n = os.path.getsize(os.path.join(generation, "date.bin")) // 8
+            if not n:
+                return None
+            columns = {"date": np.memmap(os.path.join(generation, "date.bin"), dtype=_DATE_DTYPE, mode="r", shape=(n,))}
+            for name in FEATURE_NAMES:
+                columns[name] = np.memmap(os.path.join(generation, f"{name}.bin"), dtype=_FEATURE_DTYPE, mode="r", shape=(n,))
+            return columns
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _append(self, ticker: str, dates: np.ndarray, features: np.ndarray, n_existing: int):
+        generation = self._generation(ticker)
+        # Feature columns first (dropping any partial write past the committed count), dates last
+        for i, name in enumerate(FEATURE_NAMES):
+            with open(os.path.join(generation, f"{name}.bin"), "r+b") as f:
+                f.truncate(n_existing * _FEATURE_DTYPE.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(features[:, i], dtype=_FEATURE_DTYPE).tobytes())
+        with open(os.path.join(generation, "date.bin"), "r+b") as f:
+            f.truncate(n_existing * 8)
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(dates, dtype=_DATE_DTYPE).tobytes())
+
+    def _write_generation(self, series: PriceSeries, features: np.ndarray) -> int:
+        if not len(series):
+            return 0
+        ticker_dir = self._ticker_dir(series.ticker)
+        previous = self._generation(series.ticker)
+        name = f"g{time.time_ns()}"
+        os.makedirs(os.path.join(ticker_dir, name))
+        np.ascontiguousarray(series.dates, dtype=_DATE_DTYPE).tofile(os.path.join(ticker_dir, name, "date.bin"))
+        for i, column in enumerate(FEATURE_NAMES):
+            np.ascontiguousarray(features[:, i], dtype=_FEATURE_DTYPE).tofile(os.path.join(ticker_dir, name, f"{column}.bin"))
+
+        tmp = os.path.join(ticker_dir, f"{CURRENT}.tmp")
+        with open(tmp, "w") as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(ticker_dir, CURRENT))
+        prune_generations(ticker_dir, keep=(name, previous and os.path.basename(previous)))
+        return len(series)
+
+
+def materialize(store: FeatureStore, series_list: Iterable[PriceSeries], fundamentals_by_ticker=None, rebuild: bool = False) -> dict:
+    """
+    Update (or rebuild) the store from price series.
+
+    Args:
+        fundamentals_by_ticker: ticker -> fundamentals_arrays(...) (optional).
+    """
+    totals = {"tickers": 0, "rows": 0}
+    for series in series_list:
+        fundamentals = (fundamentals_by_ticker or {}).get(series.ticker)
+        rows = store.rebuild(series, fundamentals) if rebuild else store.update(series, fundamentals)
+        totals["tickers"] += 1
+        totals["rows"] += rows
+    return totals
+
+
+def load_fundamentals(db, tickers: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    fundamentals_arrays per ticker from the fundamental_data table.
+    """
+    from app.data.models import FundamentalData
+
+    query = db.query(FundamentalData)
+    if tickers is not None:
+        query = query.filter(FundamentalData.ticker.in_([t.upper() for t in tickers]))
+    grouped: Dict[str, list] = {}
+    for row in query.order_by(FundamentalData.ticker, FundamentalData.report_date):
+        grouped.setdefault(row.ticker, []).append(row)
+    return {ticker: fundamentals_arrays(rows) for ticker, rows in grouped.items()}
+
+
+_feature_store: Optional[FeatureStore] = None
+_feature_store_lock = threading.Lock()
+
+
+def get_feature_store() -> FeatureStore:
+    """
+    Process-wide feature store at settings.FEATURE_STORE_PATH.
+    """
+    global _feature_store
+    with _feature_store_lock:
+        if _feature_store is None:
+            from app.core.config import settings
+            _feature_store = FeatureStore(settings.FEATURE_STORE_PATH)
+        return _feature_store
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+    from app.ml_layer.train_regime_model import iter_training_series
+
+    parser = argparse.ArgumentParser(description="Materialize model features from stored prices and fundamentals.")
+    parser.add_argument("--source", choices=["db", "columnar", "file"], default="db")
+    parser.add_argument("--path", help="Price file for --source file or store root for --source columnar")
+    parser.add_argument("--tickers", nargs="+")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every row instead of appending new bars")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        fundamentals = load_fundamentals(db, args.tickers)
+    finally:
+        db.close()
+    print(materialize(
+        get_feature_store(), iter_training_series(args.source, tickers=args.tickers, path=args.path),
+        fundamentals, rebuild=args.rebuild
+    ))
@@ -0,0 +1,138 @@
+"""
+Regime Detection Features.
+Vectorized rolling features shared by HMM training and inference.
+
+All functions work along the last axis, so a 1-D price series and a
+(tickers x time) matrix go through the same code. NaN marks missing bars
+(e.g. left padding for shorter histories); a window is only defined once
+it holds `window` real observations.
+"""
+from typing import List, Sequence, Tuple
+import numpy as np
+
+VOLATILITY_WINDOW = 20   # Returns in the rolling volatility window
+MOMENTUM_WINDOW = 50     # Prices in the momentum SMA
+TREND_WINDOW = 20        # Prices in the trend SMA
+TRADING_DAYS = 252
+
+# Feature columns produced by regime_features
+FEATURE_NAMES = ("return", "volatility", "momentum")
+
+
+def simple_returns(prices: np.ndarray) -> np.ndarray:
+    """
+    Close-to-close returns aligned with prices (first column is NaN).
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    returns = np.full(prices.shape, np.nan)
+    returns[..., 1:] = np.diff(prices, axis=-1) / prices[..., :-1]
+    return returns
+
+
+def _window_sums(values: np.ndarray, window: int, power: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rolling sums of values**power and of the valid-observation count, via cumulative sums.
+    """
+    valid = ~np.isnan(values)
+    data = np.where(valid, values, 0.0) ** power
+
+    def rolling(x):
+        csum = np.cumsum(x, axis=-1)
+        out = csum.copy()
+        out[..., window:] -= csum[..., :-window]
+        return out
+
+    return rolling(data), rolling(valid.astype(np.float64))
+
+
+def _shift(values: np.ndarray) -> np.ndarray:
+    """
+    Per-row first valid value; subtracting it keeps cumulative sums well conditioned.
+    """
+    first = np.argmax(~np.isnan(values), axis=-1)
+    shift = np.take_along_axis(values, np.expand_dims(first, -1), axis=-1)
+    return np.nan_to_num(shift, nan=0.0)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing mean over `window` observations (inclusive of the current one), O(n).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    shift = _shift(values)
+    sums, counts = _window_sums(values - shift, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / window + shift
+    return np.where(counts == window, mean, np.nan)
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing population standard deviation (ddof=0, like np.std), O(n).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    centered = values - _shift(values)
+    sums, counts = _window_sums(centered, window)
+    squares, _ = _window_sums(centered, window, power=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = np.maximum(squares / window - (sums / window) ** 2, 0.0)
+    return np.where(counts == window, np.sqrt(variance), np.nan)
+
+
+def regime_features(prices: np.ndarray) -> np.ndarray:
+    """
+    Per-bar regime features aligned with prices.
+
+    Args:
+        prices: 1-D series or 2-D (tickers x time) close matrix.
+
+    Returns:
+        Array of shape prices.shape + (3,) with columns FEATURE_NAMES:
+        daily return, annualized 20-day volatility, and price relative to the
+        50-day SMA. Rows are NaN until every window is filled.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    returns = simple_returns(prices)
+    volatility = rolling_std(returns, VOLATILITY_WINDOW) * np.sqrt(TRADING_DAYS)
+    sma = rolling_mean(prices, MOMENTUM_WINDOW)
+    momentum = (prices - sma) / sma
+    return np.stack([returns, volatility, momentum], axis=-1)
+
+
+def trend_labels(prices: np.ndarray) -> np.ndarray:
+    """
+    'up' / 'down' / 'neutral' per bar from the price vs its 20-day SMA (1.5% band).
+    Bars without a full window are 'neutral'.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    sma = rolling_mean(prices, TREND_WINDOW)
+    with np.errstate(invalid="ignore"):
+        return np.where(prices > sma * 1.015, "up", np.where(prices < sma * 0.985, "down", "neutral"))
+
+
+def valid_feature_rows(features: np.ndarray) -> np.ndarray:
+    """
+    Boolean mask of bars whose features are all defined.
+    """
+    return ~np.isnan(features).any(axis=-1)
+
+
+def feature_matrix(price_series: Sequence[np.ndarray]) -> Tuple[np.ndarray, List[int]]:
+    """
+    Stack the defined feature rows of several price series for HMM fitting.
+
+    Returns:
+        (X, lengths): concatenated observations and the sequence length of each
+        series, in the form hmmlearn expects. Series too short for any feature
+        row are skipped.
+    """
+    blocks, lengths = [], []
+    for prices in price_series:
+        features = regime_features(prices)
+        features = features[valid_feature_rows(features)]
+        if len(features):
+            blocks.append(features)
+            lengths.append(len(features))
+    if not blocks:
+        return np.empty((0, len(FEATURE_NAMES))), []
+    return np.concatenate(blocks), lengths
@@ -0,0 +1,228 @@
+"""
+Online Regime Filtering.
+Per-ticker forward-filter state so a new bar updates the regime in O(K^2),
+plus batched forward-backward smoothing for whole histories.
+"""
+from collections import deque
+from typing import Optional, Sequence
+import numpy as np
+from app.ml_layer.features import (
+    MOMENTUM_WINDOW, TRADING_DAYS, TREND_WINDOW, VOLATILITY_WINDOW
+)
+
+# Running sums are rebuilt from the windows this often to stop float drift
+RESYNC_INTERVAL = 1000
+
+
+class GaussianHMMFilter:
+    """
+    Gaussian HMM inference (forward filtering, forward-backward posteriors) using plain arrays.
+
+    Emission densities use precomputed Cholesky factors of the full
+    covariance matrices, so one step is a K x K transition multiply plus
+    K Gaussian evaluations.
+    """
+
+    def __init__(self, startprob: np.ndarray, transmat: np.ndarray, means: np.ndarray, covars: np.ndarray):
+        self.startprob = np.asarray(startprob, dtype=np.float64)
+        self.transmat = np.asarray(transmat, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        covars = np.asarray(covars, dtype=np.float64)
+        self._chol = np.linalg.cholesky(covars)
+        self._log_norm = -0.5 * (
+            self.means.shape[1] * np.log(2 * np.pi)
+            + 2 * np.log(np.diagonal(self._chol, axis1=1, axis2=2)).sum(axis=1)
+        )
+
+    @classmethod
+    def from_model(cls, model) -> "GaussianHMMFilter":
+        """
+        Build from a fitted hmmlearn GaussianHMM (covars_ is always returned as full matrices).
+        """
+        return cls(model.startprob_, model.transmat_, model.means_, model.covars_)
+
+    @property
+    def n_states(self) -> int:
+        return len(self.startprob)
+
+    def log_emission(self, X: np.ndarray) -> np.ndarray:
+        """
+        Log density of each observation under each state, shape (N, K).
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        diff = X[:, np.newaxis, :] - self.means[np.newaxis, :, :]                  # (N, K, d)
+        solved = np.linalg.solve(self._chol[np.newaxis], diff[..., np.newaxis])[..., 0]
+        return self._log_norm[np.newaxis, :] - 0.5 * np.sum(solved ** 2, axis=-1)
+
+    def step(self, alpha: Optional[np.ndarray], X: np.ndarray) -> np.ndarray:
+        """
+        One normalised forward step for N independent sequences.
+
+        Args:
+            alpha: (N, K) filtered state probabilities at t-1 (a NaN row, or None for
+                   all rows, starts a new sequence from the initial distribution).
+            X: (N, d) observations at t.
+
+        Returns:
+            (N, K) filtered state probabilities at t.
+        """
+        log_b = self.log_emission(X)
+        if alpha is None:
+            prior = np.broadcast_to(self.startprob, log_b.shape)
+        else:
+            alpha = np.atleast_2d(alpha)
+            prior = np.where(np.isnan(alpha[:, :1]), self.startprob, np.nan_to_num(alpha) @ self.transmat)
+        log_b -= log_b.max(axis=1, keepdims=True)
+        posterior = prior * np.exp(log_b)
+        total = posterior.sum(axis=1, keepdims=True)
+        # An impossible observation under every reachable state resets to the prior
+        return np.where(total > 0, posterior / np.where(total > 0, total, 1.0), prior)
+
+    def predict_proba(self, X: np.ndarray, lengths: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Smoothed state posteriors for concatenated sequences (hmmlearn-compatible).
+
+        Sequences are laid out as rows of a padded (S, T) grid so the forward and
+        backward recursions advance every sequence together, one time step per
+        iteration.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        lengths = np.asarray([len(X)] if lengths is None else lengths, dtype=np.intp)
+        if lengths.sum() != len(X):
+            raise ValueError("lengths must sum to the number of observations")
+        if not len(X):
+            return np.empty((0, self.n_states))
+
+        log_b = self.log_emission(X)
+        emission = np.exp(log_b - log_b.max(axis=1, keepdims=True))
+
+        # Scatter observations into the padded grid
+        n_seq, n_steps = len(lengths), int(lengths.max())
+        seq = np.repeat(np.arange(n_seq), lengths)
+        step = np.arange(len(X)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        b = np.ones((n_seq, n_steps, self.n_states))
+        b[seq, step] = emission
+
+        alpha = np.empty_like(b)
+        alpha[:, 0] = self.startprob * b[:, 0]
+        alpha[:, 0] /= _row_sums(alpha[:, 0])
+        for t in range(1, n_steps):
+            alpha[:, t] = (alpha[:, t - 1] @ self.transmat) * b[:, t]
+            alpha[:, t] /= _row_sums(alpha[:, t])
+
+        beta = np.ones_like(b)
+        last = (lengths - 1)[:, np.newaxis]
+        for t in range(n_steps - 2, -1, -1):
+            nxt = (b[:, t + 1] * beta[:, t + 1]) @ self.transmat.T
+            beta[:, t] = np.where(t < last, nxt / _row_sums(nxt), 1.0)
+
+        gamma = alpha[seq, step] * beta[seq, step]
+        return gamma / _row_sums(gamma)
+
+
+def _row_sums(values: np.ndarray) -> np.ndarray:
+    total = values.sum(axis=-1, keepdims=True)
+    return np.where(total > 0, total, 1.0)
+
+
+class RegimeFilterState:
+    """
+    Rolling feature accumulators and the last filtered state distribution for one ticker.
+    """
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.last_price: Optional[float] = None
+        self.last_date: Optional[str] = None
+        self.prices = deque(maxlen=MOMENTUM_WINDOW)
+        self.returns = deque(maxlen=VOLATILITY_WINDOW)
+        self.price_sum = 0.0
+        self.trend_sum = 0.0
+        self.return_sum = 0.0
+        self.return_sq_sum = 0.0
+        self.probabilities: Optional[np.ndarray] = None
+        self.updates = 0
+
+    def push(self, price: float) -> Optional[np.ndarray]:
+        """
+        Add a closing price; returns the feature vector once all windows are full.
+        """
+        if self.last_price is not None:
+            ret = (price - self.last_price) / self.last_price
+            if len(self.returns) == self.returns.maxlen:
+                old = self.returns[0]
+                self.return_sum -= old
+                self.return_sq_sum -= old * old
+            self.returns.append(ret)
+            self.return_sum += ret
+            self.return_sq_sum += ret * ret
+
+        if len(self.prices) >= TREND_WINDOW:
+            self.trend_sum -= self.prices[-TREND_WINDOW]
+        if len(self.prices) == self.prices.maxlen:
+            self.price_sum -= self.prices[0]
+        self.prices.append(price)
+        self.price_sum += price
+        self.trend_sum += price
+        self.last_price = price
+
+        self.updates += 1
+        if self.updates % RESYNC_INTERVAL == 0:
+            self._resync()
+        return self.features()
+
+    def features(self) -> Optional[np.ndarray]:
+        """
+        [return, annualized volatility, momentum] for the latest bar, or None while warming up.
+        """
+        if len(self.prices) < MOMENTUM_WINDOW or len(self.returns) < VOLATILITY_WINDOW:
+            return None
+        mean = self.return_sum / VOLATILITY_WINDOW
+        variance = max(self.return_sq_sum / VOLATILITY_WINDOW - mean * mean, 0.0)
+        sma = self.price_sum / MOMENTUM_WINDOW
+        return np.array([
+            self.returns[-1],
+            np.sqrt(variance) * np.sqrt(TRADING_DAYS),
+            (self.last_price - sma) / sma
+        ])
+
+    def trend(self) -> str:
+        if len(self.prices) < TREND_WINDOW:
+            return "neutral"
+        sma = self.trend_sum / TREND_WINDOW
+        if self.last_price > sma * 1.015:
+            return "up"
+        elif self.last_price < sma * 0.985:
+            return "down"
+        return "neutral"
+
+    def _resync(self):
+        prices = list(self.prices)
+        self.price_sum = float(sum(prices))
+        self.trend_sum = float(sum(prices[-TREND_WINDOW:]))
+        self.return_sum = float(sum(self.returns))
+        self.return_sq_sum = float(sum(r * r for r in self.returns))
+
+    def to_dict(self) -> dict:
+        return {
+            "ticker": self.ticker,
+            "last_price": self.last_price,
+            "last_date": self.last_date,
+            "prices": list(self.prices),
+            "returns": list(self.returns),
+            "probabilities": None if self.probabilities is None else self.probabilities.tolist(),
+            "updates": self.updates,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RegimeFilterState":
+        state = cls(data["ticker"])
+        state.last_price = data["last_price"]
+        state.last_date = data.get("last_date")
+        state.prices.extend(data["prices"])
+        state.returns.extend(data["returns"])
+        state.updates = data.get("updates", 0)
+        if data.get("probabilities") is not None:
+            state.probabilities = np.array(data["probabilities"], dtype=np.float64)
+        state._resync()
+        return state
@@ -1,18 +1,407 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.data.repository import PriceRepository
+from app.data.series import PriceSeries
+from app.ml_layer.artifacts import load_array_artifact, save_array_artifact
+from app.ml_layer.feature_store import FEATURE_NAMES
+from app.ml_layer.features import TRADING_DAYS
+from app.ml_layer.volatility import (
+    MODELS, PARAMETER_NAMES, fit_garch, fit_universe, forecast_variance, log_returns, update_variance
+)
+
+
 class ForecastingModel:
     """
     Probabilistic forecasting models.
+
+    Volatility comes from GARCH / GJR-GARCH fits whose per-ticker state
+    (parameters, mean, next-day variance and the bar it is as of) is kept in a
+    shared cache. A ticker is refitted when its state is missing or older than
+    refit_days; in between, new bars only advance the variance recursion.
+    Return forecasts score feature store rows with the trained ReturnForecastModel.
     """
-    
-    def forecast_volatility(self, returns: list[float]) -> float:
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        cache=None,
+        refit_days: Optional[int] = None,
+        min_observations: Optional[int] = None,
+        max_workers: Optional[int] = None
+    ):
         """
-        Placeholder for GARCH-style volatility forecasting.
+        Args:
+            model: One of volatility.MODELS (default settings.GARCH_MODEL).
+            cache: SharedCache for per-ticker states (default the 'volatility' shared cache).
+            refit_days: Days a fit is reused before refitting.
+            min_observations: Returns needed to (re)fit a ticker.
+            max_workers: Process pool size for refits (1 fits in-process).
         """
-        # TODO: Implement volatility forecasting
-        return 0.0
+        from app.core.config import settings
+
+        self.model = model or settings.GARCH_MODEL
+        if self.model not in MODELS:
+            raise ValueError(f"model must be one of {', '.join(MODELS)}")
+        if cache is None:
+            from app.core.shared_cache import get_shared_cache
+            cache = get_shared_cache("volatility", ttl=settings.GARCH_STATE_TTL)
+        self.cache = cache
+        self.refit_days = refit_days if refit_days is not None else settings.GARCH_REFIT_DAYS
+        self.min_observations = min_observations or settings.GARCH_MIN_OBSERVATIONS
+        self.max_workers = max_workers or settings.GARCH_FIT_WORKERS
+        self.chunk_size = settings.GARCH_FIT_CHUNK_SIZE
+
+    def forecast_volatility(self, returns: List[float]) -> float:
+        """
+        Next-day volatility (daily, as a fraction) from a fit on these simple returns alone.
+        """
+        returns = np.log1p(np.asarray(returns, dtype=np.float64))
+        fit = fit_garch(returns[np.newaxis, :], model=self.model)
+        variance = float(fit["variance"][0])
+        return float(np.sqrt(variance)) if np.isfinite(variance) else 0.0
+
+    def volatility_forecasts(
+        self,
+        series_list: Sequence[PriceSeries],
+        horizon: int = 10,
+        today: Optional[date] = None,
+        fit_missing: bool = True
+    ) -> Dict[str, Optional[dict]]:
+        """
+        Volatility forecasts for many tickers at once from their cached states.
+
+        Stale or missing states are refitted in one batch; the others are advanced
+        with the bars after their as_of date. Tickers that have neither a usable
+        state nor enough history map to None.
+
+        Args:
+            fit_missing: Refit stale or missing states. Latency-sensitive callers
+                         pass False to serve (and advance) cached states only;
+                         stale ones are then served with stale=True until the
+                         scheduled refit (worker task volatility.refit_watchlist).
+
+        Returns:
+            ticker -> forecast dict (see _forecast) or None.
+        """
+        today = today or date.today()
+        series_list = self._completed(series_list, today)
+        states = self.load_states([s.ticker for s in series_list])
+        refit, advance = [], []
+        for series in series_list:
+            state = states.get(series.ticker)
+            if state is not None and self._bridges(state, series) and not (fit_missing and self._is_stale(state, today)):
+                advance.append(series)
+            elif fit_missing:
+                refit.append(series)
+            else:
+                states.pop(series.ticker, None)
+
+        if refit:
+            states.update(self.refit(refit, today=today))
+        if advance:
+            states.update(self._advance(advance, states))
+
+        forecasts: Dict[str, Optional[dict]] = {}
+        ready = [s.ticker for s in series_list if s.ticker in states]
+        if ready:
+            params = np.array([states[t]["params"] for t in ready])
+            variances = forecast_variance(params, [states[t]["variance"] for t in ready], horizon)
+            refitted = {s.ticker for s in refit}
+            for i, ticker in enumerate(ready):
+                forecasts[ticker] = self._forecast(
+                    states[ticker], variances[i], ticker in refitted, self._is_stale(states[ticker], today)
+                )
+        return {s.ticker: forecasts.get(s.ticker) for s in series_list}
+
+    def refit(
+        self,
+        series_list: Sequence[PriceSeries],
+        today: Optional[date] = None,
+        max_workers: Optional[int] = None
+    ) -> Dict[str, dict]:
+        """
+        Fit every series with enough history and store the new states.
+
+        Returns:
+            ticker -> state for the tickers that could be fitted.
+        """
+        today = today or date.today()
+        usable = {s.ticker: s for s in self._completed(series_list, today) if len(s) > self.min_observations}
+        if not usable:
+            return {}
+        fits = fit_universe(
+            {ticker: log_returns(s.close) for ticker, s in usable.items()},
+            model=self.model,
+            max_workers=max_workers or self.max_workers,
+            chunk_size=self.chunk_size
+        )
+        states = {}
+        for ticker, fit in fits.items():
+            if not np.isfinite(fit["variance"]):
+                continue
+            series = usable[ticker]
+            states[ticker] = {
+                "model": self.model,
+                "params": fit["params"],
+                "mean": fit["mean"],
+                "variance": fit["variance"],
+                "log_likelihood": fit["log_likelihood"],
+                "observations": fit["observations"],
+                "as_of": str(series.dates[-1]),
+                "last_close": float(series.close[-1]),
+                "fitted_on": today.isoformat(),
+            }
+        self.save_states(states)
+        return states
+
+    def load_states(self, tickers: Sequence[str]) -> Dict[str, dict]:
+        states = {}
+        for ticker in tickers:
+            state = self.cache.get(self.cache.key(ticker.upper(), self.model))
+            if state is not None:
+                states[ticker] = state
+        return states
+
+    def save_states(self, states: Dict[str, dict]):
+        for ticker, state in states.items():
+            self.cache.set(self.cache.key(ticker.upper(), self.model), state)
+
+    @staticmethod
+    def _completed(series_list: Sequence[PriceSeries], today: date) -> List[PriceSeries]:
+        """
+        Series cut after the last completed session. A state moved over today's
+        forming bar would no longer bridge the stored history of later requests.
+        """
+        session = np.datetime64(PriceRepository.last_expected_session(today), "D")
+        return [s.slice(stop=int(np.searchsorted(s.dates, session, side="right"))) for s in series_list]
+
+    def _is_stale(self, state: dict, today: date) -> bool:
+        return date.fromisoformat(state["fitted_on"]) + timedelta(days=self.refit_days) <= today
+
+    @staticmethod
+    def _bridges(state: dict, series: PriceSeries) -> bool:
+        """
+        True when the series still contains the state's as_of bar at the same close.
+        """
+        index = int(np.searchsorted(series.dates, np.datetime64(state["as_of"], "D")))
+        return (
+            index < len(series)
+            and series.dates[index] == np.datetime64(state["as_of"], "D")
+            and np.isclose(series.close[index], state["last_close"])
+        )
+
+    def _advance(self, series_list: Sequence[PriceSeries], states: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        Run the variance recursion over the bars after each state's as_of date (one
+        left-padded matrix for all tickers) and store the states that moved.
+        """
+        new_returns = []
+        for series in series_list:
+            start = int(np.searchsorted(series.dates, np.datetime64(states[series.ticker]["as_of"], "D")))
+            new_returns.append(log_returns(series.close[start:]))
+        width = max(len(r) for r in new_returns)
+        if width == 0:
+            return {}
+
+        matrix = np.full((len(series_list), width), np.nan)
+        for row, returns in enumerate(new_returns):
+            matrix[row, width - len(returns):] = returns
+        tickers = [s.ticker for s in series_list]
+        variances = update_variance(
+            np.array([states[t]["params"] for t in tickers]),
+            np.array([states[t]["mean"] for t in tickers]),
+            np.array([states[t]["variance"] for t in tickers]),
+            matrix
+        )
+
+        updated = {}
+        for series, returns, variance in zip(series_list, new_returns, variances):
+            if len(returns):
+                updated[series.ticker] = dict(
+                    states[series.ticker],
+                    variance=float(variance),
+                    as_of=str(series.dates[-1]),
+                    last_close=float(series.close[-1]),
+                    observations=states[series.ticker]["observations"] + len(returns)
+                )
+        self.save_states(updated)
+        return updated
+
+    @staticmethod
+    def _forecast(state: dict, variances: np.ndarray, refitted: bool, stale: bool) -> dict:
+        """
+        Forecast dict from a state and its daily variance path (volatilities annualized).
+        """
+        omega, alpha, gamma, beta = state["params"]
+        persistence = alpha + gamma / 2 + beta
+        annualize = np.sqrt(TRADING_DAYS)
+        return {
+            "model": state["model"],
+            "as_of": state["as_of"],
+            "fitted_on": state["fitted_on"],
+            "refitted": refitted,
+            "stale": stale,
+            "params": dict(zip(PARAMETER_NAMES, state["params"])),
+            "persistence": persistence,
+            "daily_volatility": float(np.sqrt(variances[0])),
+            "annualized_volatility": float(np.sqrt(variances[0]) * annualize),
+            "long_run_volatility": float(np.sqrt(omega / (1 - persistence)) * annualize),
+            "horizon_days": len(variances),
+            # Volatility of the cumulative return over the whole horizon (not annualized)
+            "horizon_volatility": float(np.sqrt(variances.sum())),
+            "term_structure": (np.sqrt(variances) * annualize).round(6).tolist(),
+        }
 
     def forecast_returns(self, features: dict) -> float:
         """
-        Placeholder for return forecasting (e.g., XGBoost).
+        Forward return forecast for one feature dict (FEATURE_NAMES keys; missing
+        keys count as unknown). 0.0 while no return model has been trained.
+        """
+        model = _get_return_model()
+        if model is None:
+            return 0.0
+        row = np.array([[features.get(name, np.nan) for name in model.feature_names]], dtype=np.float64)
+        return float(model.predict(row)[0])
+
+    def forecast_returns_batch(self, tickers: Sequence[str], store=None, as_of: Optional[date] = None) -> Optional[dict]:
+        """
+        Forward return forecasts for a universe from its latest feature rows, scored
+        as one matrix product. None while no return model has been trained.
+
+        Returns:
+            {'model_version', 'horizon', 'forecasts': {ticker: {'as_of', 'expected_return'}}, 'missing'}
+        """
+        model = _get_return_model()
+        if model is None:
+            return None
+        if store is None:
+            from app.ml_layer.feature_store import get_feature_store
+            store = get_feature_store()
+        found, dates, matrix = store.cross_section(tickers, as_of)
+        predictions = model.predict(matrix) if found else np.empty(0)
+        scored = set(found)
+        return {
+            "model_version": model.model_version,
+            "horizon": model.horizon,
+            "forecasts": {
+                ticker: {"as_of": str(row_date), "expected_return": float(prediction)}
+                for ticker, row_date, prediction in zip(found, dates, predictions)
+            },
+            "missing": [t for t in tickers if t not in scored],
+        }
+
+
+class ReturnForecastModel:
+    """
+    Ridge regression of the forward `horizon`-bar return on FEATURE_NAMES.
+
+    Features are standardized with training means and deviations and missing
+    values count as the training mean. Both steps are folded into one weight
+    vector, so scoring a universe is where(nan, mean, X) @ weights + bias.
+    """
+
+    ARRAYS = ("center", "weights", "bias")
+    FORMAT = "ridge-npy/1"
+
+    def __init__(
+        self,
+        center: np.ndarray,
+        weights: np.ndarray,
+        bias: float,
+        horizon: int,
+        feature_names: Sequence[str] = FEATURE_NAMES,
+        version: Optional[str] = None,
+        trained_at: Optional[str] = None,
+        metadata: Optional[dict] = None
+    ):
+        self.center = np.asarray(center, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.horizon = int(horizon)
+        self.feature_names = tuple(feature_names)
+        self.model_version = version
+        self.trained_at = trained_at
+        self.metadata = metadata or {}
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, horizon: int, alpha: float = 1.0, version: Optional[str] = None) -> "ReturnForecastModel":
+        """
+        Closed-form ridge fit on standardized features (alpha scales the identity
+        added to the feature correlation matrix).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(X) < 2 or len(X) != len(y):
+            raise ValueError("Need at least 2 rows with matching targets")
+        observed = ~np.isnan(X)
+        counts = observed.sum(axis=0)
+        center = np.where(counts > 0, np.where(observed, X, 0.0).sum(axis=0) / np.maximum(counts, 1), 0.0)
+        z = np.where(observed, X - center, 0.0)
+        scale = np.sqrt((z * z).sum(axis=0) / np.maximum(counts, 1))
+        scale = np.where(scale > 0, scale, 1.0)
+        z /= scale
+
+        n, k = z.shape
+        target = y - y.mean()
+        coef = np.linalg.solve(z.T @ z / n + alpha * np.eye(k), z.T @ target / n)
+        weights = coef / scale
+        trained_at = datetime.now()
+        return cls(
+            center, weights, y.mean() - center @ weights, horizon,
+            version=version or trained_at.strftime("%Y%m%d.%H%M%S"),
+            trained_at=trained_at.isoformat(),
+            metadata={"alpha": alpha, "rows": n}
+        )
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Forecasts for a (rows x features) matrix in feature_names order.
         """
-        # TODO: Implement return forecasting
-        return 0.0
+        X = np.asarray(X, dtype=np.float64)
+        return np.where(np.isnan(X), self.center, X) @ self.weights + self.bias
+
+    def save(self, path: str, **metadata) -> str:
+        return save_array_artifact(
+            path,
+            {"center": self.center, "weights": self.weights, "bias": np.array([self.bias])},
+            self.model_version,
+            self.FORMAT,
+            trained_at=self.trained_at,
+            extra={"horizon": self.horizon, "features": list(self.feature_names)},
+            **{**self.metadata, **metadata}
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ReturnForecastModel":
+        arrays, manifest = load_array_artifact(path, cls.ARRAYS, mmap=False)
+        return cls(
+            arrays["center"], arrays["weights"], float(arrays["bias"][0]), manifest["horizon"],
+            feature_names=manifest["features"], version=manifest["version"],
+            trained_at=manifest.get("trained_at"), metadata=manifest.get("metadata")
+        )
+
+
+def _get_return_model() -> Optional[ReturnForecastModel]:
+    from app.ml_layer.registry import get_return_model
+    model = get_return_model()
+    # Artifacts from an older feature set cannot score the current store
+    if model is not None and model.feature_names != FEATURE_NAMES:
+        return None
+    return model
+
+
+_forecasting_model: Optional[ForecastingModel] = None
+_forecasting_lock = threading.Lock()
+
+
+def get_forecasting_model() -> ForecastingModel:
+    """
+    Process-wide forecasting model configured from settings.
+    """
+    global _forecasting_model
+    with _forecasting_lock:
+        if _forecasting_model is None:
+            _forecasting_model = ForecastingModel()
+        return _forecasting_model
@@ -3,9 +3,16 @@ Market Regime Detection Model.
 Uses trained HMM when available, falls back to rule-based heuristics.
 """
 import os
-import pickle
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 import numpy as np
+from app.data.series import PriceSeries, as_close_array
+from app.ml_layer.artifacts import artifact_signature, load_hmm_artifact
+from app.ml_layer.filtering import GaussianHMMFilter, RegimeFilterState
+from app.ml_layer.features import (
+    MOMENTUM_WINDOW, VOLATILITY_WINDOW, regime_features, trend_labels, valid_feature_rows
+)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "regime_hmm")
 
 
 class RegimeDetectionModel:
@@ -13,6 +20,8 @@ class RegimeDetectionModel:
     Probabilistic market regime detection using:
     1. Trained Hidden Markov Model (if available)
     2. Volatility and trend heuristics (fallback)
+
+    Prefer the shared instance from app.ml_layer.registry over constructing one per module.
     """
     
     # Volatility thresholds (annualized)
@@ -20,89 +29,279 @@ class RegimeDetectionModel:
     MED_VOL_THRESHOLD = 0.20
     HIGH_VOL_THRESHOLD = 0.30
     
-    def __init__(self):
-        self.hmm_model = None
+    def __init__(self, model_path: Optional[str] = None):
+        self.hmm_model: Optional[GaussianHMMFilter] = None
         self.regime_map = None
-        self._load_trained_model()
+        self.model_version = None
+        self.filter_states: Dict[str, RegimeFilterState] = {}
+        self._load_trained_model(model_path or DEFAULT_MODEL_PATH)
     
-    def _load_trained_model(self):
+    def _load_trained_model(self, model_path: str):
         """
-        Load pre-trained HMM model if available.
+        Load pre-trained HMM parameters (memory-mapped .npy artifact) if available.
         """
-        model_path = os.path.join(
-            os.path.dirname(__file__), "..", "models", "regime_hmm.pkl"
-        )
         try:
-            if os.path.exists(model_path):
-                with open(model_path, "rb") as f:
-                    model_data = pickle.load(f)
-                self.hmm_model = model_data.get("model")
-                self.regime_map = model_data.get("regime_map")
-                print(f"Loaded trained HMM model (version: {model_data.get('version')})")
+            if artifact_signature(model_path) is not None:
+                artifact = load_hmm_artifact(model_path)
+                self.hmm_model = artifact.to_hmm()
+                self.regime_map = artifact.regime_map
+                self.model_version = artifact.version
+                print(f"Loaded trained HMM model (version: {artifact.version})")
         except Exception as e:
             print(f"Could not load HMM model: {e}. Using rule-based detection.")
     
-    def detect_regime(self, prices: List[float]) -> dict:
+    def detect_regime(self, prices: Union[PriceSeries, List[float]]) -> dict:
         """
         Detect market regime from price series.
         
         Returns:
             dict with 'regime', 'confidence', 'volatility', 'trend'
         """
-        if len(prices) < 50:
-            return {
-                "regime": "unknown",
-                "confidence": 0.0,
-                "volatility": 0.0,
-                "trend": "insufficient_data"
-            }
-        
-        # Calculate features
-        returns = np.diff(prices) / np.array(prices[:-1])
-        volatility = self._calculate_volatility(returns)
-        trend = self._calculate_trend(prices)
-        momentum = self._calculate_momentum(prices)
-        
-        # Try HMM first
+        closes = as_close_array(prices)
+        return self.detect_regimes(closes[np.newaxis, :])[0]
+    
+    def detect_regimes(self, closes: np.ndarray) -> List[dict]:
+        """
+        Detect regimes for many tickers in one pass.
+
+        Args:
+            closes: 2-D array (tickers x time) of closing prices, right-aligned so the
+                    last column is each ticker's latest bar; shorter histories are
+                    left-padded with NaN.
+
+        Returns:
+            One detect_regime-style dict per row.
+        """
+        closes = np.atleast_2d(np.asarray(closes, dtype=np.float64))
+        results = [self._insufficient_data() for _ in range(len(closes))]
+        valid = np.flatnonzero(np.sum(~np.isnan(closes), axis=1) >= MOMENTUM_WINDOW)
+        if not len(valid):
+            return results
+
+        # Only the trailing windows matter for the latest bar
+        window = closes[valid, -(max(MOMENTUM_WINDOW, VOLATILITY_WINDOW + 1)):]
+        features = regime_features(window)[:, -1, :]
+        trends = trend_labels(window)[:, -1]
+        last_returns, volatility, momentum = features[:, 0], features[:, 1], features[:, 2]
+
+        predictions = None
         if self.hmm_model is not None:
             try:
-                regime, confidence = self._predict_with_hmm(returns, volatility, momentum)
+                predictions = self._predict_with_hmm_batch(last_returns, volatility, momentum)
             except Exception as e:
                 print(f"HMM prediction failed: {e}. Using rules.")
-                regime, confidence = self._classify_with_rules(volatility, trend, momentum)
+
+        for i, row in enumerate(valid):
+            if predictions is not None:
+                regime, confidence = predictions[i]
+            else:
+                regime, confidence = self._classify_with_rules(float(volatility[i]), str(trends[i]), float(momentum[i]))
+            results[row] = {
+                "regime": regime,
+                "confidence": confidence,
+                "volatility": float(volatility[i]),
+                "trend": str(trends[i])
+            }
+        return results
+
+    def regime_history(self, series_list: List[PriceSeries]) -> List[dict]:
+        """
+        Decode a per-day regime timeline for one or more tickers.
+
+        All tickers' feature sequences are concatenated and decoded with a single
+        forward-backward pass (sequence boundaries passed as lengths), so every
+        day's label uses the whole history rather than one isolated observation.
+
+        Returns:
+            One dict per series with 'ticker', 'dates', 'regimes', 'confidence'
+            and, when the HMM is available, per-regime posterior 'probabilities'.
+        """
+        decoded = []
+        blocks, lengths = [], []
+        for series in series_list:
+            features = regime_features(series.close)
+            rows = np.flatnonzero(valid_feature_rows(features))
+            decoded.append((series, rows, features[rows]))
+            if len(rows):
+                blocks.append(features[rows])
+                lengths.append(len(rows))
+
+        posteriors = None
+        if self.hmm_model is not None and blocks:
+            try:
+                posteriors = self.hmm_model.predict_proba(np.concatenate(blocks), lengths=lengths)
+            except Exception as e:
+                print(f"HMM decoding failed: {e}. Using rules.")
+
+        results = []
+        offset = 0
+        for series, rows, features in decoded:
+            timeline = {
+                "ticker": series.ticker,
+                "dates": [str(d) for d in series.dates[rows]],
+                "regimes": [],
+                "confidence": [],
+            }
+            if posteriors is not None:
+                probs = posteriors[offset:offset + len(rows)]
+                offset += len(rows)
+                timeline["regimes"], timeline["confidence"] = self._label_posteriors(probs, features[:, 1])
+                timeline["probabilities"] = self._regime_probabilities(probs)
+            else:
+                trends = trend_labels(series.close)[rows]
+                for (_, volatility, momentum), trend in zip(features.tolist(), trends):
+                    regime, confidence = self._classify_with_rules(volatility, str(trend), momentum)
+                    timeline["regimes"].append(regime)
+                    timeline["confidence"].append(confidence)
+            results.append(timeline)
+        return results
+
+    def init_filter(self, series: PriceSeries) -> dict:
+        """
+        (Re)build a ticker's filter state by running its history through the forward filter.
+        """
+        state = RegimeFilterState(series.ticker)
+        self.filter_states[series.ticker] = state
+        for price in series.close.tolist():
+            features = state.push(price)
+            if features is not None and self.hmm_model is not None:
+                state.probabilities = self.hmm_model.step(
+                    None if state.probabilities is None else state.probabilities[np.newaxis, :],
+                    features[np.newaxis, :]
+                )[0]
+        if len(series):
+            state.last_date = str(series.dates[-1])
+        return self.filter_regime(series.ticker)
+
+    def update_filter(self, ticker: str, price: float, bar_date: Optional[str] = None) -> dict:
+        """
+        Fold one new closing price into a ticker's filter state.
+        """
+        return self.update_filters({ticker: price}, bar_date)[ticker]
+
+    def update_filters(self, closes: Dict[str, float], bar_date: Optional[str] = None) -> Dict[str, dict]:
+        """
+        Fold one new bar per ticker into the filter states.
+
+        Feature accumulators are updated in O(1) per ticker, then every warmed-up
+        ticker advances with one batched emission evaluation and one (N x K) @ (K x K)
+        transition multiply.
+        """
+        ready, observations = [], []
+        for ticker, price in closes.items():
+            state = self.filter_states.get(ticker)
+            if state is None:
+                state = self.filter_states[ticker] = RegimeFilterState(ticker)
+            features = state.push(float(price))
+            if bar_date is not None:
+                state.last_date = str(bar_date)
+            if features is not None:
+                ready.append(state)
+                observations.append(features)
+
+        if self.hmm_model is not None and ready:
+            alpha = np.array([
+                s.probabilities if s.probabilities is not None else np.full(self.hmm_model.n_states, np.nan)
+                for s in ready
+            ])
+            alpha = self.hmm_model.step(alpha, np.array(observations))
+            for state, probabilities in zip(ready, alpha):
+                state.probabilities = probabilities
+
+        return {ticker: self.filter_regime(ticker) for ticker in closes}
+
+    def filter_regime(self, ticker: str) -> dict:
+        """
+        Current regime from a ticker's filter state (detect_regime-style dict plus 'as_of').
+        """
+        state = self.filter_states.get(ticker)
+        features = state.features() if state is not None else None
+        if features is None:
+            return self._insufficient_data()
+
+        _, volatility, momentum = features.tolist()
+        trend = state.trend()
+        if self.hmm_model is not None and state.probabilities is not None:
+            regimes, confidences = self._label_posteriors(state.probabilities[np.newaxis, :], [volatility])
+            regime, confidence = regimes[0], confidences[0]
         else:
             regime, confidence = self._classify_with_rules(volatility, trend, momentum)
-        
+
         return {
             "regime": regime,
             "confidence": confidence,
             "volatility": volatility,
-            "trend": trend
+            "trend": trend,
+            "as_of": state.last_date
         }
-    
-    def _predict_with_hmm(self, returns: np.ndarray, volatility: float, momentum: float) -> tuple:
+
+    def export_filter_states(self) -> dict:
         """
-        Predict regime using trained HMM.
+        JSON-serializable snapshot of every ticker's filter state.
         """
-        # Prepare features (last observation)
-        features = np.array([[returns[-1], volatility, momentum]])
-        
-        # Get state probabilities
-        state = self.hmm_model.predict(features)[0]
-        
-        # Get probabilities for confidence
-        log_probs = self.hmm_model.score_samples(features)[1]
-        probs = np.exp(log_probs[0])
-        confidence = float(np.max(probs))
-        
-        regime = self.regime_map.get(state, "unknown")
-        
-        # Upgrade to crisis if volatility is extreme
-        if volatility > self.HIGH_VOL_THRESHOLD and regime == "bear":
-            regime = "crisis"
-            confidence = min(confidence + 0.1, 0.95)
-        
-        return regime, confidence
+        return {
+            "model_version": self.model_version,
+            "states": {ticker: state.to_dict() for ticker, state in self.filter_states.items()}
+        }
+
+    def restore_filter_states(self, data: dict):
+        """
+        Restore states from export_filter_states(). State probabilities from a
+        different model version are dropped; the feature windows are kept.
+        """
+        same_model = data.get("model_version") == self.model_version
+        for ticker, payload in data.get("states", {}).items():
+            state = RegimeFilterState.from_dict(payload)
+            if not same_model:
+                state.probabilities = None
+            self.filter_states[ticker] = state
+
+    def _label_posteriors(self, probs: np.ndarray, volatility: np.ndarray) -> tuple:
+        """
+        Most likely regime and its probability for each posterior row.
+        """
+        regimes, confidences = [], []
+        for state, confidence, vol in zip(np.argmax(probs, axis=1), np.max(probs, axis=1), volatility):
+            regime = self.regime_map.get(int(state), "unknown")
+            confidence = float(confidence)
+
+            # Upgrade to crisis if volatility is extreme
+            if vol > self.HIGH_VOL_THRESHOLD and regime == "bear":
+                regime = "crisis"
+                confidence = min(confidence + 0.1, 0.95)
+            regimes.append(regime)
+            confidences.append(confidence)
+        return regimes, confidences
+
+    def _regime_probabilities(self, probs: np.ndarray) -> dict:
+        """
+        Posterior probability per regime label (states sharing a label are summed).
+        """
+        by_regime = {}
+        for state in range(probs.shape[1]):
+            regime = self.regime_map.get(state, "unknown")
+            column = probs[:, state]
+            by_regime[regime] = by_regime[regime] + column if regime in by_regime else column
+        return {regime: np.round(column, 6).tolist() for regime, column in by_regime.items()}
+
+    @staticmethod
+    def _insufficient_data() -> dict:
+        return {
+            "regime": "unknown",
+            "confidence": 0.0,
+            "volatility": 0.0,
+            "trend": "insufficient_data"
+        }
+
+    def _predict_with_hmm_batch(self, last_returns: np.ndarray, volatility: np.ndarray, momentum: np.ndarray) -> List[tuple]:
+        """
+        Predict regimes for many last-bar observations with one model call.
+        Each observation is scored as its own length-1 sequence.
+        """
+        features = np.column_stack([last_returns, volatility, momentum])
+        probs = self.hmm_model.step(None, features)
+        regimes, confidences = self._label_posteriors(probs, volatility)
+        return list(zip(regimes, confidences))
     
     def _classify_with_rules(self, volatility: float, trend: str, momentum: float) -> tuple:
         """
@@ -137,44 +336,3 @@ class RegimeDetectionModel:
             return ("bear", 0.62)
         
         return ("sideways", 0.55)
-    
-    @staticmethod
-    def _calculate_volatility(returns: np.ndarray, window: int = 20) -> float:
-        """
-        Calculate annualized rolling volatility.
-        """
-        if len(returns) < window:
-            return float(np.std(returns) * np.sqrt(252))
-        return float(np.std(returns[-window:]) * np.sqrt(252))
-    
-    @staticmethod
-    def _calculate_trend(prices: List[float], window: int = 20) -> str:
-        """
-        Determine trend direction using SMA crossover.
-        """
-        if len(prices) < window:
-            return "neutral"
-        
-        prices_arr = np.array(prices)
-        sma = np.mean(prices_arr[-window:])
-        current = prices_arr[-1]
-        
-        if current > sma * 1.015:
-            return "up"
-        elif current < sma * 0.985:
-            return "down"
-        return "neutral"
-    
-    @staticmethod
-    def _calculate_momentum(prices: List[float], window: int = 50) -> float:
-        """
-        Calculate price momentum relative to SMA.
-        """
-        if len(prices) < window:
-            return 0.0
-        
-        prices_arr = np.array(prices)
-        sma = np.mean(prices_arr[-window:])
-        return float((prices_arr[-1] - sma) / sma)
-
-
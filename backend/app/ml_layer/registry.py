@@ -0,0 +1,174 @@
+"""
+Model Registry.
+Process-wide, lazily loaded models with hot reload when their artifact changes on disk.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+from app.ml_layer.artifacts import artifact_signature
+
+REGIME_MODEL = "regime"
+RETURN_MODEL = "returns"
+DEFAULT_RETURN_MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "return_ridge")
+
+
+class _Entry:
+    __slots__ = ("name", "path", "loader", "carry_over", "lock", "model", "signature", "next_check", "loaded_at", "reloads")
+
+    def __init__(self, name: str, path: str, loader: Callable[[str], Any], carry_over: Optional[Callable[[Any, Any], None]]):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.carry_over = carry_over
+        self.lock = threading.Lock()
+        self.model = None
+        self.signature = None
+        self.next_check = 0.0
+        self.loaded_at = None
+        self.reloads = 0
+
+
+class ModelRegistry:
+    """
+    Named models loaded on first use and shared by every caller in the process.
+
+    The artifact on disk is re-checked at most once per check_interval; when its
+    signature changes the model is rebuilt and swapped in, and callers holding
+    the previous instance keep using it until they ask again.
+    """
+
+    def __init__(self, check_interval: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.check_interval = check_interval
+        self._clock = clock
+        self._entries: Dict[str, _Entry] = {}
+
+    def register(
+        self,
+        name: str,
+        path: str,
+        loader: Callable[[str], Any],
+        carry_over: Optional[Callable[[Any, Any], None]] = None
+    ):
+        """
+        Register a model.
+
+        Args:
+            name: Registry key.
+            path: Artifact location passed to the loader and watched for changes.
+            loader: Builds the model from the path.
+            carry_over: Called as carry_over(old, new) on reload to transfer runtime state.
+        """
+        self._entries[name] = _Entry(name, path, loader, carry_over)
+
+    def get(self, name: str):
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Unknown model '{name}'")
+
+        if entry.model is not None and self._clock() < entry.next_check:
+            return entry.model
+        with entry.lock:
+            now = self._clock()
+            if entry.model is None or now >= entry.next_check:
+                entry.next_check = now + self.check_interval
+                signature = artifact_signature(entry.path)
+                if entry.model is None or signature != entry.signature:
+                    self._load(entry, signature)
+        return entry.model
+
+    def reload(self, name: str):
+        """
+        Force a reload on the next get().
+        """
+        entry = self._entries[name]
+        with entry.lock:
+            entry.signature = None
+            entry.next_check = 0.0
+
+    def info(self) -> Dict[str, dict]:
+        return {
+            entry.name: {
+                "path": entry.path,
+                "loaded": entry.model is not None,
+                "version": getattr(entry.model, "model_version", None),
+                "loaded_at": entry.loaded_at,
+                "reloads": entry.reloads,
+            }
+            for entry in self._entries.values()
+        }
+
+    @staticmethod
+    def _load(entry: _Entry, signature: Optional[tuple]):
+        try:
+            model = entry.loader(entry.path)
+        except Exception as e:
+            if entry.model is None:
+                raise
+            # Keep serving the previous model; the next check retries
+            print(f"Could not reload model '{entry.name}': {e}")
+            return
+
+        if entry.model is not None:
+            if entry.carry_over is not None:
+                entry.carry_over(entry.model, model)
+            entry.reloads += 1
+            print(f"Reloaded model '{entry.name}' (version: {getattr(model, 'model_version', None)})")
+        entry.model = model
+        entry.signature = signature
+        entry.loaded_at = time.time()
+
+
+def _load_regime_model(path: str):
+    # Deferred so importing the registry stays cheap
+    from app.ml_layer.regime import RegimeDetectionModel
+    return RegimeDetectionModel(path)
+
+
+def _load_return_model(path: str):
+    # None until the first model is trained; the registry keeps checking for the artifact
+    from app.ml_layer.artifacts import artifact_signature
+    from app.ml_layer.forecasting import ReturnForecastModel
+    return ReturnForecastModel.load(path) if artifact_signature(path) is not None else None
+
+
+def _carry_filter_states(old, new):
+    new.restore_filter_states(old.export_filter_states())
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Process-wide registry with the built-in models registered.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from app.ml_layer.regime import DEFAULT_MODEL_PATH
+            _registry = ModelRegistry(check_interval=settings.MODEL_RELOAD_INTERVAL)
+            _registry.register(
+                REGIME_MODEL,
+                settings.REGIME_MODEL_PATH or DEFAULT_MODEL_PATH,
+                _load_regime_model,
+                carry_over=_carry_filter_states
+            )
+            _registry.register(RETURN_MODEL, settings.RETURN_MODEL_PATH or DEFAULT_RETURN_MODEL_PATH, _load_return_model)
+        return _registry
+
+
+def get_regime_model():
+    """
+    Shared RegimeDetectionModel for this process.
+    """
+    return get_model_registry().get(REGIME_MODEL)
+
+
+def get_return_model():
+    """
+    Shared ReturnForecastModel for this process (None until one is trained).
+    """
+    return get_model_registry().get(RETURN_MODEL)
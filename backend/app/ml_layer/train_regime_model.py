@@ -1,20 +1,32 @@
 """
 Regime Detection Model Training Script.
-Trains a Hidden Markov Model (HMM) on historical market data.
+Trains a Hidden Markov Model (HMM) on historical market data, running random
+restarts over a grid of state counts and covariance types in a process pool.
+
+Training data is streamed per ticker from the local ohlcv_data table (default)
+or a local Parquet/CSV file, so runs are reproducible offline; Yahoo Finance
+remains available as a source.
+
+Usage: python -m app.ml_layer.train_regime_model --source db --states 2 3 4 --restarts 8
 """
+import argparse
+import copy
+import json
 import os
-import pickle
 import numpy as np
-import yfinance as yf
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from app.ml_layer.artifacts import save_hmm_artifact
+from app.ml_layer.features import FEATURE_NAMES, feature_matrix
 
 
-def fetch_training_data(ticker: str = "SPY", years: int = 10):
+def fetch_training_data(ticker: str = "SPY", years: int = 10, start: date = None, end: date = None):
     """
-    Fetch historical data for model training.
+    Fetch historical data for model training from Yahoo Finance.
     """
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=years * 365)
+    import yfinance as yf
+
+    end_date = end or datetime.now()
+    start_date = start or end_date - timedelta(days=years * 365)
     
     stock = yf.Ticker(ticker)
     hist = stock.history(start=start_date, end=end_date)
@@ -28,47 +40,76 @@ def calculate_features(hist):
     - Returns
     - Volatility (rolling 20-day)
     - Momentum (price vs 50-day SMA)
+
+    Uses the same vectorized feature pipeline as RegimeDetectionModel.
     """
-    prices = hist["Close"].values
-    
-    # Daily returns
-    returns = np.diff(prices) / prices[:-1]
-    
-    # Rolling volatility (20-day, annualized)
-    window = 20
-    rolling_vol = []
-    for i in range(window, len(returns)):
-        vol = np.std(returns[i-window:i]) * np.sqrt(252)
-        rolling_vol.append(vol)
-    
-    # Momentum (price relative to 50-day SMA)
-    sma_window = 50
-    momentum = []
-    for i in range(sma_window, len(prices)):
-        sma = np.mean(prices[i-sma_window:i])
-        mom = (prices[i] - sma) / sma
-        momentum.append(mom)
-    
-    # Align all features (use minimum length)
-    min_len = min(len(rolling_vol), len(momentum))
-    
-    features = np.column_stack([
-        returns[-min_len:],
-        rolling_vol[-min_len:],
-        momentum[-min_len:]
-    ])
-    
+    features, _ = feature_matrix([hist["Close"].to_numpy(dtype=np.float64)])
     return features
 
 
-def train_hmm_model(features, n_states: int = 3, n_iter: int = 100):
+def load_training_sequences(series_iter):
+    """
+    Build the HMM training matrix from a stream of PriceSeries.
+
+    Features are computed per ticker as the series arrive, so only the compact
+    feature rows are kept. Tickers too short for a full feature window are skipped.
+
+    Returns:
+        (features, lengths, tickers): concatenated observations, per-ticker
+        sequence lengths for hmmlearn, and the tickers in the same order.
+    """
+    blocks, lengths, tickers = [], [], []
+    for series in series_iter:
+        features, seq_lengths = feature_matrix([series.close])
+        if seq_lengths:
+            blocks.append(features)
+            lengths.extend(seq_lengths)
+            tickers.append(series.ticker)
+    if not blocks:
+        return np.empty((0, len(FEATURE_NAMES))), [], []
+    return np.concatenate(blocks), lengths, tickers
+
+
+def iter_training_series(source: str, tickers=None, path: str = None, start: date = None, end: date = None):
+    """
+    Price series for training from the local ohlcv_data table ('db'), the columnar
+    store ('columnar', path = store root), a Parquet/CSV file ('file') or Yahoo
+    Finance ('yfinance', network).
+    """
+    if source == "db":
+        from app.core.database import SessionLocal
+        from app.data.repository import SQLPriceStore
+        db = SessionLocal()
+        try:
+            yield from SQLPriceStore(db).iter_series(tickers=tickers, start=start, end=end)
+        finally:
+            db.close()
+    elif source == "columnar":
+        from app.core.config import settings
+        from app.data.columnar import ColumnarPriceStore
+        yield from ColumnarPriceStore(path or settings.COLUMNAR_STORE_PATH).iter_series(tickers=tickers, start=start, end=end)
+    elif source == "file":
+        from app.data.loader import iter_file_series
+        if not path:
+            raise ValueError("--path is required for the file source")
+        yield from iter_file_series(path, tickers=tickers, start=start, end=end)
+    elif source == "yfinance":
+        from app.data.series import PriceSeries
+        for ticker in tickers or ["SPY"]:
+            yield PriceSeries.from_dataframe(ticker, fetch_training_data(ticker, start=start, end=end))
+    else:
+        raise ValueError(f"Unknown training data source: {source}")
+
+
+def train_hmm_model(features, n_states: int = 3, n_iter: int = 100,
+                    covariance_type: str = "full", random_state: int = 42, lengths=None):
     """
     Train a Gaussian HMM for regime detection.
     
-    States:
-    - 0: Low volatility (Bull/Sideways)
-    - 1: Medium volatility (Transition)
-    - 2: High volatility (Bear/Crisis)
+    States are ordered by volatility afterwards (see map_states_to_regimes):
+    - Lowest volatility: Bull
+    - Intermediate: Sideways / transition
+    - Highest volatility: Bear/Crisis
     """
     try:
         from hmmlearn.hmm import GaussianHMM
@@ -78,98 +119,354 @@ def train_hmm_model(features, n_states: int = 3, n_iter: int = 100):
     
     model = GaussianHMM(
         n_components=n_states,
-        covariance_type="full",
+        covariance_type=covariance_type,
         n_iter=n_iter,
-        random_state=42
+        random_state=random_state
     )
     
-    model.fit(features)
+    model.fit(features, lengths=lengths)
     
     return model
 
 
-def map_states_to_regimes(model, features):
+def n_free_parameters(n_states: int, n_features: int, covariance_type: str) -> int:
+    """
+    Free parameter count of a Gaussian HMM (for BIC).
+    """
+    covariance = {
+        "full": n_states * n_features * (n_features + 1) // 2,
+        "diag": n_states * n_features,
+        "spherical": n_states,
+        "tied": n_features * (n_features + 1) // 2,
+    }[covariance_type]
+    return (n_states - 1) + n_states * (n_states - 1) + n_states * n_features + covariance
+
+
+def split_holdout(features, lengths=None, holdout: float = 0.2):
+    """
+    Hold out the last fraction of every sequence (time-ordered, no shuffling).
+
+    Returns:
+        (train, train_lengths, test, test_lengths)
+    """
+    lengths = [len(features)] if lengths is None else list(lengths)
+    train, train_lengths, test, test_lengths = [], [], [], []
+    offset = 0
+    for length in lengths:
+        block = features[offset:offset + length]
+        offset += length
+        n_test = int(np.ceil(length * holdout)) if holdout > 0 else 0
+        n_train = length - n_test
+        if n_train:
+            train.append(block[:n_train])
+            train_lengths.append(n_train)
+        if n_test:
+            test.append(block[n_train:])
+            test_lengths.append(n_test)
+    n_features = features.shape[1]
+    return (
+        np.concatenate(train) if train else np.empty((0, n_features)), train_lengths,
+        np.concatenate(test) if test else np.empty((0, n_features)), test_lengths
+    )
+
+
+# Training data of the current selection run, set once per worker process by _init_worker
+_worker_data = {}
+
+
+def _init_worker(train, train_lengths, test, test_lengths):
+    _worker_data.update(train=train, train_lengths=train_lengths, test=test, test_lengths=test_lengths)
+
+
+def _fit_candidate(task: dict) -> dict:
+    """
+    Fit and score one (n_states, covariance_type, seed) candidate on the worker's data. Runs in a worker process.
+    """
+    result = {key: task[key] for key in ("n_states", "covariance_type", "random_state")}
+    train, train_lengths = _worker_data["train"], _worker_data["train_lengths"]
+    test, test_lengths = _worker_data["test"], _worker_data["test_lengths"]
+    try:
+        model = train_hmm_model(
+            train, n_states=task["n_states"], n_iter=task["n_iter"],
+            covariance_type=task["covariance_type"], random_state=task["random_state"],
+            lengths=train_lengths
+        )
+        if model is None:
+            raise RuntimeError("hmmlearn not installed")
+        train_ll = model.score(train, lengths=train_lengths)
+        n_params = n_free_parameters(task["n_states"], train.shape[1], task["covariance_type"])
+        result.update(
+            converged=bool(model.monitor_.converged),
+            iterations=int(model.monitor_.iter),
+            train_log_likelihood=float(train_ll),
+            bic=float(-2 * train_ll + n_params * np.log(len(train))),
+            heldout_log_likelihood=None,
+            model=model
+        )
+        if len(test):
+            # Per observation, so scores are comparable across holdout sizes
+            result["heldout_log_likelihood"] = float(model.score(test, lengths=test_lengths) / len(test))
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def refit_from(model, features, lengths=None, n_iter: int = 100):
+    """
+    Continue EM on all data starting from a fitted model's parameters.
+
+    EM never lowers the likelihood, so the refit scores at least as well on the
+    full data as the selected candidate did.
+    """
+    refit = copy.deepcopy(model)
+    refit.init_params = ""
+    refit.n_iter = n_iter
+    refit.fit(features, lengths=lengths)
+    return refit
+
+
+def select_hmm_model(
+    features,
+    lengths=None,
+    state_grid=(2, 3, 4),
+    covariance_types=("full", "diag"),
+    restarts: int = 8,
+    criterion: str = "heldout",
+    holdout: float = 0.2,
+    n_iter: int = 100,
+    max_workers: int = None,
+    refit: bool = True
+):
+    """
+    Fit every (state count, covariance type, random restart) candidate in a
+    process pool and pick the best.
+
+    Args:
+        criterion: 'heldout' (highest per-observation log-likelihood on the
+                   held-out tail of each sequence) or 'bic' (lowest BIC on the
+                   training part).
+        max_workers: Pool size (defaults to every core; 1 fits in-process).
+        refit: Continue EM from the winning fit on all data (train and holdout) before returning.
+
+    Returns:
+        (model, report) where report lists every candidate's scores.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if criterion not in ("heldout", "bic"):
+        raise ValueError("criterion must be 'heldout' or 'bic'")
+    features = np.asarray(features, dtype=np.float64)
+    if criterion == "bic":
+        holdout = 0.0
+    train, train_lengths, test, test_lengths = split_holdout(features, lengths, holdout)
+
+    # Tasks carry only the configuration; the data goes to each worker once through the initializer
+    tasks = [
+        {"n_states": n_states, "covariance_type": covariance_type, "random_state": seed, "n_iter": n_iter}
+        for n_states in state_grid
+        for covariance_type in covariance_types
+        for seed in range(restarts)
+    ]
+    data = (train, train_lengths, test, test_lengths)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        _init_worker(*data)
+        try:
+            candidates = [_fit_candidate(task) for task in tasks]
+        finally:
+            _worker_data.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=data) as pool:
+            candidates = list(pool.map(_fit_candidate, tasks, chunksize=max(1, len(tasks) // (4 * max_workers))))
+
+    fitted = [c for c in candidates if "error" not in c and (criterion == "bic" or c["heldout_log_likelihood"] is not None)]
+    if not fitted:
+        raise RuntimeError("No HMM candidate could be fitted")
+    if criterion == "bic":
+        best = min(fitted, key=lambda c: c["bic"])
+    else:
+        best = max(fitted, key=lambda c: c["heldout_log_likelihood"])
+
+    model = best["model"]
+    refit_report = None
+    if refit:
+        start_ll = float(model.score(features, lengths=lengths))
+        model = refit_from(model, features, lengths, n_iter=n_iter)
+        refit_report = {
+            "start_log_likelihood": start_ll,
+            "log_likelihood": float(model.score(features, lengths=lengths)),
+            "iterations": int(model.monitor_.iter),
+        }
+
+    report = {
+        "criterion": criterion,
+        "holdout": holdout,
+        "n_observations": int(len(features)),
+        "n_sequences": len(lengths) if lengths is not None else 1,
+        "workers": max_workers,
+        "selected": {key: best[key] for key in ("n_states", "covariance_type", "random_state")},
+        "refit": refit_report,
+        "candidates": [{key: value for key, value in c.items() if key != "model"} for c in candidates],
+    }
+    return model, report
+
+
+def map_states_to_regimes(model, features, lengths=None):
     """
     Map HMM states to regime labels based on volatility characteristics.
     """
-    states = model.predict(features)
+    states = model.predict(features, lengths=lengths)
     
-    # Calculate average volatility for each state
+    # Calculate average volatility for each state (unvisited states rank last)
     state_volatilities = {}
     for state in range(model.n_components):
         mask = states == state
-        state_volatilities[state] = np.mean(features[mask, 1])  # volatility is feature index 1
+        state_volatilities[state] = np.mean(features[mask, 1]) if mask.any() else np.inf  # volatility is feature index 1
     
     # Sort states by volatility
     sorted_states = sorted(state_volatilities.keys(), key=lambda x: state_volatilities[x])
     
-    # Map to regimes
-    regime_map = {
-        sorted_states[0]: "bull",      # Lowest volatility
-        sorted_states[1]: "sideways",  # Medium volatility
-        sorted_states[2]: "bear"       # Highest volatility
-    }
+    # Map to regimes: lowest volatility is bull, highest is bear, anything between is sideways
+    regime_map = {state: "sideways" for state in sorted_states}
+    regime_map[sorted_states[0]] = "bull"
+    regime_map[sorted_states[-1]] = "bear"
     
     return regime_map
 
 
-def save_model(model, regime_map, model_path: str):
+def save_model(model, regime_map, model_path: str, version: str = None, **metadata):
     """
-    Save trained model and regime mapping.
+    Save trained parameters and regime mapping as a .npy artifact.
+    Running API workers pick the new version up on their next reload check.
     """
-    os.makedirs(os.path.dirname(model_path), exist_ok=True)
-    
-    model_data = {
-        "model": model,
-        "regime_map": regime_map,
-        "trained_at": datetime.now().isoformat(),
-        "version": "1.0"
-    }
-    
-    with open(model_path, "wb") as f:
-        pickle.dump(model_data, f)
+    trained_at = datetime.now()
+    save_hmm_artifact(
+        model_path,
+        model.startprob_, model.transmat_, model.means_, model.covars_,
+        regime_map,
+        version=version or trained_at.strftime("%Y%m%d.%H%M%S"),
+        trained_at=trained_at.isoformat(),
+        features=list(FEATURE_NAMES),
+        covariance_type=model.covariance_type,
+        **metadata
+    )
     
     print(f"Model saved to {model_path}")
 
 
-def train_and_save():
+def save_report(report: dict, model_path: str) -> str:
+    """
+    Write the candidate report next to the model artifact.
+    """
+    os.makedirs(model_path, exist_ok=True)
+    report_path = os.path.join(model_path, "training_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report_path
+
+
+def train_and_save(
+    source: str = "db",
+    tickers=None,
+    path: str = None,
+    start: date = None,
+    end: date = None,
+    state_grid=(2, 3, 4),
+    covariance_types=("full", "diag"),
+    restarts: int = 8,
+    criterion: str = "heldout",
+    max_workers: int = None,
+    model_path: str = None
+):
     """
     Main training function.
+
+    The artifact goes to model_path, defaulting to the path the model registry
+    serves (settings.REGIME_MODEL_PATH, else app/models/regime_hmm).
+
+    Raises:
+        RuntimeError: No HMM candidate could be fitted (e.g. hmmlearn is missing).
     """
-    print("Fetching training data (SPY, 10 years)...")
-    hist = fetch_training_data("SPY", years=10)
-    print(f"Fetched {len(hist)} data points")
-    
-    print("Calculating features...")
-    features = calculate_features(hist)
-    print(f"Feature shape: {features.shape}")
-    
-    print("Training HMM model...")
-    model = train_hmm_model(features, n_states=3)
+    from app.core.config import settings
+    from app.ml_layer.regime import DEFAULT_MODEL_PATH
+    model_path = model_path or settings.REGIME_MODEL_PATH or DEFAULT_MODEL_PATH
+
+    print(f"Loading training data (source: {source}, tickers: {', '.join(tickers) if tickers else 'all'})...")
+    features, lengths, trained_tickers = load_training_sequences(
+        iter_training_series(source, tickers=tickers, path=path, start=start, end=end)
+    )
+    if not lengths:
+        print("No usable price history found - ingest data first or use --source yfinance")
+        return
+    print(f"Feature shape: {features.shape} across {len(lengths)} tickers")
     
+    n_candidates = len(state_grid) * len(covariance_types) * restarts
+    print(f"Training {n_candidates} HMM candidates (selection: {criterion})...")
+    try:
+        model, report = select_hmm_model(
+            features, lengths, state_grid=state_grid, covariance_types=covariance_types,
+            restarts=restarts, criterion=criterion, max_workers=max_workers
+        )
+    except ImportError as e:
+        raise RuntimeError(f"HMM training unavailable: {e}") from e
     if model is None:
-        print("Training failed - using rule-based fallback")
-        return
+        raise RuntimeError("HMM selection returned no model - is hmmlearn installed?")
+    print(f"Selected: {report['selected']}")
     
     print("Mapping states to regimes...")
-    regime_map = map_states_to_regimes(model, features)
+    regime_map = map_states_to_regimes(model, features, lengths)
     print(f"Regime mapping: {regime_map}")
     
-    # Save model
-    model_path = os.path.join(os.path.dirname(__file__), "..", "models", "regime_hmm.pkl")
-    save_model(model, regime_map, model_path)
+    # Save model and candidate report
+    report["data"] = {
+        "source": source,
+        "path": path,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "tickers": trained_tickers,
+    }
+    save_model(
+        model, regime_map, model_path, selection=report["selected"], criterion=criterion,
+        source=source, n_tickers=len(trained_tickers), n_observations=int(len(features))
+    )
+    print(f"Report saved to {save_report(report, model_path)}")
     
     # Evaluate accuracy
-    states = model.predict(features)
+    states = model.predict(features, lengths=lengths)
     print(f"\nModel Statistics:")
     print(f"  - Total samples: {len(states)}")
     for state, regime in regime_map.items():
         count = np.sum(states == state)
         pct = count / len(states) * 100
-        print(f"  - {regime}: {count} samples ({pct:.1f}%)")
+        print(f"  - {regime} (state {state}): {count} samples ({pct:.1f}%)")
     
     print("\nTraining complete!")
 
 
 if __name__ == "__main__":
-    train_and_save()
+    parser = argparse.ArgumentParser(description="Train the regime HMM with restarts and model selection.")
+    parser.add_argument("--source", choices=["db", "columnar", "file", "yfinance"], default="db",
+                        help="ohlcv_data table, columnar store, a local Parquet/CSV file, or Yahoo Finance")
+    parser.add_argument("--path", help="Price file for --source file (columns: ticker, date, open, high, low, close, volume) "
+                                       "or store root for --source columnar")
+    parser.add_argument("--tickers", nargs="+", help="Ticker universe (default: everything in the source; SPY for yfinance)")
+    parser.add_argument("--start", type=date.fromisoformat, help="First bar date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last bar date (YYYY-MM-DD)")
+    parser.add_argument("--states", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--covariance-types", nargs="+", default=["full", "diag"],
+                        choices=["full", "diag", "spherical", "tied"])
+    parser.add_argument("--restarts", type=int, default=8)
+    parser.add_argument("--criterion", choices=["heldout", "bic"], default="heldout")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: all cores)")
+    parser.add_argument("--model-path", help="Artifact directory (default: REGIME_MODEL_PATH, else app/models/regime_hmm)")
+    args = parser.parse_args()
+
+    try:
+        train_and_save(
+            source=args.source, tickers=args.tickers, path=args.path, start=args.start, end=args.end,
+            state_grid=tuple(args.states),
+            covariance_types=tuple(args.covariance_types), restarts=args.restarts,
+            criterion=args.criterion, max_workers=args.workers, model_path=args.model_path
+        )
+    except RuntimeError as e:
+        raise SystemExit(f"Training failed ({e}) - the API keeps serving the current model or the rule-based fallback")
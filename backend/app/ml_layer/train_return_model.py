@@ -0,0 +1,87 @@
+"""
+Return Model Training Script.
+Fits the ridge return model on rows of the feature store, scoring it on a
+held-out tail of dates first, and writes it as an artifact that API workers
+pick up on their next reload check.
+
+Usage: python -m app.ml_layer.train_return_model --horizon 21 --alpha 1.0
+"""
+import argparse
+from datetime import date
+from typing import Optional, Sequence
+import numpy as np
+from app.ml_layer.forecasting import ReturnForecastModel
+
+
+def evaluate(model: ReturnForecastModel, X: np.ndarray, y: np.ndarray) -> dict:
+    """
+    Out-of-sample R^2 and information coefficient (correlation of forecast and outcome).
+    """
+    if len(y) < 2:
+        return {"rows": int(len(y)), "r2": None, "ic": None}
+    predicted = model.predict(X)
+    residual = float(np.sum((y - predicted) ** 2))
+    total = float(np.sum((y - y.mean()) ** 2))
+    ic = float(np.corrcoef(predicted, y)[0, 1]) if np.std(predicted) > 0 else 0.0
+    return {"rows": int(len(y)), "r2": 1 - residual / total if total > 0 else None, "ic": ic}
+
+
+def train_return_model(
+    store,
+    tickers: Optional[Sequence[str]] = None,
+    horizon: int = 21,
+    alpha: float = 1.0,
+    holdout: float = 0.2,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    """
+    Fit on every row with a known forward return.
+
+    The last `holdout` fraction of dates is scored by a model fitted on the
+    earlier dates, leaving a gap of `horizon` dates so no training target
+    overlaps the held-out period. The returned model is refitted on all rows.
+
+    Returns:
+        (model, report)
+    """
+    X, y, dates = store.training_set(tickers, horizon=horizon, start=start, end=end)
+    if len(y) < 2:
+        raise ValueError("No feature rows with known forward returns - materialize features first")
+
+    report = {"horizon": horizon, "alpha": alpha, "rows": int(len(y)), "holdout": None}
+    unique_dates = np.unique(dates)
+    cut = int(len(unique_dates) * (1 - holdout))
+    if holdout > 0 and horizon < cut < len(unique_dates):
+        train = dates < unique_dates[cut - horizon]
+        test = dates >= unique_dates[cut]
+        if train.sum() >= 2:
+            heldout_model = ReturnForecastModel.fit(X[train], y[train], horizon, alpha)
+            report["holdout"] = dict(evaluate(heldout_model, X[test], y[test]), start=str(unique_dates[cut]))
+
+    model = ReturnForecastModel.fit(X, y, horizon, alpha)
+    report["in_sample"] = evaluate(model, X, y)
+    return model, report
+
+
+if __name__ == "__main__":
+    from app.core.config import settings
+    from app.ml_layer.feature_store import get_feature_store
+    from app.ml_layer.registry import DEFAULT_RETURN_MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Train the ridge return model on the feature store.")
+    parser.add_argument("--tickers", nargs="+", help="Ticker universe (default: every ticker in the store)")
+    parser.add_argument("--horizon", type=int, default=21, help="Forward return horizon in bars")
+    parser.add_argument("--alpha", type=float, default=1.0, help="Ridge penalty on standardized features")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of dates held out for scoring")
+    parser.add_argument("--start", type=date.fromisoformat)
+    parser.add_argument("--end", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    model, report = train_return_model(
+        get_feature_store(), tickers=args.tickers, horizon=args.horizon, alpha=args.alpha,
+        holdout=args.holdout, start=args.start, end=args.end
+    )
+    path = settings.RETURN_MODEL_PATH or DEFAULT_RETURN_MODEL_PATH
+    print(f"Model saved to {model.save(path, report=report)}")
+    print(report)
@@ -0,0 +1,295 @@
+"""
+GARCH Volatility Models.
+GARCH(1,1) and GJR-GARCH(1,1) on daily log returns, vectorized across tickers:
+
+    sigma2[t+1] = omega + (alpha + gamma * 1[e_t < 0]) * e_t^2 + beta * sigma2[t],   e_t = r_t - mean
+
+omega comes from variance targeting (omega = var(e) * (1 - persistence), with
+persistence = alpha + gamma / 2 + beta), which leaves (alpha, gamma, beta) to
+estimate. The Gaussian likelihood is maximized for a whole (tickers x time)
+matrix at once: a coarse grid picks a start per ticker and a pattern search
+with shrinking steps refines it, each round evaluating every candidate of
+every ticker in a single recursion over time. Rows are left-padded with NaN
+for shorter histories (as align_closes does); missing returns leave the
+variance unchanged.
+
+fit_universe sorts a large universe by history length and fits chunks of it
+in a process pool.
+
+The refit CLI writes states to the shared cache, so it needs REDIS_URL:
+
+Usage: python -m app.ml_layer.volatility --source db --workers 8
+"""
+import argparse
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+MODELS = ("garch", "gjr")
+PARAMETER_NAMES = ("omega", "alpha", "gamma", "beta")
+MAX_PERSISTENCE = 0.9995
+
+# Coarse starting grid (combinations at or above MAX_PERSISTENCE are dropped)
+_ALPHA_GRID = (0.02, 0.05, 0.1, 0.15)
+_GAMMA_GRID = (0.0, 0.05, 0.1, 0.2)
+_BETA_GRID = (0.6, 0.75, 0.85, 0.9, 0.94, 0.97)
+_INITIAL_STEP = 0.02
+_MIN_STEP = 1e-4
+
+
+def log_returns(closes: np.ndarray) -> np.ndarray:
+    """
+    Close-to-close log returns along the last axis (NaN where either close is missing).
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(np.log(closes), axis=-1)
+
+
+def _moments(returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-row mean and (population) variance of the valid returns, and their count.
+    """
+    valid = ~np.isnan(returns)
+    counts = valid.sum(axis=-1)
+    mean = np.where(valid, returns, 0.0).sum(axis=-1) / np.maximum(counts, 1)
+    centered = np.where(valid, returns - mean[:, np.newaxis], 0.0)
+    variance = (centered * centered).sum(axis=-1) / np.maximum(counts, 1)
+    return mean, variance, counts
+
+
+def _recursion(
+    residuals: np.ndarray,
+    omega: np.ndarray,
+    alpha: np.ndarray,
+    gamma: np.ndarray,
+    beta: np.ndarray,
+    variance: np.ndarray,
+    likelihood: bool = True
+) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """
+    Variance recursion for K parameter candidates per row.
+
+    Args:
+        residuals: (B x T) demeaned returns, NaN where missing.
+        omega, alpha, gamma, beta, variance: (B x K) parameters and starting variance.
+
+    Returns:
+        (log-likelihood without the 2*pi constant or None, next-day variance), each (B x K).
+    """
+    variance = np.array(variance, dtype=np.float64)
+    total = np.zeros_like(variance) if likelihood else None
+    for t in range(residuals.shape[1]):
+        e = residuals[:, t:t + 1]
+        valid = ~np.isnan(e)
+        if not valid.any():
+            continue
+        e = np.where(valid, e, 0.0)
+        squared = e * e
+        if likelihood:
+            total -= np.where(valid, 0.5 * (np.log(variance) + squared / variance), 0.0)
+        updated = omega + (alpha + gamma * (e < 0)) * squared + beta * variance
+        variance = np.where(valid, updated, variance)
+    return total, variance
+
+
+def _score(residuals: np.ndarray, sample_variance: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """
+    Log-likelihood of (B x K x 3) (alpha, gamma, beta) candidates; infeasible ones score -inf.
+    """
+    alpha, gamma, beta = candidates[..., 0], candidates[..., 1], candidates[..., 2]
+    persistence = alpha + gamma / 2 + beta
+    feasible = (alpha >= 0) & (gamma >= 0) & (beta >= 0) & (persistence < MAX_PERSISTENCE)
+    target = sample_variance[:, np.newaxis]
+    omega = target * (1 - np.where(feasible, persistence, 0.0))
+    scores, _ = _recursion(
+        residuals, omega, alpha, gamma, beta, np.broadcast_to(target, alpha.shape)
+    )
+    return np.where(feasible, scores, -np.inf)
+
+
+def fit_garch(returns: np.ndarray, model: str = "gjr", max_rounds: int = 40) -> dict:
+    """
+    Maximum-likelihood GARCH(1,1) / GJR-GARCH(1,1) for every row of a return matrix.
+
+    Args:
+        returns: (B x T) or 1-D daily log returns, NaN where missing.
+        model: One of MODELS.
+        max_rounds: Pattern-search rounds after the grid.
+
+    Returns:
+        dict with 'model', 'params' (B x 4, PARAMETER_NAMES order), 'mean',
+        'variance' (next-day variance after the last return), 'log_likelihood'
+        and 'observations'. Rows with fewer than 2 returns get NaN.
+    """
+    if model not in MODELS:
+        raise ValueError(f"model must be one of {', '.join(MODELS)}")
+    returns = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+    mean, sample_variance, counts = _moments(returns)
+    usable = (counts >= 2) & (sample_variance > 0)
+    sample_variance = np.where(usable, sample_variance, 1.0)
+    residuals = np.where(usable[:, np.newaxis], returns - mean[:, np.newaxis], np.nan)
+    n = len(returns)
+
+    gammas = _GAMMA_GRID if model == "gjr" else (0.0,)
+    grid = np.array([
+        (a, g, b) for a in _ALPHA_GRID for g in gammas for b in _BETA_GRID
+        if a + g / 2 + b < MAX_PERSISTENCE
+    ])
+    scores = _score(residuals, sample_variance, np.broadcast_to(grid, (n,) + grid.shape))
+    best = grid[np.argmax(scores, axis=1)].copy()
+    best_score = scores.max(axis=1)
+
+    # Pattern search: try +/- step on each free coordinate, halve the step when nothing improves
+    axes = [0, 1, 2] if model == "gjr" else [0, 2]
+    moves = np.zeros((2 * len(axes), 3))
+    for i, axis in enumerate(axes):
+        moves[2 * i, axis], moves[2 * i + 1, axis] = 1.0, -1.0
+    step = np.full(n, _INITIAL_STEP)
+    for _ in range(max_rounds):
+        active = step >= _MIN_STEP
+        if not active.any():
+            break
+        index = np.flatnonzero(active)
+        candidates = best[index, np.newaxis, :] + moves[np.newaxis] * step[index, np.newaxis, np.newaxis]
+        scores = _score(residuals[index], sample_variance[index], candidates)
+        pick = np.argmax(scores, axis=1)
+        picked = scores[np.arange(len(index)), pick]
+        improved = picked > best_score[index] + 1e-9
+        best[index[improved]] = candidates[np.flatnonzero(improved), pick[improved]]
+        best_score[index[improved]] = picked[improved]
+        step[index[~improved]] /= 2
+
+    alpha, gamma, beta = best[:, 0], best[:, 1], best[:, 2]
+    omega = sample_variance * (1 - (alpha + gamma / 2 + beta))
+    _, variance = _recursion(
+        residuals, omega[:, np.newaxis], alpha[:, np.newaxis], gamma[:, np.newaxis], beta[:, np.newaxis],
+        sample_variance[:, np.newaxis], likelihood=False
+    )
+    params = np.column_stack([omega, alpha, gamma, beta])
+    params[~usable] = np.nan
+    log_likelihood = best_score - 0.5 * np.log(2 * np.pi) * counts
+    return {
+        "model": model,
+        "params": params,
+        "mean": np.where(usable, mean, np.nan),
+        "variance": np.where(usable, variance[:, 0], np.nan),
+        "log_likelihood": np.where(usable, log_likelihood, np.nan),
+        "observations": counts,
+    }
+
+
+def update_variance(params: np.ndarray, mean: np.ndarray, variance: np.ndarray, returns: np.ndarray) -> np.ndarray:
+    """
+    Advance next-day variances with newly observed returns, keeping the fitted parameters.
+
+    Args:
+        params: (B x 4) parameters in PARAMETER_NAMES order.
+        mean, variance: (B,) fitted mean and the variance forecast for the first new return.
+        returns: (B x T) new log returns, left-padded with NaN for rows with fewer.
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+    returns = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+    residuals = returns - np.asarray(mean, dtype=np.float64)[:, np.newaxis]
+    _, updated = _recursion(
+        residuals, *(params[:, i:i + 1] for i in range(4)),
+        np.asarray(variance, dtype=np.float64)[:, np.newaxis], likelihood=False
+    )
+    return updated[:, 0]
+
+
+def forecast_variance(params: np.ndarray, variance: np.ndarray, horizon: int) -> np.ndarray:
+    """
+    Multi-step variance forecasts: sigma2[t+h] = long_run + persistence^(h-1) * (sigma2[t+1] - long_run).
+
+    Args:
+        params: (B x 4) parameters in PARAMETER_NAMES order.
+        variance: (B,) next-day variance.
+
+    Returns:
+        (B x horizon) daily variances for days 1..horizon ahead.
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+    omega, alpha, gamma, beta = params.T
+    persistence = alpha + gamma / 2 + beta
+    long_run = omega / (1 - persistence)
+    decay = persistence[:, np.newaxis] ** np.arange(horizon)
+    return long_run[:, np.newaxis] + decay * (np.asarray(variance, dtype=np.float64) - long_run)[:, np.newaxis]
+
+
+def _fit_chunk(task: Tuple[List[str], List[np.ndarray], str]) -> Dict[str, dict]:
+    tickers, returns_list, model = task
+    width = max(len(r) for r in returns_list)
+    matrix = np.full((len(returns_list), width), np.nan)
+    for row, returns in enumerate(returns_list):
+        matrix[row, width - len(returns):] = returns
+    fit = fit_garch(matrix, model=model)
+    return {
+        ticker: {
+            "params": fit["params"][i].tolist(),
+            "mean": float(fit["mean"][i]),
+            "variance": float(fit["variance"][i]),
+            "log_likelihood": float(fit["log_likelihood"][i]),
+            "observations": int(fit["observations"][i]),
+        }
+        for i, ticker in enumerate(tickers)
+    }
+
+
+def fit_universe(
+    returns_by_ticker: Dict[str, np.ndarray],
+    model: str = "gjr",
+    max_workers: Optional[int] = None,
+    chunk_size: int = 100
+) -> Dict[str, dict]:
+    """
+    Fit every ticker's return history, chunk by chunk, in a process pool.
+
+    Tickers are sorted by history length first so each chunk pads little.
+
+    Args:
+        max_workers: Pool size (defaults to every core; 1 fits in-process).
+
+    Returns:
+        ticker -> {'params', 'mean', 'variance', 'log_likelihood', 'observations'}
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if model not in MODELS:
+        raise ValueError(f"model must be one of {', '.join(MODELS)}")
+    ordered = sorted(returns_by_ticker, key=lambda t: len(returns_by_ticker[t]))
+    tasks = [
+        (chunk, [np.asarray(returns_by_ticker[t], dtype=np.float64) for t in chunk], model)
+        for chunk in (ordered[i:i + chunk_size] for i in range(0, len(ordered), chunk_size))
+    ]
+    max_workers = max_workers or os.cpu_count() or 1
+    results: Dict[str, dict] = {}
+    if max_workers == 1 or len(tasks) == 1:
+        for task in tasks:
+            results.update(_fit_chunk(task))
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks))) as pool:
+            for chunk_result in pool.map(_fit_chunk, tasks):
+                results.update(chunk_result)
+    return results
+
+
+if __name__ == "__main__":
+    from app.ml_layer.forecasting import get_forecasting_model
+    from app.ml_layer.train_regime_model import iter_training_series
+
+    parser = argparse.ArgumentParser(description="Refit cached GARCH parameters for a ticker universe.")
+    parser.add_argument("--source", choices=["db", "columnar", "file", "yfinance"], default="db")
+    parser.add_argument("--path", help="Price file for --source file or store root for --source columnar")
+    parser.add_argument("--tickers", nargs="+", help="Ticker universe (default: everything in the source)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: all cores)")
+    args = parser.parse_args()
+
+    model = get_forecasting_model()
+    if model.cache.client is None:
+        # States would only reach this process's cache and be gone when it exits
+        parser.error("no Redis client (is REDIS_URL set?): the refitted states would not reach the API or the workers")
+    series_list = list(iter_training_series(args.source, tickers=args.tickers, path=args.path))
+    # The offline refit uses every core by default; GARCH_FIT_WORKERS sizes fits on the request path
+    states = model.refit(series_list, max_workers=args.workers or os.cpu_count())
+    print(f"Fitted {len(states)} of {len(series_list)} tickers")
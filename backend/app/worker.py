@@ -0,0 +1,77 @@
+"""
+Celery worker for background ingestion.
+
+Queues:
+    ingestion.control     watchlist scheduling and GARCH refits (beat sends here)
+    ingestion.<shard>     jobs for tickers with shard_for(ticker) == shard
+
+Run one worker per shard (or one worker for all of them) plus beat:
+
+    celery -A app.worker worker -Q ingestion.control,ingestion.0,ingestion.1,ingestion.2,ingestion.3
+    celery -A app.worker beat
+
+The broker is CELERY_BROKER_URL, else REDIS_URL, else the in-memory transport
+(single process only). CELERY_TASK_ALWAYS_EAGER=true runs jobs inline instead.
+"""
+from celery import Celery
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.data import ingestion
+
+CONTROL_QUEUE = f"{settings.INGESTION_QUEUE_PREFIX}.control"
+
+celery_app = Celery("finance_guardian", broker=settings.CELERY_BROKER_URL or settings.REDIS_URL or "memory://")
+celery_app.conf.update(
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    # Job state lives in ingestion_jobs, not in a result backend
+    task_ignore_result=True,
+    # A job lost with its worker is redelivered; run_job skips jobs that already finished
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_default_queue=CONTROL_QUEUE,
+    timezone="UTC",
+    beat_schedule={
+        "ingest-watchlist": {
+            "task": "ingestion.schedule_watchlist",
+            "schedule": settings.INGESTION_INTERVAL,
+            "options": {"queue": CONTROL_QUEUE},
+        },
+        "refit-volatility": {
+            "task": "volatility.refit_watchlist",
+            "schedule": settings.GARCH_REFIT_DAYS * 24 * 3600.0,
+            "options": {"queue": CONTROL_QUEUE},
+        },
+    },
+)
+
+# Swapped out by tests that run tasks eagerly against another database
+session_factory = SessionLocal
+
+
+@celery_app.task(name="ingestion.run_job")
+def ingest_ticker(job_id: int):
+    db = session_factory()
+    try:
+        job = ingestion.run_job(db, job_id)
+        return job.status if job is not None else None
+    finally:
+        db.close()
+
+
+@celery_app.task(name="ingestion.schedule_watchlist")
+def schedule_watchlist():
+    db = session_factory()
+    try:
+        return ingestion.schedule_watchlist(db)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="volatility.refit_watchlist")
+def refit_volatility():
+    db = session_factory()
+    try:
+        return ingestion.refit_volatility(db)
+    finally:
+        db.close()
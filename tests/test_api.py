@@ -0,0 +1,305 @@
+import sys
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+# Add backend to path so we can import app modules
+sys.path.append(os.path.join(os.getcwd(), 'backend'))
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app import worker
+from app.core.database import Base, get_db
+from app.data.fetcher import MarketDataFetcher
+from app.data.repository import AsyncPriceRepository, PriceRepository
+from app.data.series import PriceSeries
+from app.core.config import settings
+from app.financial_intelligence.risk import RiskEngine
+from app.ml_layer import feature_store
+from app.ml_layer.feature_store import FEATURE_NAMES, FeatureStore
+from app.ml_layer.forecasting import ReturnForecastModel
+from app.ml_layer.registry import DEFAULT_RETURN_MODEL_PATH, RETURN_MODEL, _load_return_model, get_model_registry
+
+client = TestClient(app)
+
+
+def _series(ticker, n, seed, start=date(2024, 1, 1)):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.015, n))
+    dates = np.datetime64(start) + np.arange(n)
+    return PriceSeries(ticker, dates, close, close, close, close, np.ones(n))
+
+
+def test_analyze_batch():
+    print("Testing batch analysis endpoint...")
+    universe = {"AAA": _series("AAA", 63, 1), "BBB": _series("BBB", 40, 2), "CCC": _series("CCC", 3, 3)}
+    original = MarketDataFetcher.fetch_ohlcv_many
+
+    def fake_fetch_many(tickers, period="1y", max_workers=None, batched=None):
+        found = {t: universe[t] for t in tickers if t in universe}
+        return found, {t: "no data" for t in tickers if t not in universe}
+
+    MarketDataFetcher.fetch_ohlcv_many = staticmethod(fake_fetch_many)
+    try:
+        response = client.post("/api/v1/analysis/analyze/batch", json={"tickers": ["aaa", "BBB", "CCC", "ZZZ"]})
+    finally:
+        MarketDataFetcher.fetch_ohlcv_many = original
+
+    assert response.status_code == 200
+    lines = {row["ticker"]: row for row in map(json.loads, response.text.strip().splitlines())}
+    print(f"Lines: {sorted(lines)}")
+    assert "error" in lines["CCC"] and "error" in lines["ZZZ"]
+
+    # Vectorized metrics agree with the single-series engines
+    for ticker in ("AAA", "BBB"):
+        series = universe[ticker]
+        assert lines[ticker]["metrics"]["max_drawdown"] == round(RiskEngine.calculate_max_drawdown(series) * 100, 2)
+        assert lines[ticker]["metrics"]["var_95"] == round(RiskEngine.calculate_var(series.returns(), 0.95) * 100, 2)
+    assert lines["BBB"]["regime"] == "unknown"
+
+
+def _sqlite_db():
+    # In-memory database shared by the request session and worker-side sessions
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    def override_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    return Session, override_db
+
+
+@contextmanager
+def _fake_upstream(fetch_ohlcv):
+    # Serve price history from fetch_ohlcv into a fresh in-memory store
+    _, override_db = _sqlite_db()
+    original = MarketDataFetcher.fetch_ohlcv
+    MarketDataFetcher.fetch_ohlcv = staticmethod(fetch_ohlcv)
+    app.dependency_overrides[get_db] = override_db
+    try:
+        yield client
+    finally:
+        MarketDataFetcher.fetch_ohlcv = original
+        app.dependency_overrides.pop(get_db, None)
+
+
+def test_ingestion_eager_mode():
+    print("Testing ingestion endpoints with eager Celery tasks...")
+    Session, override_db = _sqlite_db()
+    originals = (MarketDataFetcher.fetch_ohlcv, MarketDataFetcher.fetch_fundamentals, worker.session_factory)
+    MarketDataFetcher.fetch_ohlcv = staticmethod(lambda ticker, period="1y", start=None: _series(ticker, 63, 1))
+    MarketDataFetcher.fetch_fundamentals = staticmethod(lambda ticker: None)
+    worker.session_factory = Session
+    worker.celery_app.conf.task_always_eager = True
+    app.dependency_overrides[get_db] = override_db
+    try:
+        response = client.post("/api/v1/ingestion/watchlist", json={"tickers": ["aaa", "bbb"]})
+        assert response.status_code == 200
+        jobs = response.json()["jobs"]
+        assert [j["status"] for j in jobs] == ["succeeded", "succeeded"]
+        assert jobs[0]["inserted"] == 63 and jobs[0]["last_bar_date"] == "2024-03-03"
+
+        # Manual ingest returns the job; nothing new upstream, so nothing inserted
+        job = client.post("/api/v1/regime/ingest/aaa").json()
+        assert job["status"] == "succeeded" and job["inserted"] == 0 and not job["deduplicated"]
+        assert client.get(f"/api/v1/ingestion/jobs/{job['id']}").json()["ticker"] == "AAA"
+        assert len(client.get("/api/v1/ingestion/jobs", params={"ticker": "AAA"}).json()) == 2
+        assert client.post("/api/v1/ingestion/schedule").json() == {"tickers": 2, "submitted": 2, "in_flight": 0}
+        assert client.get("/api/v1/ingestion/watchlist").json()[1]["last_bar_date"] == "2024-03-03"
+        assert client.delete("/api/v1/ingestion/watchlist/BBB").status_code == 200
+        assert client.get("/api/v1/ingestion/jobs/999").status_code == 404
+    finally:
+        MarketDataFetcher.fetch_ohlcv, MarketDataFetcher.fetch_fundamentals, worker.session_factory = originals
+        worker.celery_app.conf.task_always_eager = False
+        app.dependency_overrides.pop(get_db, None)
+
+
+def test_valuation_scenarios():
+    print("Testing DCF scenario endpoint...")
+    response = client.post("/api/v1/analysis/valuation/scenarios", json={
+        "cash_flows": [100.0] * 5,
+        "discount_rate": {"mean": 0.09, "std": 0.01, "low": 0.04},
+        "terminal_growth_rate": [0.01, 0.02, 0.03],
+        "n_scenarios": 5000,
+        "seed": 1,
+        "shares_outstanding": 10
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["mode"] == "sampled" and body["enterprise_value"]["valid"] == 5000
+    assert len(body["sensitivity"]["discount_rate_x_terminal_growth"]["columns"]) == 3
+
+    response = client.post("/api/v1/analysis/valuation/scenarios", json={"cash_flows": [100.0], "n_scenarios": 10 ** 7,
+                                                                         "discount_rate": {"mean": 0.09, "std": 0.01}})
+    assert response.status_code == 400
+
+
+def test_risk_simulation():
+    print("Testing risk simulation endpoint...")
+    with _fake_upstream(lambda ticker, period="1y", start=None: _series(ticker, 300, 4)) as api:
+        response = api.post("/api/v1/analysis/risk/simulate", json={
+            "tickers": ["aaa"], "method": "filtered", "horizons": [1, 5], "n_paths": 20000, "seed": 3
+        })
+        bad = api.post("/api/v1/analysis/risk/simulate", json={"tickers": ["aaa"], "method": "garch"})
+
+    assert response.status_code == 200 and bad.status_code == 400
+    result = response.json()["AAA"]
+    assert result["paths"] == 20000 and [h["days"] for h in result["horizons"]] == [1, 5]
+    assert result["horizons"][1]["cvar"]["0.99"] > result["horizons"][0]["var"]["0.95"] > 0
+
+
+def test_portfolio_risk():
+    print("Testing portfolio risk endpoint...")
+    with _fake_upstream(lambda ticker, period="1y", start=None: _series(ticker, 200, ord(ticker[0]))) as api:
+        response = api.post("/api/v1/analysis/portfolio/risk", json={
+            "holdings": {"aaa": 6000, "BBB": 3000, "CCC": 1000}, "horizon": 5
+        })
+        empty = api.post("/api/v1/analysis/portfolio/risk", json={"holdings": {}})
+
+    assert response.status_code == 200 and empty.status_code == 400
+    body = response.json()
+    assert body["portfolio_value"] == 10000 and body["observations"] == 199
+    assert [c["ticker"] for c in body["contributions"]] == ["AAA", "BBB", "CCC"]
+    assert abs(sum(c["percent"] for c in body["contributions"]) - 1) < 1e-9
+
+
+def test_optimize_allocation():
+    print("Testing allocation optimizer endpoint...")
+
+    def fake_fetch(ticker, period="1y", start=None):
+        # Recent bars, so the stored history stays inside the lookback period
+        return _series(ticker, 300, sum(map(ord, ticker)), start=date.today() - timedelta(days=299))
+
+    get_history = PriceRepository.get_history
+    with _fake_upstream(fake_fetch) as api:
+        request = {"risk_profile": "moderate", "tickers": ["aaa", "BBB", "CCC"], "benchmark": "IDX"}
+        first = api.post("/api/v1/analysis/allocation/optimize", json=request)
+        # The repeat is served from the cache without loading any prices, the benchmark included
+        PriceRepository.get_history = None
+        try:
+            again = api.post("/api/v1/analysis/allocation/optimize", json=request)
+        finally:
+            PriceRepository.get_history = get_history
+        bad = api.post("/api/v1/analysis/allocation/optimize", json={"tickers": ["AAA", "BBB"], "method": "nope"})
+
+    assert first.status_code == 200 and bad.status_code == 400
+    body = first.json()
+    assert body["method"] == "risk_parity" and list(body["weights"]) == ["AAA", "BBB", "CCC"]
+    assert abs(sum(body["weights"].values()) - 1) < 1e-5 and 0 <= body["regime_credibility"] <= 1
+    assert max(abs(c - 1 / 3) for c in body["risk_contributions"].values()) < 1e-5
+    assert again.status_code == 200 and again.json()["cached"] and not first.json()["cached"]
+    assert again.json()["regime"] == body["regime"]
+
+
+def test_volatility_forecast():
+    print("Testing volatility forecast endpoint...")
+    with _fake_upstream(
+        lambda ticker, period="1y", start=None: _series(ticker, 400 if ticker != "NEW" else 50, ord(ticker[0]), start=date.today() - timedelta(days=399))
+    ) as api:
+        response = api.post("/api/v1/analysis/volatility/forecast", json={"tickers": ["vol", "NEW"], "horizon": 3})
+        bad = api.post("/api/v1/analysis/volatility/forecast", json={"tickers": ["VOL"], "horizon": 0})
+        too_long = api.post("/api/v1/analysis/volatility/forecast", json={"tickers": ["VOL"], "horizon": settings.GARCH_MAX_HORIZON + 1})
+
+    assert response.status_code == 200 and bad.status_code == 400 and too_long.status_code == 400
+    body = response.json()
+    assert "error" in body["NEW"] and len(body["VOL"]["term_structure"]) == 3
+    assert body["VOL"]["model"] == "gjr" and 0 < body["VOL"]["persistence"] < 1
+    # Simulated 1.5% daily moves
+    assert 0.005 < body["VOL"]["daily_volatility"] < 0.03
+
+
+def test_forecast_returns():
+    print("Testing return forecast endpoint...")
+    registry = get_model_registry()
+    original_store = feature_store._feature_store
+    with tempfile.TemporaryDirectory() as root:
+        registry.register(RETURN_MODEL, os.path.join(root, "model"), _load_return_model)
+        feature_store._feature_store = FeatureStore(os.path.join(root, "features"))
+        try:
+            untrained = client.post("/api/v1/analysis/forecast/returns", json={"tickers": ["FCA"]})
+            for i, ticker in enumerate(["FCA", "FCB"]):
+                feature_store._feature_store.update(_series(ticker, 300, i + 1))
+            rng = np.random.default_rng(0)
+            X = rng.normal(size=(500, len(FEATURE_NAMES)))
+            ReturnForecastModel.fit(X, X[:, 2] * 0.01, horizon=21).save(os.path.join(root, "model"))
+            registry.register(RETURN_MODEL, os.path.join(root, "model"), _load_return_model)
+            response = client.post("/api/v1/analysis/forecast/returns", json={"tickers": ["fca", "FCB", "NONE"]})
+            empty = client.post("/api/v1/analysis/forecast/returns", json={"tickers": []})
+        finally:
+            feature_store._feature_store = original_store
+            registry.register(RETURN_MODEL, settings.RETURN_MODEL_PATH or DEFAULT_RETURN_MODEL_PATH, _load_return_model)
+
+    assert untrained.status_code == 503 and empty.status_code == 400
+    assert response.status_code == 200
+    body = response.json()
+    assert body["horizon"] == 21 and body["missing"] == ["NONE"]
+    assert set(body["forecasts"]) == {"FCA", "FCB"} and body["forecasts"]["FCA"]["as_of"] == "2024-10-26"
+
+
+def test_analyze_stock_loads_history_once():
+    print("Testing single-stock analysis history loads...")
+    _, override_db = _sqlite_db()
+    original = AsyncPriceRepository.get_history
+    calls = []
+
+    async def fake_history(self, ticker, period="3mo", today=None):
+        calls.append((ticker, period))
+        return _series(ticker, 63, 11, start=date.today() - timedelta(days=90)), "hit"
+
+    AsyncPriceRepository.get_history = fake_history
+    app.dependency_overrides[get_db] = override_db
+    try:
+        response = client.post("/api/v1/analysis/analyze/stock", params={"ticker": "onehist"})
+    finally:
+        AsyncPriceRepository.get_history = original
+        app.dependency_overrides.pop(get_db, None)
+
+    assert response.status_code == 200 and calls == [("ONEHIST", "3mo")]
+    # No cached GARCH state and no fitting on the request path
+    assert response.json()["volatility_forecast"] is None
+
+
+def test_rebalance_batch():
+    print("Testing batch rebalancing endpoint...")
+    response = client.post("/api/v1/analysis/rebalance/batch", json={
+        "account_ids": ["a1", "a2", "a3"],
+        "profiles": ["moderate", "aggressive", "moderate"],
+        "holdings": [[6000, 3000, 1000], [5000, 4000, 1000], [9000, 500, 500]],
+        "min_trade": 100
+    })
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.strip().splitlines()]
+    assert [line["account_id"] for line in lines] == ["a2", "a3"]
+    assert lines[0]["trades"] == {"equity": 3000.0, "bonds": -3000.0}
+
+    bad = client.post("/api/v1/analysis/rebalance/batch", json={"account_ids": ["a1"], "profiles": [], "holdings": []})
+    assert bad.status_code == 400
+    no_cash = client.post("/api/v1/analysis/rebalance/batch", json={
+        "account_ids": ["a1"], "profiles": ["moderate"], "holdings": [[6000, 4000]],
+        "asset_classes": ["equity", "bonds"], "cash_buffer": 0.1
+    })
+    assert no_cash.status_code == 400
+
+
+if __name__ == "__main__":
+    test_analyze_batch()
+    test_ingestion_eager_mode()
+    test_valuation_scenarios()
+    test_risk_simulation()
+    test_portfolio_risk()
+    test_optimize_allocation()
+    test_volatility_forecast()
+    test_analyze_stock_loads_history_once()
+    test_forecast_returns()
+    test_rebalance_batch()
@@ -0,0 +1,209 @@
+import sys
+import os
+import asyncio
+import threading
+import time
+from datetime import date
+
+# Add backend to path so we can import app modules
+sys.path.append(os.path.join(os.getcwd(), 'backend'))
+
+import numpy as np
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.shared_cache import SharedCache, daily_result_ttl, decode, encode
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_lru():
+    print("Testing TTL/LRU cache...")
+    clock = _Clock()
+    cache = TTLCache("test", ttl=10, maxsize=2, clock=clock)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1      # 'a' becomes most recently used
+    cache.set("c", 3)               # evicts 'b'
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    clock.now = 11
+    assert cache.get("a") is None   # expired
+
+    stats = cache.stats()
+    print(f"Stats: {stats}")
+    assert stats["evictions"] == 1 and stats["expirations"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 2
+
+
+def test_memory_cap():
+    print("\nTesting memory cap...")
+    cache = TTLCache("bytes", ttl=60, maxsize=100, max_bytes=100, sizeof=lambda v: len(v))
+    cache.set("a", "x" * 60)
+    cache.set("b", "x" * 60)        # pushes total over 100 bytes, evicts 'a'
+    assert cache.get("a") is None and cache.get("b") is not None
+    cache.set("huge", "x" * 500)    # never cached
+    assert cache.get("huge") is None
+    assert cache.stats()["bytes"] == 60
+
+
+def test_single_flight():
+    print("\nTesting single-flight loading...")
+    cache = TTLCache("flight", ttl=60)
+    calls = []
+    start = threading.Barrier(200)
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    results = []
+
+    def worker():
+        start.wait()
+        results.append(cache.get_or_load("^GSPC", loader))
+
+    threads = [threading.Thread(target=worker) for _ in range(200)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(f"Upstream calls: {len(calls)}, stats: {cache.stats()}")
+    assert len(calls) == 1
+    assert results == ["value"] * 200
+
+
+def test_single_flight_error_not_cached():
+    cache = TTLCache("errors", ttl=60)
+
+    def failing():
+        raise ValueError("upstream down")
+
+    try:
+        cache.get_or_load("x", failing)
+        assert False, "expected the loader error"
+    except ValueError:
+        pass
+    assert cache.get_or_load("x", lambda: 42) == 42
+
+
+def test_async_single_flight():
+    print("\nTesting async single-flight loading...")
+    cache = TTLCache("async-flight", ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def failing():
+        raise ValueError("upstream down")
+
+    async def main():
+        results = await asyncio.gather(*[cache.aget_or_load("^GSPC", loader) for _ in range(200)])
+        errors = await asyncio.gather(*[cache.aget_or_load("x", failing) for _ in range(3)], return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+    print(f"Upstream calls: {len(calls)}, stats: {cache.stats()}")
+    assert len(calls) == 1 and results == ["value"] * 200
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert cache.get("^GSPC") == "value" and cache.get("x") is None
+
+
+class _FakeRedis:
+    """
+    In-memory stand-in for the redis client calls SharedCache makes.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("redis down")
+
+    def get(self, key):
+        self._check()
+        value, expires = self.data.get(key, (None, 0))
+        return value if expires > self.clock() else None
+
+    def pttl(self, key):
+        self._check()
+        return int((self.data[key][1] - self.clock()) * 1000) if key in self.data else -2
+
+    def set(self, key, value, px=None):
+        self._check()
+        self.data[key] = (value, self.clock() + px / 1000.0)
+
+    def delete(self, key):
+        self._check()
+        self.data.pop(key, None)
+
+
+def test_shared_cache_tier():
+    print("\nTesting shared cache tier...")
+    clock = _Clock()
+    redis = _FakeRedis(clock)
+    workers = [SharedCache("analysis", client=redis, ttl=100, clock=clock,
+                           local=TTLCache(f"w{i}", ttl=100, clock=clock)) for i in range(2)]
+    computed = []
+
+    async def compute():
+        computed.append(1)
+        return {"ticker": "AAA", "var_95": np.float64(0.021), "as_of": "2024-06-04"}
+
+    key = workers[0].key("AAA", "2024-06-04", "1.0")
+    assert key == "fg:v1:analysis:AAA:2024-06-04:1.0"
+    first = asyncio.run(workers[0].aget_or_compute(key, compute, ttl=lambda result: 50))
+    second = asyncio.run(workers[1].aget_or_compute(key, compute))
+    print(f"Worker stats: {workers[1].stats()}")
+    assert len(computed) == 1 and first == second and second["var_95"] == 0.021
+    assert workers[1].stats()["remote_hits"] == 1
+
+    # The value-dependent TTL applies to both tiers
+    clock.now = 51
+    assert workers[1].get(key) is None and redis.get(key) is None
+
+    # A new model version is a different key
+    asyncio.run(workers[0].aget_or_compute(workers[0].key("AAA", "2024-06-04", "2.0"), compute))
+    assert len(computed) == 2
+
+    # Redis outage: fall back to in-process results, retry after the interval
+    redis.down = True
+    value = asyncio.run(workers[0].aget_or_compute(workers[0].key("BBB"), compute))
+    assert value["ticker"] == "AAA" and not workers[0].remote_available
+    assert workers[0].get(workers[0].key("BBB")) == value
+    redis.down = False
+    clock.now += workers[0].retry_interval
+    assert workers[0].remote_available
+
+    payload = {"metrics": {"var_95": 2.1}, "risk_violations": []}
+    assert decode(encode(payload)) == payload
+
+    # Only results ending on the expected session are kept for the full TTL
+    session = date(2024, 6, 4)
+    assert daily_result_ttl("2024-06-04", session) == settings.SHARED_CACHE_TTL
+    assert daily_result_ttl("2024-06-03", session) == settings.MARKET_HISTORY_CACHE_TTL
+    assert daily_result_ttl("2024-06-05", session) == settings.MARKET_HISTORY_CACHE_TTL  # forming intraday bar
+
+
+if __name__ == "__main__":
+    test_ttl_and_lru()
+    test_memory_cap()
+    test_single_flight()
+    test_single_flight_error_not_cached()
+    test_async_single_flight()
+    test_shared_cache_tier()
@@ -0,0 +1,510 @@
+import sys
+import os
+import asyncio
+import tempfile
+from datetime import date, timedelta
+
+# Add backend to path so we can import app modules
+sys.path.append(os.path.join(os.getcwd(), 'backend'))
+
+import httpx
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.data.models import OHLCVData, FundamentalData
+from app.data.fetcher import MarketDataFetcher, MarketDataStore
+from app.data.series import PriceSeries
+from app.data.repository import PriceRepository, SQLPriceStore, get_price_repository, CacheStatus, exchange_holidays, plan_history, merge_history
+from app.data.loader import iter_file_series
+from app.data.columnar import ColumnarPriceStore, copy_prices
+from app.data.async_fetcher import AsyncMarketDataFetcher, CHART_PROVIDER, UpstreamError, parse_chart
+from app.data.repository import AsyncPriceRepository
+from app.data import ingestion
+from app.data.models import IngestionJob
+from app.ml_layer.feature_store import FeatureStore
+from app.core.config import settings
+
+
+def _sqlite_session():
+    # One shared connection usable from worker threads (async repository offloads store calls)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _bars(ticker, start, n, close=100.0):
+    return [
+        {
+            "ticker": ticker,
+            "date": start + timedelta(days=i),
+            "open": close + i,
+            "high": close + i + 1,
+            "low": close + i - 1,
+            "close": close + i,
+            "volume": 1000.0 + i,
+        }
+        for i in range(n)
+    ]
+
+
+def test_bulk_upsert_ohlcv():
+    print("Testing OHLCV bulk upsert...")
+    db = _sqlite_session()
+    start = date(2024, 1, 1)
+
+    counts = MarketDataStore.upsert_ohlcv(db, _bars("AAA", start, 300))
+    print(f"First load: {counts}")
+    assert counts == {"inserted": 300, "updated": 0}
+
+    # Overlapping reload: 100 existing rows updated, 50 new rows inserted
+    counts = MarketDataStore.upsert_ohlcv(db, _bars("AAA", start + timedelta(days=200), 150, close=500.0))
+    print(f"Overlapping load: {counts}")
+    assert counts == {"inserted": 50, "updated": 100}
+    assert db.query(OHLCVData).count() == 350
+
+    row = db.query(OHLCVData).filter(OHLCVData.date == start + timedelta(days=200)).one()
+    assert row.close == 500.0
+
+    # store_ohlcv keeps returning the count of new rows
+    assert MarketDataStore.store_ohlcv(db, _bars("BBB", start, 10)) == 10
+    db.close()
+
+
+def test_bulk_upsert_fundamentals():
+    print("\nTesting fundamentals upsert...")
+    db = _sqlite_session()
+    snapshot = {"ticker": "AAA", "report_date": date(2024, 3, 31), "pe_ratio": 20.0}
+
+    assert MarketDataStore.store_fundamentals(db, snapshot)
+    assert MarketDataStore.store_fundamentals(db, dict(snapshot, pe_ratio=25.0))
+    assert not MarketDataStore.store_fundamentals(db, None)
+
+    rows = db.query(FundamentalData).all()
+    print(f"Stored snapshots: {len(rows)}")
+    assert len(rows) == 1 and rows[0].pe_ratio == 25.0
+    db.close()
+
+
+def test_price_series():
+    print("\nTesting PriceSeries...")
+    index = pd.date_range("2024-01-01", periods=5, freq="D", tz="America/New_York")
+    df = pd.DataFrame({
+        "Open": np.arange(5.0), "High": np.arange(5.0) + 1, "Low": np.arange(5.0) - 1,
+        "Close": np.array([100.0, 102.0, 101.0, 99.0, 103.0]), "Volume": np.arange(5) * 10,
+    }, index=index)
+
+    series = PriceSeries.from_dataframe("AAA", df)
+    print(f"Series: {series}")
+    assert series.close.dtype == np.float64 and series.close.flags["C_CONTIGUOUS"]
+    assert series.dates[0] == np.datetime64("2024-01-01")
+    assert series.last_date == date(2024, 1, 5)
+    assert np.allclose(series.returns(), np.diff(series.close) / series.close[:-1])
+
+    records = series.to_records()
+    assert records[1]["close"] == 102.0 and records[1]["date"] == date(2024, 1, 2)
+    round_trip = PriceSeries.from_records("AAA", records)
+    assert np.array_equal(round_trip.close, series.close)
+    assert np.array_equal(round_trip.dates, series.dates)
+
+    db = _sqlite_session()
+    assert MarketDataStore.upsert_ohlcv(db, series) == {"inserted": 5, "updated": 0}
+    db.close()
+
+
+class _FakeFetcher:
+    """
+    Upstream stand-in serving daily bars up to a fixed date and counting calls.
+    """
+
+    def __init__(self, last_day):
+        self.last_day = last_day
+        self.calls = []
+
+    def fetch_ohlcv(self, ticker, period="1y", start=None):
+        self.calls.append((period, start))
+        first = start or self.last_day - timedelta(days=92)
+        n = (self.last_day - first).days + 1
+        return PriceSeries.from_records(ticker, _bars(ticker, first, max(n, 0)))
+
+
+def test_price_repository():
+    print("\nTesting read-through price repository...")
+    db = _sqlite_session()
+    today = date(2024, 6, 5)  # Wednesday
+    fetcher = _FakeFetcher(last_day=date(2024, 6, 3))
+    repository = PriceRepository(SQLPriceStore(db), fetcher)
+
+    series, status = repository.get_history("aaa", "3mo", today=today)
+    print(f"Cold read: {status}, {series}")
+    assert status == CacheStatus.MISS and series.ticker == "AAA"
+
+    # Tuesday's bar is missing: only the tail is fetched
+    fetcher.last_day = date(2024, 6, 4)
+    series, status = repository.get_history("AAA", "3mo", today=today)
+    print(f"Stale read: {status}, {series}")
+    assert status == CacheStatus.PARTIAL
+    assert fetcher.calls[-1] == ("1y", date(2024, 6, 4))
+    assert series.last_date == date(2024, 6, 4)
+
+    series, status = repository.get_history("AAA", "3mo", today=today)
+    print(f"Warm read: {status}, {series}")
+    assert status == CacheStatus.HIT and len(fetcher.calls) == 2
+    assert np.all(np.diff(series.dates).astype(int) == 1)
+
+    # Upstream includes today's forming bar: no path returns it, so every status serves the same bars
+    fetcher.last_day = today
+    series, status = repository.get_history("FRM", "3mo", today=today)
+    assert status == CacheStatus.MISS and series.last_date == date(2024, 6, 4)
+    fetcher.last_day = date(2024, 6, 6)
+    series, status = repository.get_history("FRM", "3mo", today=date(2024, 6, 6))
+    assert status == CacheStatus.PARTIAL and series.last_date == date(2024, 6, 5)
+    db.close()
+
+
+def test_plan_history():
+    print("\nTesting shared cache planning...")
+    today, start = date(2024, 6, 5), date(2024, 3, 5)
+    stored = PriceSeries.from_records("AAA", _bars("AAA", start, 90))  # through 2024-06-02
+    assert plan_history(PriceSeries.empty("AAA"), start, today) == (CacheStatus.MISS, None)
+    assert plan_history(stored.slice(start=10), start, today) == (CacheStatus.MISS, None)
+    assert plan_history(stored, start, today) == (CacheStatus.PARTIAL, date(2024, 6, 3))
+    assert plan_history(stored, start, date(2024, 6, 3)) == (CacheStatus.HIT, None)
+
+    tail = PriceSeries.from_records("AAA", _bars("AAA", date(2024, 6, 3), 2, close=200.0))
+    assert merge_history(CacheStatus.HIT, stored, None) is stored
+    assert len(merge_history(CacheStatus.PARTIAL, stored, tail)) == 92
+    assert merge_history(CacheStatus.MISS, stored, tail) is tail
+
+
+def test_last_expected_session():
+    print("\nTesting exchange session calendar...")
+    session = PriceRepository.last_expected_session
+    assert session(date(2024, 6, 5)) == date(2024, 6, 4)
+    assert session(date(2024, 6, 10)) == date(2024, 6, 7)       # Monday after a weekend
+    assert session(date(2024, 7, 5)) == date(2024, 7, 3)        # Day after Independence Day
+    assert session(date(2024, 1, 16)) == date(2024, 1, 12)      # MLK Day
+    assert session(date(2024, 4, 1)) == date(2024, 3, 28)       # Good Friday
+    assert session(date(2023, 1, 3)) == date(2022, 12, 30)      # Observed New Year's Day
+    assert session(date(2022, 12, 27)) == date(2022, 12, 23)    # Observed Christmas
+    assert session(date(2024, 11, 29)) == date(2024, 11, 27)    # Thanksgiving
+    assert date(2021, 12, 31) not in exchange_holidays(2021) and date(2024, 6, 19) in exchange_holidays(2024)
+
+
+def test_fetch_ohlcv_many():
+    print("\nTesting multi-symbol fetch...")
+    original = MarketDataFetcher._download
+
+    def fake_download(ticker, period="1y", start=None):
+        if ticker == "BAD":
+            raise RuntimeError("upstream error")
+        return PriceSeries.from_records(ticker, _bars(ticker, date(2024, 1, 1), 2))
+
+    MarketDataFetcher._download = staticmethod(fake_download)
+    try:
+        results, errors = MarketDataFetcher.fetch_ohlcv_many(["^GSPC", "BAD", "^DJI", "^GSPC"], period="2d", max_workers=4)
+    finally:
+        MarketDataFetcher._download = original
+
+    print(f"Fetched: {sorted(results)}, errors: {errors}")
+    assert sorted(results) == ["^DJI", "^GSPC"]
+    assert errors == {"BAD": "upstream error"}
+
+
+def test_streaming_series_loaders():
+    print("\nTesting streaming multi-ticker loaders...")
+    db = _sqlite_session()
+    start = date(2024, 1, 1)
+    for ticker, n in (("CCC", 7), ("AAA", 5), ("BBB", 9)):
+        MarketDataStore.upsert_ohlcv(db, _bars(ticker, start, n))
+
+    # Chunks smaller than a ticker force series to be stitched across chunk boundaries
+    streamed = list(SQLPriceStore(db).iter_series(chunk_size=4))
+    print(f"Streamed: {streamed}")
+    assert [s.ticker for s in streamed] == ["AAA", "BBB", "CCC"]
+    assert [len(s) for s in streamed] == [5, 9, 7]
+    assert np.array_equal(streamed[1].close, 100.0 + np.arange(9))
+
+    subset = list(SQLPriceStore(db).iter_series(tickers=["bbb"], start=start + timedelta(days=3)))
+    assert len(subset) == 1 and len(subset[0]) == 6
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prices.csv")
+        pd.DataFrame([row for s in streamed for row in s.to_records()]).to_csv(path, index=False)
+        from_file = list(iter_file_series(path, chunk_size=3))
+        assert [s.ticker for s in from_file] == ["AAA", "BBB", "CCC"]
+        assert all(np.array_equal(a.dates, b.dates) and np.array_equal(a.close, b.close) for a, b in zip(from_file, streamed))
+    db.close()
+
+
+def test_columnar_price_store():
+    print("\nTesting columnar price store...")
+    start = date(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as root:
+        store = ColumnarPriceStore(root)
+        assert store.save(PriceSeries.from_records("AAA", _bars("AAA", start, 10))) == {"inserted": 10, "updated": 0}
+        # Newer bars append in place; overlapping bars rewrite with the incoming values
+        assert store.save(PriceSeries.from_records("AAA", _bars("AAA", start + timedelta(days=10), 5))) == {"inserted": 5, "updated": 0}
+        assert store.save(PriceSeries.from_records("AAA", _bars("AAA", start + timedelta(days=12), 6, close=500.0))) == {"inserted": 3, "updated": 3}
+
+        series = store.load("AAA")
+        print(f"Stored: {series}")
+        assert len(series) == 18 and store.last_date("AAA") == start + timedelta(days=17)
+        assert np.all(np.diff(series.dates).astype(int) == 1)
+        assert series.close[11] == 101.0 and series.close[12] == 500.0
+
+        window = store.load("AAA", start=start + timedelta(days=3), end=start + timedelta(days=5))
+        assert len(window) == 3 and not window.close.flags.writeable  # read-only view of the mapped file
+
+        # SQL -> columnar -> SQL round trip
+        db = _sqlite_session()
+        MarketDataStore.upsert_ohlcv(db, _bars("BBB", start, 7))
+        assert copy_prices(SQLPriceStore(db), store) == {"tickers": 1, "inserted": 7, "updated": 0}
+        assert store.tickers() == ["AAA", "BBB"]
+        assert copy_prices(store, SQLPriceStore(db), tickers=["aaa"])["inserted"] == 18
+        assert np.array_equal(SQLPriceStore(db).load("AAA").close, series.close)
+
+        # Same repository behaviour on top of the columnar backend
+        repository = PriceRepository(store, _FakeFetcher(last_day=date(2024, 6, 4)))
+        _, status = repository.get_history("CCC", "3mo", today=date(2024, 6, 5))
+        history, status_again = repository.get_history("CCC", "3mo", today=date(2024, 6, 5))
+        assert (status, status_again) == (CacheStatus.MISS, CacheStatus.HIT) and len(history) == 92
+        db.close()
+
+
+def _write_days(root, days):
+    # One bar per call: interleaved appends and merges from several processes
+    store = ColumnarPriceStore(root)
+    for day in days:
+        store.save(PriceSeries.from_records("AAA", _bars("AAA", date(2024, 1, 1) + timedelta(days=day), 1, close=100.0 + day)))
+
+
+def test_columnar_store_concurrent_writers():
+    print("\nTesting columnar store with several writer processes...")
+    from concurrent.futures import ProcessPoolExecutor
+    n_days, n_writers = 120, 4
+    with tempfile.TemporaryDirectory() as root:
+        with ProcessPoolExecutor(max_workers=n_writers) as pool:
+            list(pool.map(_write_days, [root] * n_writers, [range(i, n_days, n_writers) for i in range(n_writers)]))
+
+        series = ColumnarPriceStore(root).load("AAA")
+        assert len(series) == n_days and np.all(np.diff(series.dates).astype(int) == 1)
+        assert np.array_equal(series.close, 100.0 + np.arange(n_days))
+        # Superseded generations are pruned down to the live one and its predecessor
+        generations = [name for name in os.listdir(os.path.join(root, "AAA")) if name.startswith("g")]
+        assert 1 <= len(generations) <= 2
+
+
+def _chart_payload(n, close=100.0, adjustment=None):
+    # Daily session opens at 09:30 New York (UTC-4)
+    timestamps = [1717594200 + 86400 * i for i in range(n)]
+    closes = [close + i for i in range(n)]
+    closes[1] = None  # Yahoo leaves holes for missing bars
+    adjustment = adjustment or [1.0] * n
+    adjclose = [c * a if c is not None else None for c, a in zip(closes, adjustment)]
+    return {"chart": {"result": [{
+        "meta": {"gmtoffset": -14400},
+        "timestamp": timestamps,
+        "indicators": {
+            "quote": [{"open": closes, "high": closes, "low": closes, "close": closes, "volume": [1000] * n}],
+            "adjclose": [{"adjclose": adjclose}],
+        }
+    }], "error": None}}
+
+
+def test_parse_chart_adjusted():
+    print("\nTesting adjusted chart parsing...")
+    # A dividend before the third bar: earlier bars are adjusted down
+    payload = _chart_payload(4, adjustment=[0.98, 0.98, 1.0, 1.0])
+    series = parse_chart("AAA", payload)
+    assert np.allclose(series.close, [98.0, 102.0, 103.0])
+    assert np.allclose(series.open, series.close) and np.allclose(series.low, series.close)
+    assert np.array_equal(series.volume, [1000.0] * 3)
+
+    del payload["chart"]["result"][0]["indicators"]["adjclose"]
+    try:
+        parse_chart("AAA", payload)
+        assert False, "expected UpstreamError"
+    except UpstreamError:
+        pass
+
+
+def test_async_fetcher_bounded_concurrency():
+    print("\nTesting async upstream fetcher...")
+    active, peak = [0], [0]
+
+    async def handler(request):
+        ticker = request.url.path.rsplit("/", 1)[-1]
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        if ticker == "BAD":
+            return httpx.Response(404, json={"chart": {"result": None, "error": {"code": "Not Found", "description": "No data found"}}})
+        return httpx.Response(200, json=_chart_payload(4))
+
+    async def main():
+        fetcher = AsyncMarketDataFetcher(
+            client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            concurrency={CHART_PROVIDER: 3}
+        )
+        try:
+            return await fetcher.fetch_ohlcv_many([f"T{i}" for i in range(20)] + ["BAD"], period="5d")
+        finally:
+            await fetcher.aclose()
+
+    results, errors = asyncio.run(main())
+    print(f"Fetched {len(results)}, errors: {errors}, peak concurrency: {peak[0]}")
+    assert len(results) == 20 and "Not Found" in errors["BAD"]
+    assert peak[0] <= 3
+    series = results["T0"]
+    assert len(series) == 3 and series.dates[0] == np.datetime64("2024-06-05")
+    assert np.array_equal(series.close, [100.0, 102.0, 103.0])
+
+
+class _FakeAsyncFetcher(_FakeFetcher):
+    async def fetch_ohlcv(self, ticker, period="1y", start=None):
+        return super().fetch_ohlcv(ticker, period, start)
+
+
+def test_async_price_repository():
+    print("\nTesting async read-through repository...")
+    db = _sqlite_session()
+    today = date(2024, 6, 5)
+    fetcher = _FakeAsyncFetcher(last_day=date(2024, 6, 3))
+    repository = AsyncPriceRepository(SQLPriceStore(db), fetcher)
+
+    async def main():
+        first = await repository.get_history("aaa", "3mo", today=today)
+        fetcher.last_day = date(2024, 6, 4)
+        second = await repository.get_history("AAA", "3mo", today=today)
+        third = await repository.get_history("AAA", "3mo", today=today)
+        return first, second, third
+
+    (_, s1), (_, s2), (series, s3) = asyncio.run(main())
+    assert (s1, s2, s3) == (CacheStatus.MISS, CacheStatus.PARTIAL, CacheStatus.HIT)
+    assert series.last_date == date(2024, 6, 4) and len(fetcher.calls) == 2
+    db.close()
+
+
+def test_ingestion_jobs():
+    print("\nTesting background ingestion jobs...")
+    db = _sqlite_session()
+    store = SQLPriceStore(db)
+    fetcher = _FakeFetcher(last_day=date(2024, 6, 3))
+    fetcher.fetch_fundamentals = lambda ticker: None
+    sent = []
+
+    entries, added = ingestion.add_to_watchlist(db, ["aaa", "BBB", "aaa"])
+    assert [e.ticker for e in entries] == ["AAA", "BBB"] and added == ["AAA", "BBB"]
+    assert ingestion.shard_for("AAA") == ingestion.shard_for("aaa") < 4
+
+    # Scheduling queues each ticker once; a second pass finds them in flight
+    assert ingestion.schedule_watchlist(db, dispatch=sent.append) == {"tickers": 2, "submitted": 2, "in_flight": 0}
+    assert ingestion.schedule_watchlist(db, dispatch=sent.append)["in_flight"] == 2
+    assert len(sent) == 2
+
+    # Initial run loads history up to the last completed session, watchlist follows
+    job = ingestion.run_job(db, sent[0].id, store=store, fetcher=fetcher, today=date(2024, 6, 4))
+    assert job.status == IngestionJob.SUCCEEDED and job.inserted == 93
+    assert job.last_bar_date == date(2024, 6, 3) == entries[0].last_bar_date
+    # Redelivery of a finished job is a no-op
+    assert ingestion.run_job(db, sent[0].id, store=store, fetcher=fetcher).inserted == 93
+
+    # Next run only asks upstream for the new bars; today's forming bar is not stored
+    fetcher.last_day = date(2024, 6, 5)
+    job, created = ingestion.submit_job(db, "AAA", dispatch=sent.append)
+    with tempfile.TemporaryDirectory() as root:
+        features = FeatureStore(root)
+        job = ingestion.run_job(db, job.id, store=store, fetcher=fetcher, today=date(2024, 6, 5), features=features)
+        # Feature rows are materialized for the stored history after the insert
+        assert features.last_date("AAA") == np.datetime64("2024-06-04") and len(features.load("AAA")[0]) == 94
+    assert created and job.inserted == 1 and job.last_bar_date == date(2024, 6, 4)
+    assert fetcher.calls[-1] == ("1y", date(2024, 6, 4))
+
+    # Up to date: no upstream call at all
+    calls = len(fetcher.calls)
+    job, _ = ingestion.submit_job(db, "AAA", dispatch=sent.append)
+    assert ingestion.run_job(db, job.id, store=store, fetcher=fetcher, today=date(2024, 6, 5)).inserted == 0
+    assert len(fetcher.calls) == calls
+
+    # A stuck job stops blocking the ticker after the timeout; dispatch failures are recorded
+    stuck = ingestion.active_job(db, "BBB")
+    stuck.created_at = stuck.created_at - timedelta(days=1)
+    db.commit()
+
+    def broken(job):
+        raise ConnectionError("broker down")
+
+    job, created = ingestion.submit_job(db, "BBB", dispatch=broken)
+    assert created and job.status == IngestionJob.FAILED and "broker down" in job.error
+    assert db.get(IngestionJob, stuck.id).error == "Timed out"
+    assert [j.ticker for j in ingestion.get_jobs(db, status=IngestionJob.FAILED)] == ["BBB", "BBB"]
+
+    # The scheduled GARCH refit covers the watchlist tickers with stored history
+    class _Refits:
+        def refit(self, series_list, today=None):
+            self.fitted = {s.ticker: len(s) for s in series_list}
+            return self.fitted
+
+    refits = _Refits()
+    assert ingestion.refit_volatility(db, store=store, model=refits, today=date(2024, 6, 5)) == {"tickers": 2, "fitted": 1}
+    assert refits.fitted == {"AAA": 94}
+    db.close()
+
+
+def test_read_only_repository():
+    print("\nTesting read-only repository with background ingestion...")
+    db = _sqlite_session()
+    today = date(2024, 6, 5)
+    store = SQLPriceStore(db)
+    store.save(PriceSeries.from_records("AAA", _bars("AAA", date(2024, 3, 1), 94)))  # through 2024-06-02
+    fetcher = _FakeFetcher(last_day=date(2024, 6, 4))
+    sent = []
+
+    original = settings.INGESTION_ENABLED
+    settings.INGESTION_ENABLED = True
+    try:
+        repository = get_price_repository(db, fetcher)
+    finally:
+        settings.INGESTION_ENABLED = original
+    assert repository.refresh is not None and get_price_repository(db, fetcher).refresh is None
+    repository.refresh = lambda ticker: ingestion.request_refresh(db, ticker, dispatch=sent.append)
+
+    # Stale history is served as stored and a job is queued instead of a tail fetch
+    series, status = repository.get_history("AAA", "3mo", today=today)
+    assert status == CacheStatus.STALE and series.last_date == date(2024, 6, 2)
+    assert fetcher.calls == [] and [job.ticker for job in sent] == ["AAA"]
+    # Unknown tickers are fetched for the response but only the ingestion job stores them
+    series, status = repository.get_history("NEW", "3mo", today=today)
+    assert status == CacheStatus.MISS and len(series) and store.last_date("NEW") is None
+    assert store.last_date("AAA") == date(2024, 6, 2) and len(sent) == 2
+
+    # In-flight and recently finished jobs are not queued again
+    repository.get_history("AAA", "3mo", today=today)
+    assert len(sent) == 2
+    ingestion.run_job(db, sent[0].id, store=store, fetcher=fetcher, today=today)
+    assert ingestion.request_refresh(db, "AAA", dispatch=sent.append) is None and len(sent) == 2
+    series, status = repository.get_history("AAA", "3mo", today=today)
+    assert status == CacheStatus.HIT and series.last_date == date(2024, 6, 4)
+    db.close()
+
+
+if __name__ == "__main__":
+    test_bulk_upsert_ohlcv()
+    test_bulk_upsert_fundamentals()
+    test_price_series()
+    test_price_repository()
+    test_plan_history()
+    test_last_expected_session()
+    test_fetch_ohlcv_many()
+    test_streaming_series_loaders()
+    test_columnar_price_store()
+    test_columnar_store_concurrent_writers()
+    test_parse_chart_adjusted()
+    test_async_fetcher_bounded_concurrency()
+    test_async_price_repository()
+    test_ingestion_jobs()
+    test_read_only_repository()
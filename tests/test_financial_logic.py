@@ -5,8 +5,16 @@ import os
 sys.path.append(os.path.join(os.getcwd(), 'backend'))
 
 from app.financial_intelligence.valuation import ValuationEngine
-from app.financial_intelligence.risk import RiskEngine
-from app.financial_intelligence.allocation import AssetAllocationEngine
+from app.financial_intelligence.risk import RiskEngine, RiskState
+from app.financial_intelligence.allocation import AssetAllocationEngine, RegimeAllocator
+from app.financial_intelligence import optimizer
+from app.core.cache import TTLCache
+from app.core.shared_cache import SharedCache
+from app.financial_intelligence.simulation import RiskSimulator
+from app.financial_intelligence.portfolio import CovarianceCache, CovarianceState, portfolio_risk
+from app.data.series import PriceSeries
+from sklearn.covariance import ledoit_wolf
+import numpy as np
 
 def test_valuation():
     print("Testing Valuation...")
@@ -31,6 +39,286 @@ def test_risk():
     var_95 = RiskEngine.calculate_var(returns, 0.95)
     print(f"VaR (95%): {var_95}")
 
+def _loop_max_drawdown(prices):
+    peak = prices[0]
+    max_drawdown = 0.0
+    for price in prices:
+        if price > peak:
+            peak = price
+        drawdown = (peak - price) / peak
+        if drawdown > max_drawdown:
+            max_drawdown = drawdown
+    return max_drawdown
+
+
+def _sorted_var(returns, confidence_level):
+    sorted_returns = sorted(returns)
+    var_value = -sorted_returns[int((1 - confidence_level) * len(sorted_returns))]
+    return var_value if var_value > 0 else 0.0
+
+
+def test_risk_kernels():
+    print("\nTesting vectorized risk kernels...")
+    rng = np.random.default_rng(7)
+    prices = 100 * np.cumprod(1 + rng.normal(0, 0.02, (50, 300)), axis=1)
+    returns = np.diff(prices, axis=1) / prices[:, :-1]
+
+    drawdowns = RiskEngine.max_drawdown(prices)
+    var_95 = RiskEngine.value_at_risk(returns, 0.95)
+    var_99 = RiskEngine.value_at_risk(returns, 0.99)
+    for i in range(len(prices)):
+        assert drawdowns[i] == _loop_max_drawdown(prices[i].tolist())
+        assert var_95[i] == _sorted_var(returns[i].tolist(), 0.95)
+        assert var_99[i] == _sorted_var(returns[i].tolist(), 0.99)
+        assert RiskEngine.calculate_max_drawdown(prices[i].tolist()) == drawdowns[i]
+
+    # Shorter histories are left-padded with NaN
+    padded = prices.copy()
+    padded[3, :120] = np.nan
+    padded_returns = np.diff(padded, axis=1) / padded[:, :-1]
+    assert RiskEngine.max_drawdown(padded)[3] == _loop_max_drawdown(prices[3, 120:].tolist())
+    assert RiskEngine.value_at_risk(padded_returns, 0.95)[3] == _sorted_var(returns[3, 120:].tolist(), 0.95)
+    print(f"Drawdowns (first 3): {drawdowns[:3]}, VaR95 (first 3): {var_95[:3]}")
+
+def test_streaming_risk_state():
+    print("\nTesting streaming risk state...")
+    rng = np.random.default_rng(11)
+    prices = 100 * np.cumprod(1 + rng.normal(0.0002, 0.015, 5000))
+    returns = np.diff(prices) / prices[:-1]
+
+    state = RiskState.from_prices(prices[:3000])
+    # Persist and restore mid-stream, then keep updating bar by bar
+    state = RiskState.from_dict(state.to_dict())
+    for price in prices[3000:]:
+        state.update(price)
+
+    exact_var = RiskEngine.calculate_var(returns, 0.95)
+    print(f"Streaming: {state.snapshot()}, exact VaR95: {exact_var}")
+    assert state.max_drawdown == RiskEngine.calculate_max_drawdown(prices)
+    assert abs(state.var(0.95) - exact_var) < 0.1 * exact_var
+    assert abs(state.var(0.99) - RiskEngine.calculate_var(returns, 0.99)) < 0.1 * exact_var
+
+def _loop_dcf(cash_flows, discount_rate, terminal_growth_rate):
+    present_value = sum(cf / (1 + discount_rate) ** (i + 1) for i, cf in enumerate(cash_flows))
+    terminal_value = cash_flows[-1] * (1 + terminal_growth_rate) / (discount_rate - terminal_growth_rate)
+    return present_value + terminal_value / (1 + discount_rate) ** len(cash_flows)
+
+def test_dcf_scenarios():
+    print("\nTesting vectorized DCF scenarios...")
+    rng = np.random.default_rng(3)
+    paths = rng.uniform(50, 150, (200, 7))
+    rates = rng.uniform(0.06, 0.12, 200)
+    growths = rng.uniform(0.0, 0.04, 200)
+    values = ValuationEngine.dcf(paths, rates, growths)
+    for i in range(len(paths)):
+        assert np.isclose(values[i], _loop_dcf(paths[i].tolist(), rates[i], growths[i]), rtol=1e-12)
+    assert np.isclose(ValuationEngine.calculate_dcf([100.0] * 5, 0.10), _loop_dcf([100.0] * 5, 0.10, 0.02), rtol=1e-12)
+    # The array path marks r <= g as invalid; the scalar wrapper keeps the plain formula
+    assert np.isnan(ValuationEngine.dcf([100.0] * 5, 0.02, 0.03))
+    assert np.isnan(ValuationEngine.dcf([100.0] * 5, 0.03, 0.03))
+    assert ValuationEngine.calculate_dcf([100.0] * 5, 0.02, 0.03) == _loop_dcf([100.0] * 5, 0.02, 0.03) < 0
+    try:
+        ValuationEngine.calculate_dcf([100.0] * 5, 0.03, 0.03)
+        assert False, "expected ZeroDivisionError"
+    except ZeroDivisionError:
+        pass
+
+    # Grid mode values every combination; r <= g is reported as invalid
+    grid = ValuationEngine.dcf_scenarios([0.03, 0.08, 0.10], [0.01, 0.03], cash_flows=[100.0] * 5)
+    assert grid["mode"] == "grid" and grid["scenarios"] == 6
+    assert grid["enterprise_value"]["invalid"] == 1
+    table = grid["sensitivity"]["discount_rate_x_terminal_growth"]
+    assert table["values"][0][1] is None and np.isclose(table["values"][2][0], _loop_dcf([100.0] * 5, 0.10, 0.01))
+
+    # Sampled mode with per-year growth paths is reproducible under a seed
+    kwargs = dict(
+        base_cash_flow=100.0, growth={"mean": 0.05, "std": 0.1}, years=10,
+        n_scenarios=100_000, seed=42, net_debt=50.0, shares_outstanding=10, market_value=1500.0
+    )
+    first = ValuationEngine.dcf_scenarios({"mean": 0.09, "std": 0.01, "low": 0.05}, {"mean": 0.02, "std": 0.005}, **kwargs)
+    second = ValuationEngine.dcf_scenarios({"mean": 0.09, "std": 0.01, "low": 0.05}, {"mean": 0.02, "std": 0.005}, **kwargs)
+    assert first == second and first["mode"] == "sampled" and first["scenarios"] == 100_000
+    ev, per_share = first["enterprise_value"], first["per_share"]
+    assert ev["percentiles"]["p5"] < ev["percentiles"]["p50"] < ev["percentiles"]["p95"]
+    assert np.isclose(per_share["mean"], (ev["mean"] - 50.0) / 10)
+    assert 0 < first["prob_above_market"] < 1
+    assert len(first["sensitivity"]["discount_rate_x_growth"]["values"]) == 5
+    print(f"EV percentiles: {ev['percentiles']}")
+
+def _sorted_cvar(returns, confidence_level):
+    sorted_returns = sorted(returns)
+    tail = sorted_returns[:int((1 - confidence_level) * len(sorted_returns)) + 1]
+    return max(-sum(tail) / len(tail), 0.0)
+
+def test_simulated_var_cvar():
+    print("\nTesting simulated VaR/CVaR...")
+    rng = np.random.default_rng(5)
+    returns = rng.standard_t(4, (3, 750)) * 0.01
+    cvar = RiskEngine.expected_shortfall(returns, 0.95)
+    for i in range(len(returns)):
+        assert np.isclose(cvar[i], _sorted_cvar(returns[i].tolist(), 0.95))
+    assert RiskEngine.calculate_cvar(returns[0], 0.99) >= RiskEngine.calculate_var(returns[0], 0.99)
+
+    series = returns[0]
+    results = {}
+    for method in ("bootstrap", "parametric", "filtered"):
+        simulator = RiskSimulator(n_paths=100_000, horizons=(10, 1), seed=7, chunk_size=30_000)
+        result = simulator.run(series, method)
+        assert result == simulator.run(series, method)
+        one_day, ten_day = result["horizons"]
+        assert one_day["days"] == 1 and ten_day["days"] == 10
+        for c in ("0.95", "0.99"):
+            assert 0 < one_day["var"][c] <= one_day["cvar"][c] < ten_day["cvar"][c]
+        results[method] = one_day
+
+    # One-day bootstrap resamples history; parametric matches the Gaussian quantile
+    assert abs(results["bootstrap"]["var"]["0.95"] - RiskEngine.calculate_var(series, 0.95)) < 0.002
+    log_returns = np.log1p(series)
+    gaussian = -np.expm1(log_returns.mean() - 1.6449 * log_returns.std(ddof=1))
+    assert abs(results["parametric"]["var"]["0.95"] - gaussian) < 0.001
+    print(f"1-day VaR95 by method: { {m: round(r['var']['0.95'], 4) for m, r in results.items()} }")
+
+def test_incremental_ledoit_wolf():
+    print("\nTesting incremental Ledoit-Wolf covariance...")
+    rng = np.random.default_rng(9)
+    returns = rng.standard_normal((400, 12)) @ rng.standard_normal((12, 12)) * 0.004 + 0.0003
+    dates = np.datetime64("2022-01-03") + np.arange(400)
+
+    state = CovarianceState([f"T{i}" for i in range(12)], window=120)
+    assert state.update(dates[:200], returns[:200]) == 120
+    for i in range(200, 400):
+        state.update(dates[i:i + 1], returns[i:i + 1])
+    # Stale rows are ignored
+    assert state.update(dates[:400], returns[:400]) == 0
+
+    cov, shrinkage = state.ledoit_wolf()
+    expected_cov, expected_shrinkage = ledoit_wolf(returns[-120:])
+    assert np.isclose(shrinkage, expected_shrinkage) and np.allclose(cov, expected_cov, rtol=1e-9, atol=1e-15)
+
+    weights = np.full(12, 1 / 12)
+    risk = portfolio_risk(state, weights, horizon=1, portfolio_value=1e6)
+    assert np.isclose(sum(c["contribution"] for c in risk["contributions"]), risk["volatility"])
+    assert np.isclose(risk["volatility"], np.sqrt(weights @ expected_cov @ weights))
+    portfolio_returns = returns[-120:] @ weights
+    assert risk["historical_var"]["0.95"] == RiskEngine.calculate_var(portfolio_returns, 0.95)
+    assert risk["parametric_var"]["0.99"] > risk["parametric_var"]["0.95"] > 0
+
+    # Cache: one state per universe, advanced only by newer bars
+    closes = 100 * np.cumprod(1 + returns[:, :3], axis=0)
+    series = [PriceSeries(f"T{i}", dates, *(closes[:, i],) * 4, np.ones(400)) for i in range(3)]
+    cache = CovarianceCache(maxsize=2, window=60)
+    first = cache.get(["T2", "T0", "T1"], [s.slice(stop=300) for s in series])
+    again = cache.get(["T0", "T1", "T2"], [s.slice(stop=300) for s in series])
+    assert first is again and first.as_of == dates[299].astype(object)
+    cache.get(["T0", "T1", "T2"], series)
+    assert first.as_of == dates[-1].astype(object) and first.observations == 60
+    assert cache.stats() == {"universes": 1, "hits": 2, "misses": 1}
+
+def test_batch_rebalance():
+    print("\nTesting batch rebalancing...")
+    rng = np.random.default_rng(2)
+    holdings = rng.uniform(0, 50_000, (1000, 3))
+    profiles = rng.choice(list(AssetAllocationEngine.PORTFOLIOS) + ["unknown"], 1000).tolist()
+    targets = AssetAllocationEngine.target_matrix(profiles)
+    result = AssetAllocationEngine.rebalance_batch(holdings, targets, tolerance=0.05)
+
+    # Without constraints, breached accounts trade exactly the single-account diff
+    classes = ["equity", "bonds", "cash"]
+    for i in np.flatnonzero(result["actionable"])[:50]:
+        expected = AssetAllocationEngine.calculate_rebalancing_diff(
+            holdings[i].sum(), dict(zip(classes, holdings[i])), AssetAllocationEngine.get_allocation_strategy(profiles[i])
+        )
+        assert np.allclose(result["trades"][i], [expected[c] for c in classes])
+    within = ~result["breaches"].any(axis=1)
+    assert within.any() and not result["actionable"][within].any()
+
+    # Constraints: small trades skipped, cash never below the buffer, trades self-financing
+    constrained = AssetAllocationEngine.rebalance_batch(holdings, targets, tolerance=0.05, min_trade=2_000, cash_buffer=0.15)
+    trades = constrained["trades"]
+    assert np.allclose(trades.sum(axis=1), 0)
+    assert np.all((trades[:, :2] == 0) | (np.abs(trades[:, :2]) >= 2_000))
+    cash_after = holdings[:, 2] + trades[:, 2]
+    moved = constrained["actionable"]
+    assert np.all(cash_after[moved] >= 0.15 * holdings[moved].sum(axis=1) - 1e-6)
+    assert constrained["actionable"].sum() <= result["actionable"].sum()
+    try:
+        AssetAllocationEngine.rebalance_batch(holdings[:, :2], targets[:, :2], asset_classes=("equity", "bonds"), cash_buffer=0.1)
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert "cash" in str(e)
+
+    actions = list(AssetAllocationEngine.iter_rebalance_actions(list(range(1000)), profiles, constrained))
+    assert len(actions) == int(moved.sum()) and all(a["breaches"] for a in actions)
+    print(f"Actionable accounts: {len(actions)} of 1000")
+
+def test_allocation_optimizers():
+    print("\nTesting allocation optimizers...")
+    rng = np.random.default_rng(4)
+    returns = rng.normal(0.0004, 0.01, (500, 8)) @ (np.eye(8) + 0.3 * rng.random((8, 8)))
+    mu, cov = returns.mean(axis=0) * 252, np.cov(returns, rowvar=False) * 252
+
+    # KKT: assets strictly inside the box share the same gradient; those at a bound sit on the right side of it
+    w, _ = optimizer.solve_mean_variance(mu, cov, risk_aversion=3.0, upper=0.4)
+    gradient = mu - 3.0 * cov @ w
+    inside = (w > 1e-6) & (w < 0.4 - 1e-6)
+    level = gradient[inside].mean()
+    assert abs(w.sum() - 1) < 1e-9 and np.all(w >= 0) and np.all(w <= 0.4 + 1e-12)
+    assert np.allclose(gradient[inside], level, atol=1e-6)
+    assert np.all(gradient[w <= 1e-6] <= level + 1e-6) and np.all(gradient[w >= 0.4 - 1e-6] >= level - 1e-6)
+
+    parity, _ = optimizer.solve_risk_parity(cov)
+    assert np.allclose(optimizer.risk_contributions(parity, cov), 1 / 8, atol=1e-8)
+
+    # A small change in the inputs re-solves faster from the previous weights
+    shifted = mu * 1.02
+    _, cold = optimizer.solve_mean_variance(shifted, cov, risk_aversion=3.0, upper=0.4)
+    warm_w, warm = optimizer.solve_mean_variance(shifted, cov, risk_aversion=3.0, upper=0.4, start=w)
+    assert warm < cold
+    print(f"Mean-variance iterations cold/warm: {cold}/{warm}")
+
+    # Regime moments: no regime days fall back to the full sample, many days approach the regime sample
+    full_mu, full_cov, credibility = optimizer.regime_moments(returns, np.zeros(500))
+    assert credibility == 0 and np.allclose(full_mu, returns.mean(axis=0) * 252)
+    days = np.arange(500) < 400
+    regime_mu, _, credibility = optimizer.regime_moments(returns, days, prior_strength=40)
+    assert abs(credibility - 400 / 440) < 1e-12
+    assert np.allclose(regime_mu, (credibility * returns[days].mean(axis=0) + (1 - credibility) * returns.mean(axis=0)) * 252)
+
+def test_regime_allocator():
+    print("\nTesting regime allocator...")
+    rng = np.random.default_rng(5)
+    returns = rng.normal(0.0005, 0.012, (300, 4))
+    calls = []
+
+    def estimate():
+        calls.append(1)
+        mu, cov, credibility = optimizer.regime_moments(returns, np.ones(300))
+        return mu, cov, {"regime_credibility": credibility}
+
+    allocator = RegimeAllocator(SharedCache("test-allocation"), TTLCache("test-warm-start"))
+    first = allocator.allocate("Growth", ["d", "C", "b", "A"], "bull", estimate)
+    again = allocator.allocate("growth", ["A", "B", "C", "D"], "bull", estimate)
+    assert list(first["weights"]) == ["A", "B", "C", "D"] and not first["cached"] and not first["warm_started"]
+    assert again["cached"] and again["weights"] == first["weights"] and len(calls) == 1
+    bear = allocator.allocate("growth", ["A", "B", "C", "D"], "bear", estimate)
+    assert not bear["cached"] and bear["warm_started"] and len(calls) == 2
+    assert first["method"] == "mean_variance" and max(first["weights"].values()) <= 0.8 + 1e-9
+
+    # Regime resolved by the estimator: the scope keys the cache, the result carries the regime
+    def estimate_with_regime():
+        mu, cov, extra = estimate()
+        return mu, cov, dict(extra, regime="sideways")
+
+    lazy = allocator.allocate("growth", ["A", "B", "C", "D"], None, estimate_with_regime, scope=("IDX", "2024-06-04"))
+    lazy_again = allocator.allocate("growth", ["A", "B", "C", "D"], None, estimate_with_regime, scope=("IDX", "2024-06-04"))
+    assert lazy["regime"] == "sideways" and lazy_again["cached"] and len(calls) == 3
+
+    timeline = {"dates": ["2024-01-02", "2024-01-03", "2024-01-05"], "regimes": ["bull", "bear", "bull"]}
+    dates = np.array(["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-05", "2024-01-08"], dtype="datetime64[D]")
+    assert RegimeAllocator.day_weights(timeline, "bull", dates).tolist() == [0, 1, 0, 1, 0]
+    timeline["probabilities"] = {"bull": [0.9, 0.2, 0.7]}
+    assert RegimeAllocator.day_weights(timeline, "bull", dates).tolist() == [0, 0.9, 0.2, 0.7, 0]
+
 def test_allocation():
     print("\nTesting Allocation...")
     strategy = AssetAllocationEngine.get_allocation_strategy("aggressive")
@@ -44,4 +332,12 @@ def test_allocation():
 if __name__ == "__main__":
     test_valuation()
     test_risk()
+    test_risk_kernels()
+    test_streaming_risk_state()
+    test_dcf_scenarios()
+    test_simulated_var_cvar()
+    test_incremental_ledoit_wolf()
+    test_batch_rebalance()
+    test_allocation_optimizers()
+    test_regime_allocator()
     test_allocation()
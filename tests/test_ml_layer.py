@@ -0,0 +1,419 @@
+import sys
+import os
+import json
+import tempfile
+from datetime import date
+
+# Add backend to path so we can import app modules
+sys.path.append(os.path.join(os.getcwd(), 'backend'))
+
+import numpy as np
+from app.ml_layer.features import regime_features, rolling_mean, rolling_std, feature_matrix
+from app.ml_layer.regime import RegimeDetectionModel
+from app.ml_layer.artifacts import load_hmm_artifact, save_hmm_artifact
+from app.ml_layer.registry import ModelRegistry
+from app.ml_layer import train_regime_model
+from app.ml_layer.train_regime_model import load_training_sequences, map_states_to_regimes, select_hmm_model, train_and_save
+from app.ml_layer.volatility import fit_garch, fit_universe, forecast_variance, update_variance
+from app.ml_layer.forecasting import ForecastingModel, ReturnForecastModel
+from app.ml_layer.feature_store import FEATURE_NAMES, FeatureStore, compute_features, fundamentals_arrays
+from app.ml_layer.train_return_model import train_return_model
+from app.core.config import settings
+from app.core.shared_cache import SharedCache
+from app.data.columnar import ColumnarPriceStore
+from app.data.series import PriceSeries
+
+
+def _prices(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 * np.cumprod(1 + rng.normal(0.0003, 0.015, shape), axis=-1)
+
+
+def test_rolling_features():
+    print("Testing rolling features...")
+    prices = _prices(400)
+    returns = np.diff(prices) / prices[:-1]
+
+    mean = rolling_mean(prices, 50)
+    std = rolling_std(returns, 20)
+    assert np.isnan(mean[:49]).all() and np.isnan(std[:19]).all()
+    for t in (49, 200, 399):
+        assert np.isclose(mean[t], np.mean(prices[t - 49:t + 1]), rtol=1e-12)
+    for t in (19, 150, 398):
+        assert np.isclose(std[t], np.std(returns[t - 19:t + 1]), rtol=1e-9)
+
+    # Latest feature row matches the window definitions used at inference
+    features = regime_features(prices)
+    sma = np.mean(prices[-50:])
+    expected = [returns[-1], np.std(returns[-20:]) * np.sqrt(252), (prices[-1] - sma) / sma]
+    print(f"Latest features: {features[-1]}")
+    assert np.allclose(features[-1], expected, rtol=1e-9)
+
+
+def test_feature_matrix_multi_ticker():
+    print("\nTesting multi-ticker feature matrix...")
+    matrix = _prices((4, 300), seed=1)
+    matrix[2, :100] = np.nan  # shorter history, left-padded
+
+    batched = regime_features(matrix)
+    for row in range(4):
+        single = regime_features(matrix[row][~np.isnan(matrix[row])])
+        assert np.allclose(batched[row][-len(single):], single, equal_nan=True, rtol=1e-9)
+
+    X, lengths = feature_matrix([matrix[0], matrix[2][100:], matrix[1][:30]])
+    print(f"Training matrix: {X.shape}, lengths: {lengths}")
+    assert lengths == [251, 151] and X.shape == (402, 3)
+    assert not np.isnan(X).any()
+
+
+def test_detect_regime_batch_matches_single():
+    print("\nTesting batched regime detection...")
+    model = RegimeDetectionModel()
+    matrix = _prices((5, 120), seed=2)
+    matrix[1, :80] = np.nan
+    batched = model.detect_regimes(matrix)
+    for row in range(5):
+        single = model.detect_regime(matrix[row][~np.isnan(matrix[row])])
+        assert batched[row] == single
+    assert batched[1]["regime"] == "unknown"
+
+
+def _series(ticker, prices):
+    dates = np.datetime64("2023-01-02") + np.arange(len(prices))
+    return PriceSeries(ticker, dates, prices, prices, prices, prices, np.ones(len(prices)))
+
+
+def test_regime_history():
+    print("\nTesting regime timeline decoding...")
+    model = RegimeDetectionModel()
+    calm = _series("CALM", _prices(300, seed=3))
+    rng = np.random.default_rng(4)
+    wild = _series("WILD", 100 * np.cumprod(1 + np.concatenate([
+        rng.normal(0.001, 0.005, 200), rng.normal(-0.004, 0.04, 100)
+    ])))
+
+    timelines = model.regime_history([calm, wild])
+    for timeline in timelines:
+        print(f"{timeline['ticker']}: {len(timeline['dates'])} days, last regimes {timeline['regimes'][-3:]}")
+        assert len(timeline["dates"]) == len(timeline["regimes"]) == len(timeline["confidence"]) == 251
+        assert timeline["dates"][-1] == str(np.datetime64("2023-01-02") + 299)
+        total = np.sum([probs for probs in timeline["probabilities"].values()], axis=0)
+        assert np.allclose(total, 1.0, atol=1e-5)
+
+    # Decoding both tickers together matches decoding each alone
+    alone = model.regime_history([wild])[0]
+    assert alone["regimes"] == timelines[1]["regimes"]
+    assert timelines[1]["regimes"][-1] in ("bear", "crisis")
+
+    # Rule-based fallback still produces a full timeline
+    model.hmm_model = None
+    fallback = model.regime_history([calm])[0]
+    assert len(fallback["regimes"]) == 251 and "probabilities" not in fallback
+
+
+def test_online_filter_matches_batch_posterior():
+    print("\nTesting online regime filtering...")
+    model = RegimeDetectionModel()
+    assert model.hmm_model is not None
+    prices = _prices(300, seed=11)
+    features = regime_features(prices)
+    features = features[~np.isnan(features).any(axis=1)]
+
+    # Filtering the full history ends at the forward posterior of the last bar,
+    # which is exactly the batch smoothed posterior at the end of the sequence
+    model.init_filter(_series("AAA", prices[:200]))
+    for price in prices[200:]:
+        regime = model.update_filter("AAA", price)
+    expected = model.hmm_model.predict_proba(features)[-1]
+    assert np.allclose(model.filter_states["AAA"].probabilities, expected, atol=1e-6)
+    print(f"Filtered regime: {regime}")
+
+    # Restored state continues identically
+    restored = RegimeDetectionModel()
+    restored.restore_filter_states(json.loads(json.dumps(model.export_filter_states())))
+    nxt = prices[-1] * 1.01
+    a, b = restored.update_filter("AAA", nxt), model.update_filter("AAA", nxt)
+    assert a["regime"] == b["regime"] and np.isclose(a["volatility"], b["volatility"])
+    assert np.allclose(restored.filter_states["AAA"].probabilities, model.filter_states["AAA"].probabilities)
+
+
+def test_numpy_hmm_matches_hmmlearn():
+    print("\nTesting array-based HMM posteriors...")
+    from hmmlearn.hmm import GaussianHMM
+
+    model = RegimeDetectionModel()
+    artifact = load_hmm_artifact(os.path.join("backend", "app", "models", "regime_hmm"))
+    assert isinstance(artifact.means, np.memmap)
+
+    reference = GaussianHMM(n_components=len(artifact.startprob), covariance_type="full")
+    reference.startprob_, reference.transmat_ = np.array(artifact.startprob), np.array(artifact.transmat)
+    reference.means_, reference.covars_ = np.array(artifact.means), np.array(artifact.covars)
+
+    X, lengths = feature_matrix([_prices(n, seed=n) for n in (300, 120, 51)])
+    assert np.allclose(model.hmm_model.predict_proba(X, lengths), reference.predict_proba(X, lengths=lengths), atol=1e-9)
+
+
+def test_model_registry_hot_reload():
+    print("\nTesting model registry hot reload...")
+    source = load_hmm_artifact(os.path.join("backend", "app", "models", "regime_hmm"))
+    arrays = (source.startprob, source.transmat, source.means, source.covars)
+    with tempfile.TemporaryDirectory() as path:
+        save_hmm_artifact(path, *arrays, source.regime_map, version="1")
+        registry = ModelRegistry(check_interval=0.0)
+        registry.register("regime", path, RegimeDetectionModel, carry_over=lambda old, new: new.restore_filter_states(old.export_filter_states()))
+
+        first = registry.get("regime")
+        assert registry.get("regime") is first and first.model_version == "1"
+        first.init_filter(_series("AAA", _prices(120)))
+
+        save_hmm_artifact(path, *arrays, source.regime_map, version="2")
+        second = registry.get("regime")
+        print(f"Registry: {registry.info()}")
+        assert second is not first and second.model_version == "2"
+        assert registry.info()["regime"]["reloads"] == 1
+        # Windows survive the reload; probabilities from the old version do not
+        state = second.filter_states["AAA"]
+        assert state.features() is not None and state.probabilities is None
+
+        # Only the current and the replaced generation stay on disk
+        save_hmm_artifact(path, *arrays, source.regime_map, version="3")
+        generations = sorted(name.split("-")[0] for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+        assert generations == ["2", "3"]
+
+
+def test_hmm_model_selection():
+    print("\nTesting parallel HMM model selection...")
+    universe = [
+        _series("AAA", _prices(400, seed=1)),
+        _series("TINY", _prices(30, seed=3)),
+        _series("BBB", 100 * np.cumprod(1 + np.random.default_rng(2).normal(-0.001, 0.04, 300))),
+    ]
+    X, lengths, tickers = load_training_sequences(iter(universe))
+    assert tickers == ["AAA", "BBB"] and lengths == [351, 251] and len(X) == 602
+
+    model, report = select_hmm_model(
+        X, lengths, state_grid=(2, 3), covariance_types=("full", "diag"),
+        restarts=2, n_iter=20, max_workers=2
+    )
+    print(f"Selected: {report['selected']}")
+    assert len(report["candidates"]) == 8
+    best = max(
+        (c for c in report["candidates"] if c.get("heldout_log_likelihood") is not None),
+        key=lambda c: c["heldout_log_likelihood"]
+    )
+    assert report["selected"] == {k: best[k] for k in ("n_states", "covariance_type", "random_state")}
+    assert model.n_components == best["n_states"]
+    # The refit continues from the selected fit, so it cannot score worse on the full data
+    assert report["refit"]["log_likelihood"] >= report["refit"]["start_log_likelihood"] - 1e-6
+    assert np.isclose(model.score(X, lengths=lengths), report["refit"]["log_likelihood"])
+    json.dumps(report)
+
+    _, bic_report = select_hmm_model(X, lengths, state_grid=(2, 3), covariance_types=("diag",), restarts=1, n_iter=20, criterion="bic", max_workers=1)
+    assert bic_report["selected"]["n_states"] == min(bic_report["candidates"], key=lambda c: c["bic"])["n_states"]
+
+    regime_map = map_states_to_regimes(model, X, lengths)
+    assert sorted(regime_map) == list(range(model.n_components))
+    assert "bull" in regime_map.values() and "bear" in regime_map.values()
+
+
+def test_train_and_save_model_path():
+    print("\nTesting regime training output path...")
+    original_path, original_select = settings.REGIME_MODEL_PATH, train_regime_model.select_hmm_model
+    with tempfile.TemporaryDirectory() as root:
+        store = ColumnarPriceStore(os.path.join(root, "prices"))
+        for i, ticker in enumerate(["AAA", "BBB"]):
+            store.save(_series(ticker, _prices(300, seed=i)))
+        settings.REGIME_MODEL_PATH = os.path.join(root, "model")
+        try:
+            # The artifact lands where the registry loads from
+            train_and_save(source="columnar", path=store.root, state_grid=(2,), covariance_types=("diag",), restarts=1, max_workers=1)
+            artifact = load_hmm_artifact(settings.REGIME_MODEL_PATH)
+            assert artifact.metadata["n_tickers"] == 2 and len(artifact.startprob) == 2
+
+            train_regime_model.select_hmm_model = lambda *args, **kwargs: (None, {})
+            try:
+                train_and_save(source="columnar", path=store.root, state_grid=(2,), restarts=1, max_workers=1)
+                assert False, "expected RuntimeError"
+            except RuntimeError as e:
+                assert "no model" in str(e)
+        finally:
+            settings.REGIME_MODEL_PATH = original_path
+            train_regime_model.select_hmm_model = original_select
+
+
+def _gjr_returns(n_tickers, n, seed=0, omega=2e-6, alpha=0.04, gamma=0.08, beta=0.9):
+    rng = np.random.default_rng(seed)
+    out = np.empty((n_tickers, n))
+    variance = np.full(n_tickers, omega / (1 - alpha - gamma / 2 - beta))
+    for t in range(n):
+        out[:, t] = rng.standard_normal(n_tickers) * np.sqrt(variance)
+        variance = omega + (alpha + gamma * (out[:, t] < 0)) * out[:, t] ** 2 + beta * variance
+    return out
+
+
+def test_garch_fit_and_forecast():
+    print("Testing batched GJR-GARCH fit...")
+    returns = _gjr_returns(12, 2000)
+    head = fit_garch(returns[:, :1900], model="gjr")
+    omega, alpha, gamma, beta = head["params"].mean(axis=0)
+    assert abs(alpha - 0.04) < 0.02 and abs(gamma - 0.08) < 0.03 and abs(beta - 0.9) < 0.03
+
+    # Shorter, left-padded rows fit the same as on their own
+    padded = returns[:3].copy()
+    padded[1, :500] = np.nan
+    alone = fit_garch(returns[1, 500:], model="garch")
+    together = fit_garch(padded, model="garch")
+    assert np.allclose(together["params"][1], alone["params"][0]) and together["observations"][1] == 1500
+
+    # Process pool results match in-process ones
+    by_ticker = {f"T{i}": returns[i, -(300 + 50 * i):] for i in range(6)}
+    pooled = fit_universe(by_ticker, model="gjr", max_workers=2, chunk_size=2)
+    local = fit_universe(by_ticker, model="gjr", max_workers=1, chunk_size=2)
+    assert pooled == local and len(pooled) == 6
+
+    # Advancing in two steps matches one step; forecasts start there and decay to the long-run level
+    advanced = update_variance(head["params"], head["mean"], head["variance"], returns[:, 1900:])
+    halfway = update_variance(head["params"], head["mean"], head["variance"], returns[:, 1900:1950])
+    assert np.allclose(advanced, update_variance(head["params"], head["mean"], halfway, returns[:, 1950:]))
+    path = forecast_variance(head["params"], advanced, 500)
+    long_run = head["params"][:, 0] / (1 - head["params"][:, 1] - head["params"][:, 2] / 2 - head["params"][:, 3])
+    assert np.allclose(path[:, 0], advanced) and np.allclose(path[:, -1], long_run, rtol=1e-2)
+
+
+def test_volatility_forecast_cache():
+    print("Testing cached volatility forecasts...")
+    returns = _gjr_returns(2, 401, seed=1)
+    closes = 100 * np.exp(np.cumsum(returns, axis=1))
+    dates = np.datetime64("2024-01-01") + np.arange(401)
+    series = [PriceSeries(f"T{i}", dates, c, c, c, c, np.ones(401)) for i, c in enumerate(closes)]
+    head = [s.slice(stop=400) for s in series]
+    model = ForecastingModel(model="gjr", cache=SharedCache("test-volatility"), refit_days=7, min_observations=250)
+
+    first = model.volatility_forecasts(head, horizon=5, today=date(2025, 3, 1))
+    assert all(f["refitted"] and f["as_of"] == str(dates[399]) for f in first.values())
+    assert len(first["T0"]["term_structure"]) == 5
+
+    # One more bar: no refit, the variance advances by one recursion step
+    state = model.load_states(["T0"])["T0"]
+    second = model.volatility_forecasts(series, horizon=5, today=date(2025, 3, 2))
+    expected = update_variance(
+        np.array([state["params"]]), np.array([state["mean"]]), np.array([state["variance"]]),
+        np.log(closes[:1, 400:] / closes[:1, 399:400])
+    )
+    assert not second["T0"]["refitted"] and second["T0"]["fitted_on"] == "2025-03-01"
+    assert np.isclose(second["T0"]["daily_volatility"], np.sqrt(expected[0]))
+
+    # Cached states only: known tickers still advance, unknown ones are not fitted
+    unknown = PriceSeries("T9", dates, closes[0], closes[0], closes[0], closes[0], np.ones(401))
+    cached = model.volatility_forecasts(series + [unknown], horizon=5, today=date(2025, 3, 2), fit_missing=False)
+    assert cached["T9"] is None and model.load_states(["T9"]) == {}
+    assert np.isclose(cached["T0"]["daily_volatility"], second["T0"]["daily_volatility"])
+
+    # Today's forming bar never moves the stored state, so the stored bars still bridge it
+    forming_close = np.append(closes[0], closes[0, -1] * 1.05)
+    forming = PriceSeries("T0", dates[0] + np.arange(402), forming_close, forming_close, forming_close, forming_close, np.ones(402))
+    intraday = model.volatility_forecasts([forming], horizon=5, today=date(2025, 2, 5), fit_missing=False)
+    assert intraday["T0"]["as_of"] == str(dates[400]) == model.load_states(["T0"])["T0"]["as_of"]
+    assert model.volatility_forecasts(series[:1], horizon=5, today=date(2025, 2, 5), fit_missing=False)["T0"] is not None
+
+    # Cached states only: a stale fit is still advanced and served, flagged until the scheduled refit
+    stale = model.volatility_forecasts(series, horizon=5, today=date(2025, 3, 9), fit_missing=False)
+    assert stale["T0"]["stale"] and not stale["T0"]["refitted"] and stale["T0"]["fitted_on"] == "2025-03-01"
+    assert not second["T0"]["stale"]
+
+    # Stale fits are refitted, short histories have no forecast
+    third = model.volatility_forecasts(series + [series[0].slice(stop=100)], horizon=5, today=date(2025, 3, 9))
+    assert third["T0"]["refitted"] and third["T0"]["fitted_on"] == "2025-03-09"
+    assert 0 < model.forecast_volatility(np.expm1(returns[0])) < 0.1
+
+
+def _feature_series(ticker, n, seed):
+    closes = _prices(n, seed)
+    dates = np.datetime64("2022-01-03") + np.arange(n)
+    return PriceSeries(ticker, dates, closes, closes, closes, closes, np.ones(n))
+
+
+def test_feature_store_incremental():
+    print("Testing incremental feature store...")
+    series = _feature_series("AAA", 600, 3)
+    fundamentals = fundamentals_arrays([
+        {"report_date": date(2022, 3, 1), "market_cap": 1e9, "pe_ratio": 20.0, "pb_ratio": 3.0, "revenue": 5e8,
+         "net_income": 5e7, "free_cash_flow": 4e7, "total_debt": 2e8, "total_cash": 1e8},
+        {"report_date": date(2023, 1, 2), "market_cap": 2e9, "pe_ratio": 25.0, "pb_ratio": None, "revenue": 6e8,
+         "net_income": 8e7, "free_cash_flow": 6e7, "total_debt": 2e8, "total_cash": 3e8},
+    ])
+    with tempfile.TemporaryDirectory() as root:
+        incremental, full = FeatureStore(os.path.join(root, "a")), FeatureStore(os.path.join(root, "b"))
+        assert incremental.update(series.slice(stop=300), fundamentals) == 300
+        assert incremental.update(series.slice(stop=301), fundamentals) == 1
+        assert incremental.update(series.slice(stop=301), fundamentals) == 0
+        assert incremental.update(series, fundamentals) == 299
+        full.rebuild(series, fundamentals)
+
+        dates, values = incremental.load("AAA")
+        _, expected = full.load("AAA")
+        assert values.dtype == np.float32 and values.shape == (600, len(FEATURE_NAMES))
+        assert np.array_equal(dates, series.dates) and np.allclose(values, expected, rtol=1e-6, equal_nan=True)
+        assert np.allclose(values, compute_features(series, fundamentals), rtol=1e-6, equal_nan=True)
+
+        # Yields move with the price from the snapshot's market cap; nothing before the first report
+        columns = {name: values[:, i] for i, name in enumerate(FEATURE_NAMES)}
+        report = int(np.searchsorted(series.dates, np.datetime64("2022-03-01")))
+        assert np.isnan(columns["earnings_yield"][report - 1]) and np.isclose(columns["earnings_yield"][report], 0.05)
+        later = report + 30
+        assert np.isclose(columns["fcf_yield"][later], 0.04 * series.close[report] / series.close[later], rtol=1e-5)
+        assert np.isnan(columns["pb_ratio"][-1]) and columns["pe_ratio"][-1] == 25
+        assert np.isnan(columns["momentum_252"][251]) and np.isclose(columns["momentum_252"][252], series.close[252] / series.close[0] - 1)
+
+        # Cross-sections and training targets come straight from the columns
+        found, row_dates, matrix = incremental.cross_section(["AAA", "ZZZ"], as_of=date(2022, 6, 1))
+        assert found == ["AAA"] and str(row_dates[0]) == "2022-06-01" and matrix.shape == (1, len(FEATURE_NAMES))
+        X, y, _ = incremental.training_set(horizon=21)
+        assert len(y) == 600 - 21 and np.allclose(y[:10], series.close[21:31] / series.close[:10] - 1, rtol=1e-4)
+
+
+def test_return_model_batch_scoring():
+    print("Testing ridge return model...")
+    rng = np.random.default_rng(7)
+    X = rng.normal(size=(5000, len(FEATURE_NAMES))) * np.linspace(0.01, 10, len(FEATURE_NAMES))
+    beta = rng.normal(size=len(FEATURE_NAMES)) / np.linspace(0.01, 10, len(FEATURE_NAMES))
+    y = X @ beta * 0.01 + 0.001 + rng.normal(0, 0.001, 5000)
+    model = ReturnForecastModel.fit(X, y, horizon=21, alpha=1e-6)
+    assert np.allclose(model.predict(X), X @ beta * 0.01 + 0.001, atol=2e-4)
+
+    # Missing features score as the training mean
+    row = X[:1].copy()
+    row[0, 3] = np.nan
+    imputed = X[:1].copy()
+    imputed[0, 3] = X[:, 3].mean()
+    assert np.isclose(model.predict(row)[0], model.predict(imputed)[0])
+
+    with tempfile.TemporaryDirectory() as root:
+        model.save(root)
+        loaded = ReturnForecastModel.load(root)
+        assert loaded.horizon == 21 and loaded.feature_names == FEATURE_NAMES
+        assert np.allclose(loaded.predict(X[:100]), model.predict(X[:100]))
+
+        store = FeatureStore(os.path.join(root, "features"))
+        for i in range(4):
+            store.update(_feature_series(f"T{i}", 500, i))
+        trained, report = train_return_model(store, horizon=10, alpha=1.0)
+        assert report["rows"] == 4 * 490 and report["holdout"]["rows"] > 0
+        _, _, matrix = store.cross_section(["T0", "T1", "T2", "T3"])
+        assert trained.predict(matrix).shape == (4,)
+
+
+if __name__ == "__main__":
+    test_rolling_features()
+    test_feature_matrix_multi_ticker()
+    test_detect_regime_batch_matches_single()
+    test_regime_history()
+    test_online_filter_matches_batch_posterior()
+    test_numpy_hmm_matches_hmmlearn()
+    test_model_registry_hot_reload()
+    test_hmm_model_selection()
+    test_train_and_save_model_path()
+    test_garch_fit_and_forecast()
+    test_volatility_forecast_cache()
+    test_feature_store_incremental()
+    test_return_model_batch_scoring()